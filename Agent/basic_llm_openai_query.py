@@ -1,10 +1,11 @@
+import asyncio
 from openai import OpenAI
 import os
 from dotenv import load_dotenv  
 
 load_dotenv()
 client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
-åç
+
 def basic_llm_query(query):
     try:
         response = client.chat.completions.create(
@@ -18,6 +19,12 @@ def basic_llm_query(query):
     except Exception as e:
         return f"Error: {str(e)}"
 
+
+def basic_llm_query_many(queries, **kwargs):
+    """basic_llm_query for many queries at once, paced under the rate limits (see bulk_llm_client.py)"""
+    from bulk_llm_client import bulk_llm_query
+    return asyncio.run(bulk_llm_query(queries, **kwargs))
+
 # Test the function
 if __name__ == "__main__":
     result = basic_llm_query("Python programming")
@@ -0,0 +1,305 @@
+#!/usr/bin/env python3
+"""
+Rate-limit-aware async bulk client for OpenAI chat completions.
+
+Queries run concurrently, but each request first takes one unit from a
+requests-per-minute bucket and its estimated tokens (prompt length / 4 +
+max_tokens) from a tokens-per-minute bucket, so a large batch is paced
+under the account limits instead of bursting into 429s. Once a response
+arrives, the estimate is corrected with the reported usage.
+
+429 and 5xx responses, timeouts and connection errors are retried with
+exponential backoff and full jitter, waiting at least as long as the
+server's Retry-After header asks. Results come back in input order, with
+failures as QueryResult.error instead of exceptions.
+
+    python Agent/bulk_llm_client.py --queries queries.txt --rpm 3500 --tpm 90000
+    python Agent/bulk_llm_client.py --mock --mock-rpm 600 --mock-fail-rate 0.05 -n 200
+"""
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import time
+from dataclasses import dataclass
+
+from dotenv import load_dotenv
+from openai import (APIConnectionError, APIStatusError, APITimeoutError, AsyncOpenAI, InternalServerError,
+                    RateLimitError)
+
+load_dotenv()
+
+DEFAULT_MODEL = "gpt-3.5-turbo"
+
+
+class TokenBucket:
+    """Async token bucket refilled at rate_per_minute
+
+    It holds burst_seconds worth of tokens, since providers enforce
+    per-minute limits over shorter windows too. Waiters are served in
+    arrival order, so one large request is not starved by a stream of
+    small ones.
+
+    After a 429, slow_down() cuts the rate multiplicatively; every
+    increase_after successes in a row then add back a twentieth of the
+    configured rate, up to the configured rate (AIMD), so one burst of
+    rate limiting does not throttle the rest of the run.
+    """
+
+    def __init__(self, rate_per_minute, burst_seconds=1.0, increase_after=20):
+        self.rate = rate_per_minute / 60.0
+        self.max_rate = self.rate
+        self.min_rate = self.rate / 10
+        self.increase_after = increase_after
+        self.successes = 0
+        self.capacity = max(1.0, self.rate * burst_seconds)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self, amount=1.0):
+        # A request bigger than the bucket could never run; let it through once the bucket is full
+        amount = min(float(amount), self.capacity)
+        async with self._lock:
+            while True:
+                self._refill()
+                if self.tokens >= amount:
+                    self.tokens -= amount
+                    return
+                await asyncio.sleep((amount - self.tokens) / self.rate)
+
+    def adjust(self, delta):
+        """Take delta more tokens (or give -delta back) after the real cost is known"""
+        self._refill()
+        self.tokens = min(self.capacity, self.tokens - delta)
+
+    def slow_down(self, factor=0.8):
+        """Empty the bucket and lower the rate, after a 429 showed the server's limit is tighter"""
+        self._refill()
+        self.tokens = min(self.tokens, 0.0)
+        self.rate = max(self.min_rate, self.rate * factor)
+        self.successes = 0
+
+    def record_success(self):
+        """Count a request that went through; raise a lowered rate again after a run of them"""
+        if self.rate >= self.max_rate:
+            return
+        self.successes += 1
+        if self.successes >= self.increase_after:
+            self._refill()
+            self.rate = min(self.max_rate, self.rate + self.max_rate / 20)
+            self.successes = 0
+
+
+@dataclass
+class QueryResult:
+    index: int
+    query: str
+    text: str = None
+    error: str = None
+    latency: float = 0.0
+    attempts: int = 0
+    tokens: int = 0
+
+    @property
+    def ok(self):
+        return self.error is None
+
+
+@dataclass
+class BulkReport:
+    """Throughput and latency of a bulk run"""
+    results: list
+    elapsed: float
+    retries: int = 0
+    rate_limited: int = 0
+
+    @property
+    def succeeded(self):
+        return sum(1 for r in self.results if r.ok)
+
+    @property
+    def tokens(self):
+        return sum(r.tokens for r in self.results)
+
+    def summary(self):
+        latencies = sorted(r.latency for r in self.results if r.ok) or [0.0]
+        p95 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+        minutes = self.elapsed / 60 if self.elapsed > 0 else float("inf")
+        return (f"{self.succeeded}/{len(self.results)} queries in {self.elapsed:.1f}s "
+                f"({self.succeeded / minutes:.0f} requests/min, {self.tokens / minutes:.0f} tokens/min), "
+                f"latency p50 {statistics.median(latencies) * 1000:.0f} ms / p95 {p95 * 1000:.0f} ms, "
+                f"{self.retries} retries ({self.rate_limited} rate limited)")
+
+
+def _retry_after(error):
+    """Seconds from a Retry-After / retry-after-ms header, if the server sent one"""
+    response = getattr(error, "response", None)
+    if response is None:
+        return None
+    headers = response.headers
+    try:
+        if headers.get("retry-after-ms"):
+            return float(headers["retry-after-ms"]) / 1000
+        if headers.get("retry-after"):
+            return float(headers["retry-after"])
+    except ValueError:
+        pass
+    return None
+
+
+class BulkLLMClient:
+    """Sends many chat completions concurrently under request and token rate limits"""
+
+    def __init__(self, model=DEFAULT_MODEL, rpm=500, tpm=40000, max_concurrency=16, max_tokens=100,
+                 max_retries=5, backoff=0.5, max_backoff=30.0, base_url=None, api_key=None, timeout=60.0,
+                 verbose=False):
+        self.model = model
+        self.max_tokens = max_tokens
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.verbose = verbose
+        self.request_bucket = TokenBucket(rpm)
+        self.token_bucket = TokenBucket(tpm)
+        # Retries are ours: the SDK's own would bypass the buckets
+        self.client = AsyncOpenAI(api_key=api_key or os.getenv("OPENAI_API_KEY"), base_url=base_url,
+                                  max_retries=0, timeout=timeout)
+        self.retries = 0
+        self.rate_limited = 0
+
+    @classmethod
+    def from_env(cls, **kwargs):
+        """Build from OPENAI_RPM / OPENAI_TPM / OPENAI_CONCURRENCY"""
+        kwargs.setdefault("rpm", int(os.getenv("OPENAI_RPM", "500")))
+        kwargs.setdefault("tpm", int(os.getenv("OPENAI_TPM", "40000")))
+        kwargs.setdefault("max_concurrency", int(os.getenv("OPENAI_CONCURRENCY", "16")))
+        return cls(**kwargs)
+
+    def messages_for(self, query):
+        return [{"role": "user", "content": f"Search Google for: {query}"}]
+
+    def _estimate_tokens(self, messages):
+        return sum(len(m["content"]) for m in messages) // 4 + self.max_tokens
+
+    async def _create(self, messages, estimate):
+        await self.request_bucket.acquire(1)
+        await self.token_bucket.acquire(estimate)
+        response = await self.client.chat.completions.create(model=self.model, messages=messages,
+                                                             max_tokens=self.max_tokens)
+        used = response.usage.total_tokens if response.usage else estimate
+        self.token_bucket.adjust(used - estimate)
+        self.request_bucket.record_success()
+        return response.choices[0].message.content, used
+
+    async def query(self, index, query, semaphore):
+        """One query with retries; never raises"""
+        messages = self.messages_for(query)
+        estimate = self._estimate_tokens(messages)
+        result = QueryResult(index=index, query=query)
+        async with semaphore:
+            started = time.perf_counter()
+            while True:
+                result.attempts += 1
+                try:
+                    result.text, result.tokens = await self._create(messages, estimate)
+                    break
+                except (RateLimitError, InternalServerError, APITimeoutError, APIConnectionError) as e:
+                    if result.attempts > self.max_retries:
+                        result.error = f"{type(e).__name__}: {e}"
+                        break
+                    self.retries += 1
+                    if isinstance(e, RateLimitError):
+                        self.rate_limited += 1
+                        self.request_bucket.slow_down()
+                    delay = random.uniform(0, min(self.max_backoff, self.backoff * 2 ** (result.attempts - 1)))
+                    delay = max(delay, _retry_after(e) or 0.0)
+                    if self.verbose:
+                        print(f"  ⚠️  Query {index} failed ({type(e).__name__}), "
+                              f"retry {result.attempts}/{self.max_retries} in {delay:.2f}s")
+                    await asyncio.sleep(delay)
+                except APIStatusError as e:  # other 4xx: retrying will not help
+                    result.error = f"{type(e).__name__}: {e}"
+                    break
+            result.latency = time.perf_counter() - started
+        return result
+
+    async def run(self, queries):
+        """BulkReport whose results are in the same order as queries"""
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        self.retries = self.rate_limited = 0
+        started = time.perf_counter()
+        results = await asyncio.gather(*(self.query(i, q, semaphore) for i, q in enumerate(queries)))
+        return BulkReport(results=list(results), elapsed=time.perf_counter() - started,
+                          retries=self.retries, rate_limited=self.rate_limited)
+
+    async def aclose(self):
+        await self.client.close()
+
+
+async def bulk_llm_query(queries, **kwargs):
+    """Answers (or "Error: ..." strings, like basic_llm_query) for queries, in order"""
+    client = BulkLLMClient.from_env(**kwargs)
+    try:
+        report = await client.run(queries)
+    finally:
+        await client.aclose()
+    return [r.text if r.ok else f"Error: {r.error}" for r in report.results]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Send many chat completions under rate limits")
+    parser.add_argument("--queries", help="text file with one query per line")
+    parser.add_argument("-n", type=int, default=100, help="number of generated queries without --queries")
+    parser.add_argument("--model", default=DEFAULT_MODEL)
+    parser.add_argument("--rpm", type=int, default=int(os.getenv("OPENAI_RPM", "500")), help="requests per minute")
+    parser.add_argument("--tpm", type=int, default=int(os.getenv("OPENAI_TPM", "40000")), help="tokens per minute")
+    parser.add_argument("--concurrency", type=int, default=int(os.getenv("OPENAI_CONCURRENCY", "16")))
+    parser.add_argument("--max-tokens", type=int, default=100)
+    parser.add_argument("--mock", action="store_true", help="start mock_openai_server.py and query it")
+    parser.add_argument("--mock-rpm", type=int, default=0, help="rate limit enforced by the mock server")
+    parser.add_argument("--mock-fail-rate", type=float, default=0.0, help="fraction of mock requests failing with 503")
+    parser.add_argument("--mock-latency", type=float, default=0.05)
+    parser.add_argument("--verbose", action="store_true")
+    args = parser.parse_args()
+
+    if args.queries:
+        with open(args.queries, encoding="utf-8") as f:
+            queries = [line.strip() for line in f if line.strip()]
+    else:
+        queries = [f"Python programming question {i}" for i in range(args.n)]
+
+    base_url = api_key = None
+    if args.mock:
+        import mock_openai_server
+        server, base_url = mock_openai_server.start_in_thread(port=0, latency=args.mock_latency,
+                                                               fail_rate=args.mock_fail_rate, rpm=args.mock_rpm)
+        api_key = "mock"
+
+    async def run():
+        client = BulkLLMClient(model=args.model, rpm=args.rpm, tpm=args.tpm, max_concurrency=args.concurrency,
+                               max_tokens=args.max_tokens, base_url=base_url, api_key=api_key,
+                               verbose=args.verbose)
+        try:
+            return await client.run(queries)
+        finally:
+            await client.aclose()
+
+    report = asyncio.run(run())
+    print(f"📊 {report.summary()}")
+    failed = [r for r in report.results if not r.ok]
+    if failed:
+        print(f"  ❌ {len(failed)} failed, first: {failed[0].error}")
+    if args.mock:
+        print(f"🧪 Mock server saw {server.requests} requests, {server.rate_limited} answered with 429")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+"""
+Local stub of the OpenAI chat completions API for offline agent runs.
+
+Serves POST /v1/chat/completions with deterministic answers:
+  - agent prompts (a system message listing the allowed "action" values)
+    get a ReAct step: first an Action calling the first tool with the
+    question, then, once an Observation is in the prompt, a Final Answer
+    repeating that observation
+  - anything else gets a short echo of the last user message
+
+Latency and failure rate can be injected like fake_ollama.py, and --rpm
+enforces a requests-per-minute limit the way the real API does: requests
+over it get a 429 with a Retry-After header.
+
+    python Agent/mock_openai_server.py --port 8001 --latency 0.05 --rpm 600
+    OPENAI_BASE_URL=http://127.0.0.1:8001/v1 python Agent/test_google_search_agent.py --stub-search
+"""
+import argparse
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+_ACTIONS = re.compile(r'"action" field are:\s*(.+)')
+
+
+def _content(message):
+    content = message.get("content") or ""
+    if isinstance(content, list):  # content parts
+        content = " ".join(part.get("text", "") for part in content if isinstance(part, dict))
+    return content
+
+
+def reply_for(messages):
+    """Deterministic assistant reply for a list of chat messages"""
+    system = "\n".join(_content(m) for m in messages if m.get("role") == "system")
+    user = [_content(m) for m in messages if m.get("role") == "user"]
+    prompt = user[-1] if user else ""
+    actions = _ACTIONS.search(system)
+    if not actions:
+        return f"Stub answer to: {' '.join(prompt.split()[:30])}"
+
+    if "Observation:" in prompt:
+        observation = prompt.rsplit("Observation:", 1)[1].strip().splitlines()[0]
+        return f"Thought: I now know the final answer\nFinal Answer: {observation}"
+    tool = actions.group(1).split(",")[0].strip()
+    question = prompt.strip().splitlines()[0] if prompt.strip() else ""
+    action = json.dumps({"action": tool, "action_input": question})
+    return f"Thought: I should look this up.\nAction:\n```\n{action}\n```"
+
+
+class MockOpenAIHandler(BaseHTTPRequestHandler):
+    server_version = "MockOpenAI/1.0"
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+    def _send_json(self, status, payload, headers=None):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _read_json(self):
+        length = int(self.headers.get("Content-Length", 0))
+        return json.loads(self.rfile.read(length) or b"{}")
+
+    def do_GET(self):
+        if self.path in ("/", "/v1/models"):
+            self._send_json(200, {"object": "list", "data": [{"id": "mock", "object": "model"}]})
+        else:
+            self._send_json(404, {"error": {"message": "not found"}})
+
+    def _over_rate_limit(self):
+        """Seconds until a request is allowed again, or 0 (token bucket of server.rpm per minute)"""
+        server = self.server
+        if not server.rpm:
+            return 0.0
+        with server.lock:
+            now = time.monotonic()
+            rate = server.rpm / 60.0
+            server.allowance = min(server.burst, server.allowance + (now - server.checked) * rate)
+            server.checked = now
+            if server.allowance >= 1.0:
+                server.allowance -= 1.0
+                return 0.0
+            server.rate_limited += 1
+            return (1.0 - server.allowance) / rate
+
+    def do_POST(self):
+        server = self.server
+        payload = self._read_json()
+        with server.lock:
+            server.requests += 1
+        retry_after = self._over_rate_limit()
+        if retry_after:
+            self._send_json(429, {"error": {"message": "Rate limit reached", "type": "requests"}},
+                            headers={"Retry-After": f"{retry_after:.3f}"})
+            return
+        if server.latency:
+            time.sleep(server.latency)
+        if server.fail_rate and random.random() < server.fail_rate:
+            self._send_json(503, {"error": {"message": "injected failure", "type": "server_error"}})
+            return
+        if self.path.rstrip("/") not in ("/v1/chat/completions", "/chat/completions"):
+            self._send_json(404, {"error": {"message": "not found"}})
+            return
+
+        messages = payload.get("messages", [])
+        text = reply_for(messages)
+        prompt_tokens = sum(len(_content(m)) // 4 + 1 for m in messages)
+        completion_tokens = len(text) // 4 + 1
+        with server.lock:
+            server.completions += 1
+        self._send_json(200, {
+            "id": f"chatcmpl-mock-{server.requests}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": payload.get("model", "mock"),
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": text},
+                "finish_reason": "stop",
+            }],
+            "usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens,
+            },
+        })
+
+
+def make_server(host="127.0.0.1", port=8001, latency=0.0, fail_rate=0.0, rpm=0, verbose=False):
+    """Build a mock server; port 0 picks a free port (see server.server_address)"""
+    server = ThreadingHTTPServer((host, port), MockOpenAIHandler)
+    server.daemon_threads = True
+    server.latency = latency
+    server.fail_rate = fail_rate
+    server.rpm = rpm
+    # Allow a second's worth of requests in a burst
+    server.burst = max(1.0, rpm / 60.0)
+    server.allowance = server.burst
+    server.checked = time.monotonic()
+    server.rate_limited = 0
+    server.verbose = verbose
+    server.lock = threading.Lock()
+    server.requests = 0
+    server.completions = 0
+    return server
+
+
+def start_in_thread(**kwargs):
+    """Start a mock server in a daemon thread and return (server, base_url ending in /v1)"""
+    server = make_server(**kwargs)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    host, port = server.server_address[:2]
+    return server, f"http://{host}:{port}/v1"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Mock OpenAI chat completions server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added to every request")
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="fraction of requests answered with 503")
+    parser.add_argument("--rpm", type=int, default=0, help="requests per minute before answering 429 (0: no limit)")
+    parser.add_argument("--verbose", action="store_true")
+    args = parser.parse_args()
+
+    server = make_server(args.host, args.port, args.latency, args.fail_rate, args.rpm, args.verbose)
+    print(f"🧪 Mock OpenAI listening on http://{args.host}:{args.port}/v1")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
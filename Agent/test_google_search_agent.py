@@ -1,24 +1,121 @@
-from tabnanny import verbose
-from openai import OpenAI
+import argparse
 import os
-from dotenv import load_dotenv  
+import sys
+import threading
+import time
+
+import httpx
+from dotenv import load_dotenv
 from langchain_community.agent_toolkits.load_tools import load_tools
 from langchain.agents import AgentType, initialize_agent
+from langchain_core.tools import Tool
 from langchain_openai import ChatOpenAI
 
+from tool_cache import TTLCache, cached_tool
+
+# The LLM response cache lives with the RAG helpers
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "RAG"))
+from llm_cache import get_shared_llm_cache, with_llm_cache
+
 load_dotenv()
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
 
+STUB_RESULTS = {
+    "chief minister of bihar": "Nitish Kumar is the Chief Minister of Bihar.",
+}
+
+
+def stub_search_tool(latency=0.0):
+    """Offline stand-in for the SerpAPI "Search" tool with canned answers"""
+    def search(query):
+        if latency:
+            time.sleep(latency)
+        lowered = query.lower()
+        for key, answer in STUB_RESULTS.items():
+            if key in lowered:
+                return answer
+        return f"No results for {query!r}."
+
+    return Tool(name="Search", func=search,
+                description="A search engine. Useful for when you need to answer questions about current events. "
+                            "Input should be a search query.")
+
+
+class SearchAgent:
+    """Search agent built once and reused across prompts
+
+    The chat model, its pooled HTTP connections, the tools and the agent
+    executor are created in __init__; every tool call goes through a TTL
+    cache keyed by the normalized tool input.
+    """
+
+    def __init__(self, model="gpt-3.5-turbo", tools=None, tool_names=("serpapi",), base_url=None,
+                 api_key=None, cache_ttl=3600.0, cache_size=1024, max_connections=10, verbose=True):
+        self.http_client = httpx.Client(limits=httpx.Limits(max_connections=max_connections,
+                                                            max_keepalive_connections=max_connections))
+        # temperature 0: repeated prompts (same question, same observations) come from the response cache
+        self.llm = with_llm_cache(ChatOpenAI(model=model, temperature=0, base_url=base_url, api_key=api_key,
+                                             http_client=self.http_client))
+        self.cache = TTLCache(ttl_seconds=cache_ttl, max_entries=cache_size)
+        tools = tools if tools is not None else load_tools(list(tool_names))
+        self.tools = [cached_tool(tool, self.cache) for tool in tools]
+        self.agent = initialize_agent(self.tools, self.llm, agent=AgentType.CHAT_ZERO_SHOT_REACT_DESCRIPTION,
+                                      verbose=verbose)
+
+    def invoke(self, prompt):
+        return self.agent.invoke(prompt)
+
+    def stats(self):
+        return self.cache.stats()
+
+    def close(self):
+        self.http_client.close()
+
+
+_agent = None
+_agent_lock = threading.Lock()
+
+
+def get_agent():
+    """Process-wide SearchAgent, built on first use"""
+    global _agent
+    with _agent_lock:
+        if _agent is None:
+            _agent = SearchAgent(cache_ttl=float(os.getenv("AGENT_TOOL_CACHE_TTL", "3600")))
+        return _agent
 
 
 def google_search_agent(prompt):
-    llm = ChatOpenAI(model="gpt-3.5-turbo", temperature=0)
-    tool_names = ["serpapi"]
-    tools = load_tools(tool_names)
-    agent = initialize_agent(tools, llm, agent=AgentType.CHAT_ZERO_SHOT_REACT_DESCRIPTION, verbose=True)
-    return agent.invoke(prompt)
+    return get_agent().invoke(prompt)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Ask the search agent a question")
+    parser.add_argument("prompt", nargs="?", default="Who is the chief minister of Bihar?")
+    parser.add_argument("--repeat", type=int, default=1, help="ask the same question several times")
+    parser.add_argument("--stub-search", action="store_true", help="use the canned offline search tool")
+    parser.add_argument("--mock-llm", action="store_true", help="start mock_openai_server.py and use it")
+    args = parser.parse_args()
+
+    if args.stub_search or args.mock_llm:
+        base_url = api_key = None
+        if args.mock_llm:
+            import mock_openai_server
+            _, base_url = mock_openai_server.start_in_thread(port=0)
+            api_key = "mock"
+        tools = [stub_search_tool()] if args.stub_search else None
+        agent = SearchAgent(tools=tools, base_url=base_url, api_key=api_key)
+    else:
+        agent = get_agent()
+
+    for _ in range(args.repeat):
+        started = time.perf_counter()
+        result = agent.invoke(args.prompt)
+        print(f"⏱️ {(time.perf_counter() - started) * 1000:.0f} ms")
+        print(result)
+    print(f"📊 {agent.cache.summary()}")
+    if get_shared_llm_cache():
+        print(f"💾 {get_shared_llm_cache().summary()}")
 
 
 if __name__ == "__main__":
-    result = google_search_agent("Who is the chief minister of Bihar?")
-    print(result)
\ No newline at end of file
+    main()
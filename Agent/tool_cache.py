@@ -0,0 +1,99 @@
+"""
+TTL cache for agent tool calls.
+
+Identical tool inputs (after normalizing case, whitespace and trailing
+punctuation) are answered from memory until they expire, so asking the
+agent the same thing twice does not send the same query to SerpAPI twice.
+
+    search = cached_tool(load_tools(["serpapi"])[0], TTLCache(ttl_seconds=3600))
+"""
+import re
+import threading
+import time
+from collections import OrderedDict
+
+from langchain_core.tools import Tool
+
+_WHITESPACE = re.compile(r"\s+")
+_TRAILING_PUNCTUATION = re.compile(r"[\s?!.]+$")
+
+
+def normalize_input(tool_input):
+    text = tool_input if isinstance(tool_input, str) else str(tool_input)
+    return _TRAILING_PUNCTUATION.sub("", _WHITESPACE.sub(" ", text.strip().lower()))
+
+
+class TTLCache:
+    """Thread-safe LRU map whose entries expire ttl_seconds after they were stored"""
+
+    def __init__(self, ttl_seconds=3600.0, max_entries=1024):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()  # key -> (stored_at, value)
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and time.monotonic() - entry[0] <= self.ttl_seconds:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return None
+
+    def put(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.monotonic(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "entries": len(self._entries),
+        }
+
+    def summary(self):
+        s = self.stats()
+        return f"tool cache: {s['hits']} hits, {s['misses']} misses ({s['hit_rate']:.0%} hit rate), {s['entries']} entries"
+
+
+def cached_tool(tool, cache):
+    """Tool with the same name and description whose results go through cache
+
+    Entries are keyed per tool, so several tools can share one cache.
+    Errors are not cached.
+    """
+    def key_for(tool_input):
+        return (tool.name, normalize_input(tool_input))
+
+    def run(tool_input):
+        key = key_for(tool_input)
+        result = cache.get(key)
+        if result is None:
+            result = tool.run(tool_input)
+            cache.put(key, result)
+        return result
+
+    async def arun(tool_input):
+        key = key_for(tool_input)
+        result = cache.get(key)
+        if result is None:
+            result = await tool.arun(tool_input)
+            cache.put(key, result)
+        return result
+
+    return Tool(name=tool.name, description=tool.description, func=run, coroutine=arun)
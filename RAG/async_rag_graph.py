@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+"""
+Async version of the retrieve -> generate LangGraph app in test_rag_basics_1.py.
+
+Many questions run concurrently through graph.abatch() / graph.ainvoke().
+With multi_query=True a rewrite step first asks the LLM for alternative
+phrasings of the question; the original and the rewrites are retrieved in
+parallel and merged with reciprocal rank fusion before generation.
+
+One CallLimits object is shared by every run of a graph, so however many
+questions are in flight, at most `llm` LLM calls and `embeddings` query
+embedding calls are outstanding at a time.
+
+    python RAG/async_rag_graph.py --questions questions.jsonl --concurrency 16 --multi-query
+    python RAG/async_rag_graph.py --fake --fake-latency 0.2 --concurrency 1 8 32
+
+--fake swaps in fake_models.py and the restaurant reviews, so throughput
+scaling can be checked offline.
+"""
+import argparse
+import asyncio
+import os
+import time
+from typing import List, TypedDict
+
+from langchain_core.documents import Document
+from langchain_core.prompts import ChatPromptTemplate
+from langgraph.graph import START, StateGraph
+
+from context_packing import pack_context
+from hybrid_retriever import reciprocal_rank_fusion
+from tracing import configure_from_env, span
+
+REWRITE_TEMPLATE = """Write {n} different search queries that would help answer the question below.
+Return one query per line, without numbering or any other text.
+
+Question: {question}"""
+
+
+class CallLimits:
+    """Caps on concurrent LLM and embedding calls, shared by every run of a graph (one event loop)"""
+
+    def __init__(self, llm=None, embeddings=None):
+        self.llm = asyncio.Semaphore(llm or int(os.getenv("RAG_LLM_CONCURRENCY", "4")))
+        self.embeddings = asyncio.Semaphore(embeddings or int(os.getenv("RAG_EMBED_CONCURRENCY", "8")))
+
+
+class State(TypedDict, total=False):
+    question: str
+    queries: List[str]
+    context: List[Document]
+    answer: str
+
+
+def _text(response):
+    # Chat models return messages, plain LLMs strings
+    return getattr(response, "content", response)
+
+
+def build_async_graph(vector_store, embeddings, llm, prompt, limits=None, k=4,
+                      multi_query=False, n_queries=3, context_tokens=1500):
+    """Compile the graph; limits defaults to a fresh CallLimits shared by all its runs"""
+    limits = limits or CallLimits()
+    rewrite_prompt = ChatPromptTemplate.from_template(REWRITE_TEMPLATE)
+
+    async def rewrite(state: State):
+        with span("rewrite"):
+            messages = await rewrite_prompt.ainvoke({"question": state["question"], "n": n_queries})
+            async with limits.llm:
+                response = await llm.ainvoke(messages)
+        lines = [line.strip(" -*0123456789.").strip() for line in _text(response).splitlines()]
+        queries = [line for line in lines if line][:n_queries]
+        return {"queries": [state["question"], *queries]}
+
+    async def search(query):
+        async with limits.embeddings:
+            vector = await embeddings.aembed_query(query)
+        return await vector_store.asimilarity_search_by_vector(vector, k=k)
+
+    async def retrieve(state: State):
+        queries = state.get("queries") or [state["question"]]
+        with span("retrieve", queries=len(queries)):
+            results = await asyncio.gather(*(search(query) for query in queries))
+        if len(results) == 1:
+            return {"context": results[0]}
+        return {"context": reciprocal_rank_fusion(results, k=k)}
+
+    async def generate(state: State):
+        with span("pack"):
+            docs_content = pack_context(state["context"], state["question"], budget_tokens=context_tokens).text
+        messages = await prompt.ainvoke({"question": state["question"], "context": docs_content})
+        with span("generate"):
+            async with limits.llm:
+                response = await llm.ainvoke(messages)
+        return {"answer": _text(response)}
+
+    steps = [rewrite, retrieve, generate] if multi_query else [retrieve, generate]
+    builder = StateGraph(State).add_sequence(steps)
+    builder.add_edge(START, steps[0].__name__)
+    return builder.compile()
+
+
+async def answer_all(graph, questions, concurrency):
+    """Run every question through the graph with at most `concurrency` in flight"""
+    return await graph.abatch([{"question": q} for q in questions], config={"max_concurrency": concurrency},
+                              return_exceptions=True)
+
+
+def _fake_components(latency):
+    import pandas as pd
+    from langchain_core.vectorstores import InMemoryVectorStore
+    from fake_models import FakeEmbeddings, FakeLLM
+
+    rag_dir = os.path.dirname(os.path.abspath(__file__))
+    df = pd.read_csv(os.path.join(rag_dir, "local_restaurant_reviews", "synthetic_reviews.csv"))
+    embeddings = FakeEmbeddings(seconds_per_text=latency / 10)
+    vector_store = InMemoryVectorStore(embeddings)
+    vector_store.add_documents([
+        Document(page_content=f"{row.title} {row.text_of_review}", metadata={"rating": int(row.rating)})
+        for row in df.itertuples()
+    ])
+    llm = FakeLLM(first_token_seconds=latency)
+    prompt = ChatPromptTemplate.from_template("Context: {context}\n\nQuestion: {question}")
+    questions = [f"{row.title}?" for row in df.itertuples()]
+    return vector_store, embeddings, llm, prompt, questions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Answer many questions concurrently with the async RAG graph")
+    parser.add_argument("--questions", help="JSONL file of questions (see batch_qa.py)")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[8],
+                        help="questions in flight; several values compare throughput")
+    parser.add_argument("--multi-query", action="store_true", help="retrieve for rewritten sub-queries too")
+    parser.add_argument("--n-queries", type=int, default=3)
+    parser.add_argument("--llm-limit", type=int, help="concurrent LLM calls (RAG_LLM_CONCURRENCY)")
+    parser.add_argument("--embed-limit", type=int, help="concurrent embedding calls (RAG_EMBED_CONCURRENCY)")
+    parser.add_argument("--fake", action="store_true", help="offline run with fake models and the review CSV")
+    parser.add_argument("--fake-latency", type=float, default=0.1, help="simulated LLM latency in --fake mode")
+    args = parser.parse_args()
+    configure_from_env()
+
+    if args.fake:
+        vector_store, embeddings, llm, prompt, questions = _fake_components(args.fake_latency)
+    else:
+        # Builds (or loads the snapshot of) the blog index used by the sync graph
+        from test_rag_basics_1 import embeddings, llm, prompt, vector_store
+        questions = ["What is Task Decomposition?"]
+    if args.questions:
+        from batch_qa import read_questions
+        questions = [item["question"] for item in read_questions(args.questions)]
+
+    async def run(concurrency):
+        limits = CallLimits(llm=args.llm_limit, embeddings=args.embed_limit)
+        graph = build_async_graph(vector_store, embeddings, llm, prompt, limits=limits,
+                                  multi_query=args.multi_query, n_queries=args.n_queries)
+        started = time.perf_counter()
+        results = await answer_all(graph, questions, concurrency)
+        return results, time.perf_counter() - started
+
+    for concurrency in args.concurrency:
+        results, elapsed = asyncio.run(run(concurrency))
+        failed = [r for r in results if isinstance(r, Exception)]
+        rate = (len(results) - len(failed)) / elapsed * 60
+        print(f"⚡ concurrency {concurrency:>3}: {len(results)} questions in {elapsed:.2f} s "
+              f"({rate:.0f} questions/min, {len(failed)} failed)")
+        if failed:
+            print(f"  ❌ {type(failed[0]).__name__}: {failed[0]}")
+    if len(questions) == 1 and not failed:
+        print(results[0]["answer"])
+
+
+if __name__ == "__main__":
+    main()
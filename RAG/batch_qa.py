@@ -0,0 +1,207 @@
+#!/usr/bin/env python3
+"""
+Batch question answering over the RAG pipelines.
+
+Reads questions from JSONL ({"id": ..., "question": ...} per line) and
+writes one JSON line per answer with its sources and timings:
+
+    python RAG/batch_qa.py --pipeline reviews --input questions.jsonl --output answers.jsonl
+    python RAG/batch_qa.py --pipeline travel --input questions.jsonl --output answers.jsonl \\
+        --retrieval-concurrency 16 --generation-concurrency 4
+
+Work is pipelined:
+  - all query embeddings are computed up front in batched requests and
+    cached, so retrieval only searches
+  - retrieval runs concurrently (--retrieval-concurrency)
+  - each question moves on to generation as soon as its documents are
+    back, with at most --generation-concurrency LLM calls in flight
+Answers are written in completion order as they finish, and the run ends
+with the throughput in questions per minute.
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+
+from tracing import configure_from_env
+
+RAG_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(RAG_DIR)
+
+# Same prompts as the REPLs (rag_with_local_model.py, rag_withPDF_local_model.py)
+REVIEWS_TEMPLATE = """
+You are a helpful assistant that can answer questions about a restaurant.
+
+Here are some relavant reviews : {reviews}
+
+Here is the question to answer : {question}
+"""
+
+TRAVEL_TEMPLATE = """
+You are a helpful travel assistant that can answer questions about travel documents, reservations, and travel information.
+
+Here are some relevant travel documents: {documents}
+
+Here is the question to answer: {question}
+"""
+
+# name -> (module, module directory, working directory, prompt template, context variable)
+PIPELINES = {
+    "reviews": ("vector_store", os.path.join(RAG_DIR, "local_restaurant_reviews"), REPO_DIR,
+                REVIEWS_TEMPLATE, "reviews"),
+    "travel": ("vector_store_PDF", os.path.join(RAG_DIR, "local_travel_pdf_files"),
+               os.path.join(RAG_DIR, "local_travel_pdf_files"), TRAVEL_TEMPLATE, "documents"),
+}
+
+
+def read_questions(path):
+    questions = []
+    with open(path, encoding="utf-8") as f:
+        for line_number, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            item = json.loads(line)
+            if isinstance(item, str):
+                item = {"question": item}
+            if not item.get("question"):
+                raise ValueError(f"{path}:{line_number}: missing 'question'")
+            item.setdefault("id", str(line_number))
+            questions.append(item)
+    return questions
+
+
+def sources_of(documents):
+    return [{"id": getattr(doc, "id", None), **(doc.metadata or {})} for doc in documents]
+
+
+class BatchRunner:
+    """Retrieval and generation for many questions with separate concurrency limits"""
+
+    def __init__(self, retriever, chain, context_key, context_tokens=1500, pack=True,
+                 retrieval_concurrency=8, generation_concurrency=2):
+        self.retriever = retriever
+        self.chain = chain
+        self.context_key = context_key
+        self.context_tokens = context_tokens
+        self.pack = pack
+        self.retrieval_limit = asyncio.Semaphore(retrieval_concurrency)
+        self.generation_limit = asyncio.Semaphore(generation_concurrency)
+
+    async def answer(self, item):
+        from context_packing import pack_context
+
+        question = item["question"]
+        record = {"id": item["id"], "question": question}
+        started = time.perf_counter()
+        try:
+            async with self.retrieval_limit:
+                retrieval_started = time.perf_counter()
+                documents = await self.retriever.ainvoke(question)
+                record["retrieval_ms"] = (time.perf_counter() - retrieval_started) * 1000
+            context = documents
+            if self.pack:
+                packed = pack_context(documents, question, budget_tokens=self.context_tokens,
+                                      baseline_text=str(documents))
+                context = packed.text
+                record["context_tokens"] = packed.tokens
+            async with self.generation_limit:
+                generation_started = time.perf_counter()
+                answer = await self.chain.ainvoke({self.context_key: context, "question": question})
+                record["generation_ms"] = (time.perf_counter() - generation_started) * 1000
+            record["answer"] = answer if isinstance(answer, str) else getattr(answer, "content", str(answer))
+            record["sources"] = sources_of(documents)
+        except Exception as e:
+            record["error"] = f"{type(e).__name__}: {e}"
+        # Includes time spent waiting for a free slot
+        record["latency_ms"] = (time.perf_counter() - started) * 1000
+        return record
+
+    async def run(self, questions, out):
+        """Answer every question, writing records to out as they complete"""
+        failed = 0
+        tasks = [asyncio.create_task(self.answer(item)) for item in questions]
+        for done, task in enumerate(asyncio.as_completed(tasks), 1):
+            record = await task
+            failed += "error" in record
+            out.write(json.dumps(record, ensure_ascii=False, default=str) + "\n")
+            out.flush()
+            if done % 10 == 0 or done == len(tasks):
+                print(f"  ✅ {done}/{len(tasks)} done ({failed} failed)")
+        return failed
+
+
+def prewarm_query_embeddings(embeddings, questions, batch_size):
+    """Embed every question in batches so retrieval finds them in the cache"""
+    if not getattr(embeddings, "cache", None) or not hasattr(embeddings, "embed_queries"):
+        print("⚠️  Embedding cache is off; queries are embedded one by one during retrieval")
+        return
+    started = time.perf_counter()
+    embeddings.embed_queries([item["question"] for item in questions], batch_size=batch_size)
+    print(f"🔢 Embedded {len(questions)} queries in {time.perf_counter() - started:.2f} s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Answer a JSONL file of questions with a RAG pipeline")
+    parser.add_argument("--pipeline", choices=list(PIPELINES), default="reviews")
+    parser.add_argument("--input", required=True, help="JSONL with one {\"id\", \"question\"} object per line")
+    parser.add_argument("--output", required=True, help="JSONL file to write answers to")
+    parser.add_argument("--model", default="llama3.2")
+    parser.add_argument("--k", type=int, default=5, help="documents retrieved per question")
+    parser.add_argument("--embed-batch-size", type=int, default=32)
+    parser.add_argument("--retrieval-concurrency", type=int, default=8)
+    parser.add_argument("--generation-concurrency", type=int, default=2)
+    parser.add_argument("--context-tokens", type=int, default=1500, help="token budget for retrieved context")
+    parser.add_argument("--no-pack", action="store_true", help="pass the retrieved Documents to the prompt as they are")
+    parser.add_argument("--temperature", type=float, default=None,
+                        help="sampling temperature (default: RAG_LLM_TEMPERATURE, else the model's); "
+                             "only 0 is served from the LLM response cache")
+    args = parser.parse_args()
+    configure_from_env()
+
+    input_path = os.path.abspath(args.input)
+    output_path = os.path.abspath(args.output)
+    questions = read_questions(input_path)
+    print(f"📥 {len(questions)} questions from {args.input}")
+
+    module_name, module_dir, cwd, template, context_key = PIPELINES[args.pipeline]
+    # The vector store modules use database paths relative to where their REPL runs
+    os.chdir(cwd)
+    sys.path.insert(0, module_dir)
+    import importlib
+    from langchain_core.prompts import ChatPromptTemplate
+    from langchain_ollama.llms import OllamaLLM
+    from llm_cache import get_shared_llm_cache, sampling_from_env, with_llm_cache
+
+    store = importlib.import_module(module_name)
+    retriever = store.get_retriever(k=args.k)
+    llm = with_llm_cache(OllamaLLM(model=args.model, **sampling_from_env(args.temperature)))
+    chain = ChatPromptTemplate.from_template(template) | llm
+
+    started = time.perf_counter()
+    prewarm_query_embeddings(store.get_vector_store().embeddings, questions, args.embed_batch_size)
+    runner = BatchRunner(
+        retriever, chain, context_key,
+        context_tokens=args.context_tokens,
+        pack=not args.no_pack,
+        retrieval_concurrency=args.retrieval_concurrency,
+        generation_concurrency=args.generation_concurrency,
+    )
+    with open(output_path, "w", encoding="utf-8") as out:
+        failed = asyncio.run(runner.run(questions, out))
+    elapsed = time.perf_counter() - started
+
+    answered = len(questions) - failed
+    rate = answered / elapsed * 60 if elapsed > 0 else 0.0
+    print(f"\n📊 {answered}/{len(questions)} answered in {elapsed:.1f} s ({rate:.1f} questions/min)")
+    print(f"📝 Answers written to {args.output}")
+    if get_shared_llm_cache():
+        print(f"💾 {get_shared_llm_cache().summary()}")
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
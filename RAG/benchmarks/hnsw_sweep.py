@@ -0,0 +1,223 @@
+#!/usr/bin/env python3
+"""
+Sweep Chroma HNSW settings against exact search on a persisted collection.
+
+The vectors of an existing collection (or a synthetic corpus) are copied
+into one scratch collection per (space, M, construction_ef). Each is then
+probed in a fresh interpreter for every search_ef, with search_ef set
+before the index loads, as the vector stores do. Reported per setting:
+  - recall@k:    overlap with exact search in the same space
+  - p50/p99:     single-query latency
+  - build:       time to insert every vector
+  - disk:        size of the persisted collection
+  - rss:         resident memory added by loading the index and querying
+
+Queries are stored vectors with noise added, so no embedding model is
+needed. The live collection is only read.
+
+    python RAG/benchmarks/hnsw_sweep.py --db RAG/local_travel_pdf_files/chroma_travel_db
+    python RAG/benchmarks/hnsw_sweep.py --synthetic 20000 --M 8 16 32 --search-ef 10 50 100 --json hnsw.json
+
+The best setting reaching --target-recall is printed as RAG_HNSW_*
+variables (see hnsw_config.py).
+"""
+import argparse
+import itertools
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from vector_backend_benchmark import dir_size, make_corpus
+
+RAG_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PROBE = r"""
+import json, os, time
+import numpy as np
+
+def rss_bytes():
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    import resource
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+import chromadb
+queries = np.load(os.path.join({workdir!r}, "queries.npy"))
+rss0 = rss_bytes()
+collection = chromadb.PersistentClient(path={store_dir!r}).get_collection("sweep")
+# ef_search is read when the index loads, so it has to be set before the first query
+collection.modify(configuration={{"hnsw": {{"ef_search": {search_ef}}}}})
+latencies, found = [], []
+for query in queries:
+    started = time.perf_counter()
+    result = collection.query(query_embeddings=[query.tolist()], n_results={k}, include=[])
+    latencies.append(time.perf_counter() - started)
+    found.append([int(i) for i in result["ids"][0]])
+print("SWEEP_RESULT " + json.dumps({{
+    "first_query_ms": latencies[0] * 1000,
+    "p50_ms": float(np.percentile(latencies[1:] or latencies, 50)) * 1000,
+    "p99_ms": float(np.percentile(latencies[1:] or latencies, 99)) * 1000,
+    "rss_mb": (rss_bytes() - rss0) / 1e6,
+    "found": found,
+}}))
+"""
+
+
+def default_db():
+    sys.path.insert(0, RAG_DIR)
+    from index_generations import current_location
+    return current_location(os.path.join(RAG_DIR, "local_travel_pdf_files", "chroma_travel_db"))
+
+
+def load_vectors(db, collection_name, page=5000):
+    """Every embedding stored in a persisted Chroma collection, as float32 rows"""
+    import chromadb
+    collection = chromadb.PersistentClient(path=db).get_collection(collection_name)
+    rows = []
+    for offset in range(0, collection.count(), page):
+        rows.extend(collection.get(include=["embeddings"], limit=page, offset=offset)["embeddings"])
+    return np.asarray(rows, dtype=np.float32)
+
+
+def noisy_queries(vectors, count, noise, seed=0):
+    rng = np.random.default_rng(seed)
+    picks = vectors[rng.integers(0, len(vectors), count)]
+    scale = noise * np.linalg.norm(picks, axis=1, keepdims=True) / np.sqrt(vectors.shape[1])
+    return (picks + scale * rng.normal(size=picks.shape)).astype(np.float32)
+
+
+def exact_neighbours(vectors, queries, k, space):
+    """Row indices of the k nearest vectors to each query under space"""
+    if space == "l2":
+        distances = (queries ** 2).sum(1)[:, None] - 2 * queries @ vectors.T + (vectors ** 2).sum(1)[None, :]
+        return np.argsort(distances, axis=1)[:, :k]
+    if space == "cosine":
+        vectors = vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+        queries = queries / np.maximum(np.linalg.norm(queries, axis=1, keepdims=True), 1e-12)
+    return np.argsort(-(queries @ vectors.T), axis=1)[:, :k]
+
+
+def build(store_dir, vectors, space, M, construction_ef, batch=5000):
+    import chromadb
+    collection = chromadb.PersistentClient(path=store_dir).create_collection(
+        "sweep", configuration={"hnsw": {"space": space, "max_neighbors": M, "ef_construction": construction_ef}},
+    )
+    started = time.perf_counter()
+    for start in range(0, len(vectors), batch):
+        collection.add(ids=[str(i) for i in range(start, min(start + batch, len(vectors)))],
+                       embeddings=vectors[start:start + batch])
+    return time.perf_counter() - started
+
+
+def probe(store_dir, workdir, search_ef, k):
+    code = PROBE.format(workdir=workdir, store_dir=store_dir, search_ef=search_ef, k=k)
+    proc = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True)
+    for line in proc.stdout.splitlines():
+        if line.startswith("SWEEP_RESULT "):
+            return json.loads(line[len("SWEEP_RESULT "):])
+    raise RuntimeError(f"probe failed:\n{proc.stderr.strip()[-2000:]}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Recall/latency/size sweep over Chroma HNSW settings")
+    parser.add_argument("--db", help="persisted Chroma directory (default: the live travel database)")
+    parser.add_argument("--collection", default="travel_documents")
+    parser.add_argument("--synthetic", type=int, help="sweep this many synthetic vectors instead of a database")
+    parser.add_argument("--dim", type=int, default=1024, help="dimensions of --synthetic vectors")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--noise", type=float, default=0.3, help="relative noise added to stored vectors for queries")
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--space", nargs="+", default=["l2"], choices=["l2", "cosine", "ip"])
+    parser.add_argument("--M", nargs="+", type=int, default=[8, 16, 32])
+    parser.add_argument("--construction-ef", nargs="+", type=int, default=[100, 200])
+    parser.add_argument("--search-ef", nargs="+", type=int, default=[10, 25, 50, 100, 200])
+    parser.add_argument("--target-recall", type=float, default=0.95, help="recall the suggested setting must reach")
+    parser.add_argument("--json", help="write results to this file")
+    args = parser.parse_args()
+
+    try:
+        import chromadb  # noqa: F401
+    except ImportError:
+        sys.exit("❌ chromadb is not installed")
+
+    if args.synthetic:
+        vectors, queries = make_corpus(args.synthetic, args.dim, args.queries)
+        source = f"{args.synthetic} synthetic vectors"
+    else:
+        db = args.db or default_db()
+        vectors = load_vectors(db, args.collection)
+        if len(vectors) == 0:
+            sys.exit(f"❌ {args.collection} in {db} is empty")
+        queries = noisy_queries(vectors, args.queries, args.noise)
+        source = f"{args.collection} in {db}"
+    k = min(args.k, len(vectors))
+
+    workdir = tempfile.mkdtemp(prefix="rag_hnsw_")
+    np.save(os.path.join(workdir, "queries.npy"), queries)
+    print(f"📐 {source}: {len(vectors)} x {vectors.shape[1]} dims, {len(queries)} queries, k={k}")
+    print(f"  {'space':<7} {'M':>3} {'c_ef':>5} {'s_ef':>5} {'recall':>7} {'p50 ms':>7} {'p99 ms':>7} "
+          f"{'build s':>8} {'disk MB':>8} {'rss MB':>7}")
+
+    results = []
+    try:
+        truths = {}
+        for space, M, construction_ef in itertools.product(args.space, args.M, args.construction_ef):
+            if space not in truths:
+                truths[space] = exact_neighbours(vectors, queries, k, space)
+            store_dir = os.path.join(workdir, f"{space}-{M}-{construction_ef}")
+            try:
+                build_seconds = build(store_dir, vectors, space, M, construction_ef)
+            except Exception as e:
+                print(f"  ❌ space={space} M={M} construction_ef={construction_ef}: {e}")
+                continue
+            disk_mb = dir_size(store_dir) / 1e6
+            for search_ef in args.search_ef:
+                try:
+                    result = probe(store_dir, workdir, search_ef, k)
+                except Exception as e:
+                    print(f"  ❌ space={space} M={M} construction_ef={construction_ef} search_ef={search_ef}: {e}")
+                    continue
+                found = result.pop("found")
+                result.update(space=space, M=M, construction_ef=construction_ef, search_ef=search_ef,
+                              build_s=build_seconds, disk_mb=disk_mb, recall=float(np.mean([
+                                  len(set(hits) & set(expected.tolist())) / k
+                                  for hits, expected in zip(found, truths[space])
+                              ])))
+                results.append(result)
+                print(f"  {space:<7} {M:>3} {construction_ef:>5} {search_ef:>5} {result['recall']:7.3f} "
+                      f"{result['p50_ms']:7.2f} {result['p99_ms']:7.2f} {build_seconds:8.1f} {disk_mb:8.1f} "
+                      f"{result['rss_mb']:7.1f}")
+            shutil.rmtree(store_dir, ignore_errors=True)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    good = [r for r in results if r["recall"] >= args.target_recall]
+    if good:
+        best = min(good, key=lambda r: (r["p99_ms"], r["rss_mb"]))
+        print(f"\n🏁 Fastest setting with recall >= {args.target_recall}: recall {best['recall']:.3f}, "
+              f"p99 {best['p99_ms']:.2f} ms")
+        print(f"  RAG_HNSW_SPACE={best['space']} RAG_HNSW_M={best['M']} "
+              f"RAG_HNSW_CONSTRUCTION_EF={best['construction_ef']} RAG_HNSW_SEARCH_EF={best['search_ef']}")
+    elif results:
+        print(f"\n⚠️  No setting reached recall {args.target_recall}; try larger --M / --search-ef")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"source": source, "vectors": len(vectors), "queries": len(queries), "k": k,
+                       "results": results}, f, indent=2)
+        print(f"📝 Results written to {args.json}")
+
+
+if __name__ == "__main__":
+    main()
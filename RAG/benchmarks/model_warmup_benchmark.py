@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+First-query latency with and without model_keeper.py, against fake_ollama.py.
+
+The fake server charges --load-seconds for the first request to a model
+that is not loaded, like a real Ollama loading weights. One "query" is an
+embedding of the question plus a short LLM answer, sent through the same
+OllamaEmbeddings / OllamaLLM clients the REPLs use. Scenarios:
+  - cold:     nothing preloads the models (the old REPL startup)
+  - warmed:   a ModelKeeper preloaded them before the first question
+  - evicted:  both models were unloaded mid-session and the keeper's
+              periodic check reloaded them before the next question
+Reported per scenario: first-query latency, steady-state p50 over the
+following queries, and how many model loads the server performed.
+
+    python RAG/benchmarks/model_warmup_benchmark.py
+    python RAG/benchmarks/model_warmup_benchmark.py --load-seconds 3 --json warmup.json
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+
+RAG_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAG_DIR)
+
+LLM = "llama3.2"
+EMBEDDING_MODEL = "mxbai-embed-large"
+
+
+def query_seconds(embeddings, llm, i):
+    started = time.perf_counter()
+    embeddings.embed_query(f"question {i}")
+    llm.invoke(f"question {i}")
+    return time.perf_counter() - started
+
+
+def measure(server, embeddings, llm, queries, run):
+    loads_before = server.loads
+    latencies = [query_seconds(embeddings, llm, f"{run} {i}") for i in range(queries)]
+    steady = latencies[1:] or latencies
+    return {
+        "first_ms": latencies[0] * 1000,
+        "steady_p50_ms": statistics.median(steady) * 1000,
+        "loads_during_queries": server.loads - loads_before,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="First-query latency with and without model warm-up")
+    parser.add_argument("--load-seconds", type=float, default=1.5, help="simulated cold load per model")
+    parser.add_argument("--latency", type=float, default=0.01, help="fake server latency per request")
+    parser.add_argument("--queries", type=int, default=10, help="queries per scenario")
+    parser.add_argument("--rewarm-seconds", type=float, default=0.5, help="keeper check interval")
+    parser.add_argument("--json", help="write results to this file")
+    args = parser.parse_args()
+
+    import fake_ollama
+    from langchain_ollama import OllamaEmbeddings
+    from langchain_ollama.llms import OllamaLLM
+    from model_keeper import ModelKeeper
+
+    server, base_url = fake_ollama.start_in_thread(port=0, latency=args.latency, load_seconds=args.load_seconds)
+    embeddings = OllamaEmbeddings(model=EMBEDDING_MODEL, base_url=base_url, keep_alive=1800)
+    llm = OllamaLLM(model=LLM, base_url=base_url, keep_alive=1800)
+    keeper = ModelKeeper({EMBEDDING_MODEL: "embed", LLM: "generate"}, base_url=base_url, keep_alive=1800,
+                         rewarm_interval=args.rewarm_seconds)
+    results = {}
+    try:
+        results["cold"] = measure(server, embeddings, llm, args.queries, "cold")
+
+        server.evict()
+        keeper.start()
+        keeper.wait()
+        results["warmed"] = measure(server, embeddings, llm, args.queries, "warmed")
+
+        server.evict()
+        # One check interval to notice, then both loads
+        deadline = time.time() + args.rewarm_seconds + 2 * args.load_seconds + 5
+        while len(server.running()) < 2 and time.time() < deadline:
+            time.sleep(0.05)
+        results["evicted"] = measure(server, embeddings, llm, args.queries, "evicted")
+    finally:
+        keeper.stop()
+        server.shutdown()
+
+    print(f"🧪 Fake Ollama with {args.load_seconds:g} s cold load per model")
+    print(f"  {'scenario':<9} {'first ms':>9} {'p50 ms':>8} {'loads':>6}")
+    for name, result in results.items():
+        print(f"  {name:<9} {result['first_ms']:9.1f} {result['steady_p50_ms']:8.1f} "
+              f"{result['loads_during_queries']:>6}")
+    print(keeper.summary())
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"load_seconds": args.load_seconds, "results": results, "keeper": keeper.stats()}, f, indent=2)
+        print(f"📝 Results written to {args.json}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,353 @@
+#!/usr/bin/env python3
+"""
+Offline benchmark suite for the RAG pipelines.
+
+Stages:
+  - pdf_parse:     PDF parse/split throughput of the travel ingestion path,
+                   serial and with a process pool
+  - csv_documents: CSV-to-Document throughput of the review ingestion path
+  - embed_upsert:  embedding and upsert rate per vector store backend
+  - retrieval:     vector and hybrid retriever p50/p95/p99 latency, and
+                   recall@k of the vector search against exact brute force
+  - end_to_end:    retrieval + context packing + generation latency and
+                   time to first token
+
+Embeddings and the LLM are the deterministic stand-ins from fake_models.py,
+so the suite runs offline on a CPU-only box and repeated runs see the same
+data. Results are written as JSON; --compare flags metrics that got worse
+than a previous run by more than --tolerance:
+
+    python RAG/benchmarks/rag_benchmark.py --json bench.json
+    python RAG/benchmarks/rag_benchmark.py --json new.json --compare bench.json
+
+Stages whose dependencies are missing (pypdf, chromadb, ...) are recorded
+as skipped.
+"""
+import argparse
+import datetime
+import glob
+import io
+import json
+import os
+import platform
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+RAG_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+REVIEWS_DIR = os.path.join(RAG_DIR, "local_restaurant_reviews")
+TRAVEL_DIR = os.path.join(RAG_DIR, "local_travel_pdf_files")
+for path in (RAG_DIR, REVIEWS_DIR, TRAVEL_DIR):
+    if path not in sys.path:
+        sys.path.append(path)
+
+BACKENDS = ["chroma", "numpy"]
+
+
+def latency_stats(seconds):
+    values = np.asarray(seconds) * 1000
+    return {
+        "count": len(values),
+        "mean_ms": float(values.mean()),
+        "p50_ms": float(np.percentile(values, 50)),
+        "p95_ms": float(np.percentile(values, 95)),
+        "p99_ms": float(np.percentile(values, 99)),
+    }
+
+
+def bench_pdf_parse(workers):
+    from pdf_parsing import iter_parsed_pdfs
+
+    pdf_files = sorted(glob.glob(os.path.join(TRAVEL_DIR, "travel", "*.pdf")))
+    if not pdf_files:
+        return {"skipped": "no PDFs in local_travel_pdf_files/travel"}
+    result = {"files": len(pdf_files), "runs": {}}
+    for worker_count in sorted({1, workers}):
+        started = time.perf_counter()
+        pages = failed = 0
+        for _, page_documents, error in iter_parsed_pdfs(pdf_files, workers=worker_count):
+            if error:
+                failed += 1
+            else:
+                pages += len(page_documents)
+        seconds = time.perf_counter() - started
+        result["pages"] = pages
+        result["failed_files"] = failed
+        result["runs"][str(worker_count)] = {"seconds": seconds, "pages_per_second": pages / seconds}
+    return result
+
+
+def write_review_csv(path, rows, seed=0):
+    """Review CSV with `rows` rows recombined from synthetic_reviews.csv"""
+    import pandas as pd
+
+    source = pd.read_csv(os.path.join(REVIEWS_DIR, "synthetic_reviews.csv"))
+    rng = random.Random(seed)
+    records = []
+    for i in range(rows):
+        a, b = source.iloc[rng.randrange(len(source))], source.iloc[rng.randrange(len(source))]
+        records.append({
+            "title": a["title"],
+            "date_of_review": b["date_of_review"],
+            "rating": int(a["rating"]),
+            "text_of_review": f"{a['text_of_review']} {b['text_of_review']} Visit {i}.",
+        })
+    pd.DataFrame(records).to_csv(path, index=False)
+
+
+def bench_csv_documents(csv_path):
+    import vector_store as review_store
+
+    review_store.csv_location = csv_path
+    started = time.perf_counter()
+    documents, ids = review_store.load_documents()
+    seconds = time.perf_counter() - started
+    stats = {"documents": len(documents), "seconds": seconds, "documents_per_second": len(documents) / seconds}
+    return stats, documents, ids
+
+
+def open_backend(backend, path, embeddings):
+    if backend == "chroma":
+        from langchain_chroma import Chroma
+        return Chroma(collection_name="benchmark", persist_directory=path, embedding_function=embeddings)
+    from numpy_vector_store import NumpyVectorStore
+    return NumpyVectorStore(path, embeddings)
+
+
+def bench_embed_upsert(store, embeddings, documents, ids, batch_size):
+    """Embed and upsert in batches the way embedding_client.py does"""
+    from keyword_index import _plain
+
+    collection = store._collection
+    vectors = []
+    embed_seconds = upsert_seconds = 0.0
+    for start in range(0, len(documents), batch_size):
+        batch = documents[start:start + batch_size]
+        texts = [doc.page_content for doc in batch]
+        t0 = time.perf_counter()
+        batch_vectors = embeddings.embed_documents(texts)
+        t1 = time.perf_counter()
+        collection.upsert(
+            ids=ids[start:start + batch_size],
+            embeddings=batch_vectors,
+            documents=texts,
+            metadatas=[{key: _plain(value) for key, value in doc.metadata.items()} for doc in batch],
+        )
+        t2 = time.perf_counter()
+        embed_seconds += t1 - t0
+        upsert_seconds += t2 - t1
+        vectors.extend(batch_vectors)
+    total = embed_seconds + upsert_seconds
+    stats = {
+        "documents": len(documents),
+        "embed_per_second": len(documents) / embed_seconds,
+        "upsert_per_second": len(documents) / upsert_seconds,
+        "documents_per_second": len(documents) / total,
+    }
+    return stats, np.asarray(vectors, dtype=np.float32)
+
+
+def make_queries(documents, count, seed=0):
+    """Short queries made of words from random documents"""
+    rng = random.Random(seed)
+    queries = []
+    for _ in range(count):
+        words = rng.choice(documents).page_content.split()
+        size = min(len(words), rng.randint(3, 6))
+        start = rng.randrange(len(words) - size + 1)
+        queries.append(" ".join(words[start:start + size]))
+    return queries
+
+
+def bench_retrieval(store, keyword_index, embeddings, vectors, ids, queries, k):
+    from hybrid_retriever import HybridRetriever
+
+    query_vectors = np.asarray(embeddings.embed_documents(queries), dtype=np.float32)
+    exact_scores = query_vectors @ vectors.T
+    # Score of the k-th exact hit; anything scoring as high counts, so ties do not lower recall
+    kth_scores = -np.partition(-exact_scores, k - 1, axis=1)[:, k - 1]
+    rows = {doc_id: row for row, doc_id in enumerate(ids)}
+
+    retriever = store.as_retriever(search_kwargs={"k": k})
+    latencies, recalls = [], []
+    for query, scores, kth in zip(queries, exact_scores, kth_scores):
+        started = time.perf_counter()
+        found = retriever.invoke(query)
+        latencies.append(time.perf_counter() - started)
+        hits = sum(1 for doc in found if doc.id in rows and scores[rows[doc.id]] >= kth - 1e-6)
+        recalls.append(hits / k)
+    result = {"vector": latency_stats(latencies), "recall_at_k": float(np.mean(recalls)), "k": k}
+
+    hybrid = HybridRetriever(vector_store=store, keyword_index=keyword_index, k=k)
+    latencies = []
+    for query in queries:
+        started = time.perf_counter()
+        hybrid.invoke(query)
+        latencies.append(time.perf_counter() - started)
+    result["hybrid"] = latency_stats(latencies)
+    return result
+
+
+def bench_end_to_end(retriever, queries, llm, context_tokens):
+    from langchain_core.prompts import ChatPromptTemplate
+    from batch_qa import REVIEWS_TEMPLATE
+    from context_packing import pack_context
+    from streaming import generate_answer
+
+    chain = ChatPromptTemplate.from_template(REVIEWS_TEMPLATE) | llm
+    totals, first_tokens = [], []
+    for query in queries:
+        started = time.perf_counter()
+        documents = retriever.invoke(query)
+        retrieval_seconds = time.perf_counter() - started
+        packed = pack_context(documents, query, budget_tokens=context_tokens)
+        _, metrics = generate_answer(chain, {"reviews": packed.text, "question": query},
+                                     started, retrieval_seconds, stream=True, out=io.StringIO())
+        totals.append(metrics.total_seconds)
+        first_tokens.append(metrics.first_token_seconds)
+    return {"total": latency_stats(totals), "first_token": latency_stats(first_tokens)}
+
+
+def run_stage(results, name, fn, *args):
+    print(f"⏱️  {name}")
+    try:
+        results[name] = fn(*args)
+    except ImportError as e:
+        results[name] = {"skipped": f"missing dependency: {e.name or e}"}
+        print(f"  ⚠️  skipped ({results[name]['skipped']})")
+    return results[name]
+
+
+def flatten(data, prefix=""):
+    flat = {}
+    for key, value in data.items():
+        path = f"{prefix}{key}"
+        if isinstance(value, dict):
+            flat.update(flatten(value, path + "."))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[path] = value
+    return flat
+
+
+def compare(current, baseline, tolerance):
+    """Print metrics that moved by more than tolerance; return the regressions"""
+    now, before = flatten(current), flatten(baseline)
+    regressions = []
+    for key in sorted(now.keys() & before.keys()):
+        lower_is_better = key.endswith("_ms") or key.endswith("seconds")
+        higher_is_better = key.endswith("per_second") or key.endswith("recall_at_k")
+        if not (lower_is_better or higher_is_better) or not before[key]:
+            continue
+        change = (now[key] - before[key]) / before[key]
+        if abs(change) < tolerance:
+            continue
+        worse = change > 0 if lower_is_better else change < 0
+        if worse:
+            regressions.append(key)
+        print(f"  {'❌' if worse else '✅'} {key}: {before[key]:.4g} -> {now[key]:.4g} ({change:+.0%})")
+    return regressions
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], cwd=RAG_DIR, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline benchmarks for ingestion, retrieval and generation")
+    parser.add_argument("--documents", type=int, default=2000, help="reviews generated for the CSV and index stages")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--batch-size", type=int, default=32, help="embedding/upsert batch size")
+    parser.add_argument("--pdf-workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--backends", nargs="+", default=BACKENDS, choices=BACKENDS)
+    parser.add_argument("--embed-latency", type=float, default=0.0, help="simulated seconds per embedded text")
+    parser.add_argument("--llm-first-token", type=float, default=0.0, help="simulated time to first token")
+    parser.add_argument("--llm-token-seconds", type=float, default=0.0, help="simulated seconds per token")
+    parser.add_argument("--context-tokens", type=int, default=1500)
+    parser.add_argument("--json", help="write results to this file")
+    parser.add_argument("--compare", help="previous results JSON to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.10, help="relative change reported by --compare")
+    args = parser.parse_args()
+
+    from fake_models import FakeEmbeddings, FakeLLM
+
+    embeddings = FakeEmbeddings(seconds_per_text=args.embed_latency)
+    llm = FakeLLM(first_token_seconds=args.llm_first_token, seconds_per_token=args.llm_token_seconds)
+    stages = {}
+    tmpdir = tempfile.mkdtemp(prefix="rag_benchmark_")
+    try:
+        run_stage(stages, "pdf_parse", bench_pdf_parse, args.pdf_workers)
+
+        csv_path = os.path.join(tmpdir, "reviews.csv")
+        documents = ids = None
+        print("⏱️  csv_documents")
+        try:
+            write_review_csv(csv_path, args.documents)
+            stages["csv_documents"], documents, ids = bench_csv_documents(csv_path)
+        except ImportError as e:
+            stages["csv_documents"] = {"skipped": f"missing dependency: {e.name or e}"}
+
+        if documents:
+            from keyword_index import KeywordIndex
+
+            queries = make_queries(documents, args.queries)
+            for backend in args.backends:
+                prefix = f"{backend}."
+                try:
+                    store = open_backend(backend, os.path.join(tmpdir, backend), embeddings)
+                except ImportError as e:
+                    print(f"⚠️  {backend} backend skipped (missing dependency: {e.name or e})")
+                    stages[backend] = {"skipped": f"missing dependency: {e.name or e}"}
+                    continue
+                print(f"⏱️  {prefix}embed_upsert")
+                stats, vectors = bench_embed_upsert(store, embeddings, documents, ids, args.batch_size)
+                keyword_index = KeywordIndex(os.path.join(tmpdir, backend))
+                keyword_index.upsert(ids, documents)
+                stages[backend] = {"embed_upsert": stats}
+                print(f"⏱️  {prefix}retrieval")
+                stages[backend]["retrieval"] = bench_retrieval(
+                    store, keyword_index, embeddings, vectors, ids, queries, args.k)
+                print(f"⏱️  {prefix}end_to_end")
+                stages[backend]["end_to_end"] = bench_end_to_end(
+                    store.as_retriever(search_kwargs={"k": args.k}), queries, llm, args.context_tokens)
+                keyword_index.close()
+    finally:
+        shutil.rmtree(tmpdir, ignore_errors=True)
+
+    results = {
+        "commit": git_commit(),
+        "timestamp": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "config": vars(args),
+        "stages": stages,
+    }
+    print(json.dumps(stages, indent=2))
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+        print(f"📝 Results written to {args.json}")
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+        print(f"\n🔍 Compared with {args.compare} (commit {baseline.get('commit')}):")
+        regressions = compare(stages, baseline.get("stages", {}), args.tolerance)
+        if regressions:
+            print(f"❌ {len(regressions)} metrics regressed by more than {args.tolerance:.0%}")
+            sys.exit(1)
+        print("✅ No regressions")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+"""
+Load test for retrieval_server.py with a fake query embedder.
+
+Starts the server in-process on temporary copies of both databases, with
+query embeddings answered by fake_models.FakeEmbeddings (a fixed cost per
+call stands in for an Ollama round trip). Concurrent RemoteRetriever
+clients then send distinct queries, once per max-batch setting and
+concurrency level. Reported per run:
+  - req/s:         completed retrievals per second
+  - p50/p95:       client-side latency
+  - embed calls:   calls the embedder received (one per micro-batch)
+  - mean batch:    queries per embedding call
+
+--max-batch 1 turns micro-batching off, for comparison.
+
+    python RAG/benchmarks/retrieval_server_benchmark.py
+    python RAG/benchmarks/retrieval_server_benchmark.py --concurrency 1 8 32 --fake-call-ms 30 --json server.json
+"""
+import argparse
+import json
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+RAG_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAG_DIR)
+
+from startup_benchmark import DATABASES, PIPELINES  # noqa: E402
+
+QUERIES = {
+    "reviews": ["great food", "slow service", "friendly staff", "cold pizza", "worth the price"],
+    "travel": ["travel reservation", "flight times", "hotel check-in", "baggage allowance", "cancellation policy"],
+}
+
+
+def run_load(url, collections, requests, concurrency, run=0):
+    from retrieval_server import RemoteRetriever
+
+    retrievers = {name: RemoteRetriever(url=url, collection=name) for name in collections}
+    jobs = []
+    for i in range(requests):
+        name = collections[i % len(collections)]
+        base = QUERIES[name][i % len(QUERIES[name])]
+        # Numbers make every query distinct, so the retrieval cache cannot answer it
+        jobs.append((name, f"{base} {run} {i}"))
+
+    def one(job):
+        name, query = job
+        started = time.perf_counter()
+        retrievers[name].invoke(query)
+        return time.perf_counter() - started
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        latencies = sorted(pool.map(one, jobs))
+    seconds = time.perf_counter() - started
+    return {
+        "requests": requests,
+        "seconds": seconds,
+        "requests_per_second": requests / seconds,
+        "p50_ms": statistics.median(latencies) * 1000,
+        "p95_ms": latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))] * 1000,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Latency and throughput of the retrieval server under concurrent load")
+    parser.add_argument("--collections", nargs="+", default=list(PIPELINES), choices=list(PIPELINES))
+    parser.add_argument("--requests", type=int, default=200, help="retrievals per run")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--max-batch", type=int, nargs="+", default=[1, 32], help="1 disables micro-batching")
+    parser.add_argument("--max-wait-ms", type=float, default=5.0)
+    parser.add_argument("--fake-call-ms", type=float, default=20.0, help="simulated cost of one embedding call")
+    parser.add_argument("--json", help="write results to this file")
+    args = parser.parse_args()
+
+    from fake_models import FakeEmbeddings
+    from retrieval_server import RetrievalService, start_in_thread
+
+    tmpdir = tempfile.mkdtemp(prefix="rag_server_")
+    # Opening a collection may build its keyword index; keep that off the real databases
+    db_locations = {}
+    for name in args.collections:
+        real_db = os.path.join(PIPELINES[name][2], DATABASES[name])
+        if os.path.exists(real_db):
+            db_locations[name] = os.path.join(tmpdir, name)
+            shutil.copytree(real_db, db_locations[name])
+
+    embeddings = FakeEmbeddings(seconds_per_call=args.fake_call_ms / 1000)
+    results = []
+    server = None
+    try:
+        started = time.perf_counter()
+        service = RetrievalService(args.collections, max_wait=args.max_wait_ms / 1000, embeddings=embeddings,
+                                   db_locations=db_locations)
+        print(f"📚 Collections opened in {time.perf_counter() - started:.1f} s: {service.health()['collections']}")
+        server, url = start_in_thread(service, port=0)
+        # Warm up retrievers for k=5 outside the timed runs
+        run_load(url, args.collections, len(args.collections), 1)
+
+        print(f"  {'batch':>5} {'conc':>5} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'embed calls':>12} {'mean batch':>11}")
+        for max_batch in args.max_batch:
+            for batcher in service.batchers.values():
+                batcher.max_batch = max_batch
+            for concurrency in args.concurrency:
+                calls_before = embeddings.calls
+                texts_before = embeddings.texts_embedded
+                result = run_load(url, args.collections, args.requests, concurrency, run=len(results) + 1)
+                calls = embeddings.calls - calls_before
+                result.update(max_batch=max_batch, concurrency=concurrency, embed_calls=calls,
+                              mean_batch=(embeddings.texts_embedded - texts_before) / calls if calls else 0.0)
+                results.append(result)
+                print(f"  {max_batch:>5} {concurrency:>5} {result['requests_per_second']:8.1f} "
+                      f"{result['p50_ms']:8.1f} {result['p95_ms']:8.1f} {calls:>12} {result['mean_batch']:11.1f}")
+    finally:
+        if server:
+            server.shutdown()
+        shutil.rmtree(tmpdir, ignore_errors=True)
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"fake_call_ms": args.fake_call_ms, "max_wait_ms": args.max_wait_ms, "results": results},
+                      f, indent=2)
+        print(f"📝 Results written to {args.json}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""
+Cold-start benchmark for the RAG vector store modules.
+
+Each run starts a fresh interpreter and measures, per pipeline:
+  - import:       importing the vector store module (what a REPL pays before its prompt)
+  - open:         first get_retriever() call (Chroma open, embedding client)
+  - first_query:  first retriever.invoke() (one query embedding + search)
+  - process:      wall time of the whole subprocess, interpreter start included
+
+    python RAG/benchmarks/startup_benchmark.py --runs 5
+    python RAG/benchmarks/startup_benchmark.py --fake-ollama --json startup.json
+
+--fake-ollama answers embedding calls from fake_ollama.py and runs
+against a temporary copy of each database, so the real databases and the
+embedding cache are never written to.
+"""
+import argparse
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+RAG_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+REPO_DIR = os.path.dirname(RAG_DIR)
+
+# name -> (module, module directory, working directory the REPL is run from)
+PIPELINES = {
+    "reviews": ("vector_store", os.path.join(RAG_DIR, "local_restaurant_reviews"), REPO_DIR),
+    "travel": ("vector_store_PDF", os.path.join(RAG_DIR, "local_travel_pdf_files"),
+               os.path.join(RAG_DIR, "local_travel_pdf_files")),
+}
+DATABASES = {"reviews": "chroma_langchain_db", "travel": "chroma_travel_db"}
+
+PROBE = r"""
+import json, sys, time
+t0 = time.perf_counter()
+sys.path.insert(0, {module_dir!r})
+import {module} as store
+t1 = time.perf_counter()
+if {db_location!r}:
+    store.db_location = {db_location!r}
+store.get_retriever()
+t2 = time.perf_counter()
+timings = {{"import": t1 - t0, "open": t2 - t1}}
+if {query!r}:
+    store.retriever.invoke({query!r})
+    timings["first_query"] = time.perf_counter() - t2
+print("STARTUP_TIMINGS " + json.dumps(timings))
+"""
+
+
+def run_probe(name, query, db_location, env):
+    module, module_dir, cwd = PIPELINES[name]
+    code = PROBE.format(module=module, module_dir=module_dir, query=query, db_location=db_location)
+    started = time.perf_counter()
+    proc = subprocess.run([sys.executable, "-c", code], cwd=cwd, env=env, capture_output=True, text=True)
+    elapsed = time.perf_counter() - started
+    for line in proc.stdout.splitlines():
+        if line.startswith("STARTUP_TIMINGS "):
+            timings = json.loads(line[len("STARTUP_TIMINGS "):])
+            timings["process"] = elapsed
+            return timings
+    raise RuntimeError(f"{name} probe failed:\n{proc.stderr.strip()[-2000:]}")
+
+
+def summarize(samples):
+    keys = samples[0].keys()
+    return {
+        key: {
+            "median_ms": statistics.median(s[key] for s in samples) * 1000,
+            "min_ms": min(s[key] for s in samples) * 1000,
+        }
+        for key in keys
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure cold start of the RAG vector store modules")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--pipelines", nargs="+", default=list(PIPELINES), choices=list(PIPELINES))
+    parser.add_argument("--query", default="reservation", help="first query to time ('' to skip)")
+    parser.add_argument("--fake-ollama", action="store_true", help="use fake_ollama.py and temporary databases")
+    parser.add_argument("--json", help="write results to this file")
+    args = parser.parse_args()
+
+    env = dict(os.environ)
+    tmpdir = None
+    if args.fake_ollama:
+        sys.path.insert(0, RAG_DIR)
+        import fake_ollama
+        _, base_url = fake_ollama.start_in_thread(port=0)
+        tmpdir = tempfile.mkdtemp(prefix="rag_startup_")
+        env.update(OLLAMA_HOST=base_url, OLLAMA_BASE_URL=base_url,
+                   RAG_EMBEDDING_CACHE=os.path.join(tmpdir, "embeddings.sqlite3"))
+
+    results = {}
+    try:
+        for name in args.pipelines:
+            _, _, cwd = PIPELINES[name]
+            db_location = ""
+            if tmpdir:
+                db_location = os.path.join(tmpdir, name)
+                real_db = os.path.join(cwd, DATABASES[name])
+                if os.path.exists(real_db):
+                    shutil.copytree(real_db, db_location)
+            print(f"⏱️  {name}: {args.runs} cold starts")
+            try:
+                # One untimed run builds the database if it does not exist yet
+                run_probe(name, "", db_location, env)
+                samples = [run_probe(name, args.query, db_location, env) for _ in range(args.runs)]
+            except RuntimeError as e:
+                print(f"  ❌ {e}")
+                results[name] = {"error": str(e)}
+                continue
+            results[name] = summarize(samples)
+            for key, value in results[name].items():
+                print(f"  {key:<12} median {value['median_ms']:8.1f} ms   min {value['min_ms']:8.1f} ms")
+    finally:
+        if tmpdir:
+            shutil.rmtree(tmpdir, ignore_errors=True)
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"runs": args.runs, "fake_ollama": args.fake_ollama, "results": results}, f, indent=2)
+        print(f"📝 Results written to {args.json}")
+
+
+if __name__ == "__main__":
+    main()
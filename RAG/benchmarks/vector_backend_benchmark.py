@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+"""
+Compare the NumPy vector store with Chroma on synthetic embeddings.
+
+For each corpus size a clustered set of 1024-dim unit vectors (the shape of
+mxbai-embed-large output) is written to every backend, then each backend is
+opened in a fresh interpreter and measured:
+  - import:      importing the backend's module
+  - open:        time to open the persisted store
+  - query p50/95: single-query latency
+  - batch:       queries per second when searching --batch-size queries at once
+  - rss:         resident memory added by opening the store and querying it
+  - disk:        size of the persisted files
+  - recall@k:    overlap with exact float32 search
+
+    python RAG/benchmarks/vector_backend_benchmark.py
+    python RAG/benchmarks/vector_backend_benchmark.py --sizes 50 500 20000 --json backends.json
+
+Chroma is skipped when chromadb is not installed.
+"""
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+
+import numpy as np
+
+RAG_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+BACKENDS = ["numpy-int8", "numpy-float16", "numpy-float32", "chroma"]
+
+PROBE = r"""
+import json, os, sys, time
+import numpy as np
+sys.path.insert(0, {rag_dir!r})
+
+def rss_bytes():
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    import resource
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+queries = np.load(os.path.join({workdir!r}, "queries.npy"))
+k, batch_size = {k}, {batch_size}
+t0 = time.perf_counter()
+if {backend!r} == "chroma":
+    import chromadb
+else:
+    from numpy_vector_store import NumpyVectorStore
+import_seconds = time.perf_counter() - t0
+
+rss0 = rss_bytes()
+t0 = time.perf_counter()
+if {backend!r} == "chroma":
+    collection = chromadb.PersistentClient(path={store_dir!r}).get_collection("bench")
+    def search(batch):
+        result = collection.query(query_embeddings=batch.tolist(), n_results=k, include=[])
+        return [[int(i) for i in ids] for ids in result["ids"]]
+    collection.count()
+else:
+    store = NumpyVectorStore({store_dir!r}, quantization={backend!r}.split("-")[1])
+    def search(batch):
+        return [[int(doc_id) for doc_id, _ in hits] for hits in store.search_vectors(batch, k=k)]
+open_seconds = time.perf_counter() - t0
+
+latencies, found = [], []
+for query in queries:
+    started = time.perf_counter()
+    found.extend(search(query[None, :]))
+    latencies.append(time.perf_counter() - started)
+started = time.perf_counter()
+for start in range(0, len(queries), batch_size):
+    search(queries[start:start + batch_size])
+batch_seconds = time.perf_counter() - started
+
+print("BACKEND_RESULT " + json.dumps({{
+    "import_ms": import_seconds * 1000,
+    "open_ms": open_seconds * 1000,
+    "p50_ms": float(np.percentile(latencies, 50)) * 1000,
+    "p95_ms": float(np.percentile(latencies, 95)) * 1000,
+    "batch_qps": len(queries) / batch_seconds,
+    "rss_mb": (rss_bytes() - rss0) / 1e6,
+    "found": found,
+}}))
+"""
+
+
+def make_corpus(size, dim, queries, seed=0):
+    """Clustered unit vectors and noisy queries near corpus rows"""
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(max(1, size // 20), dim)).astype(np.float32)
+    vectors = centers[rng.integers(0, len(centers), size)] + 0.5 * rng.normal(size=(size, dim)).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    picks = vectors[rng.integers(0, size, queries)]
+    query_vectors = picks + 0.3 * rng.normal(size=picks.shape).astype(np.float32)
+    query_vectors /= np.linalg.norm(query_vectors, axis=1, keepdims=True)
+    return vectors, query_vectors.astype(np.float32)
+
+
+def build(backend, store_dir, vectors):
+    ids = [str(i) for i in range(len(vectors))]
+    if backend == "chroma":
+        import chromadb
+        collection = chromadb.PersistentClient(path=store_dir).create_collection("bench")
+        for start in range(0, len(vectors), 1000):
+            collection.add(ids=ids[start:start + 1000], embeddings=vectors[start:start + 1000].tolist())
+        return
+    sys.path.insert(0, RAG_DIR)
+    from numpy_vector_store import NumpyVectorStore
+    store = NumpyVectorStore(store_dir, quantization=backend.split("-")[1])
+    store.upsert(ids, vectors, documents=[""] * len(ids))
+
+
+def dir_size(path):
+    return sum(os.path.getsize(os.path.join(root, name)) for root, _, names in os.walk(path) for name in names)
+
+
+def probe(backend, store_dir, workdir, k, batch_size):
+    code = PROBE.format(rag_dir=RAG_DIR, workdir=workdir, store_dir=store_dir, backend=backend,
+                        k=k, batch_size=batch_size)
+    proc = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True)
+    for line in proc.stdout.splitlines():
+        if line.startswith("BACKEND_RESULT "):
+            return json.loads(line[len("BACKEND_RESULT "):])
+    raise RuntimeError(f"{backend} probe failed:\n{proc.stderr.strip()[-2000:]}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the NumPy vector store with Chroma")
+    parser.add_argument("--sizes", nargs="+", type=int, default=[50, 500, 5000])
+    parser.add_argument("--dim", type=int, default=1024)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--backends", nargs="+", default=BACKENDS, choices=BACKENDS)
+    parser.add_argument("--json", help="write results to this file")
+    args = parser.parse_args()
+
+    backends = list(args.backends)
+    if "chroma" in backends:
+        try:
+            import chromadb  # noqa: F401
+        except ImportError:
+            print("⚠️  chromadb is not installed, skipping the Chroma backend")
+            backends.remove("chroma")
+
+    results = {}
+    for size in args.sizes:
+        vectors, queries = make_corpus(size, args.dim, args.queries)
+        truth = np.argsort(-(queries @ vectors.T), axis=1)[:, :args.k]
+        workdir = tempfile.mkdtemp(prefix="rag_backends_")
+        np.save(os.path.join(workdir, "queries.npy"), queries)
+        print(f"\n📐 {size} vectors x {args.dim} dims, {args.queries} queries, k={args.k}")
+        print(f"  {'backend':<14} {'import ms':>9} {'open ms':>8} {'p50 ms':>8} {'p95 ms':>8} {'batch q/s':>10} "
+              f"{'rss MB':>8} {'disk MB':>8} {'recall':>7}")
+        try:
+            for backend in backends:
+                store_dir = os.path.join(workdir, backend)
+                try:
+                    build(backend, store_dir, vectors)
+                    result = probe(backend, store_dir, workdir, args.k, args.batch_size)
+                except Exception as e:
+                    print(f"  ❌ {backend}: {e}")
+                    results.setdefault(str(size), {})[backend] = {"error": str(e)}
+                    continue
+                found = result.pop("found")
+                result["recall"] = float(np.mean([
+                    len(set(hits) & set(expected.tolist())) / args.k for hits, expected in zip(found, truth)
+                ]))
+                result["disk_mb"] = dir_size(store_dir) / 1e6
+                results.setdefault(str(size), {})[backend] = result
+                print(f"  {backend:<14} {result['import_ms']:9.1f} {result['open_ms']:8.1f} {result['p50_ms']:8.2f} {result['p95_ms']:8.2f} "
+                      f"{result['batch_qps']:10.0f} {result['rss_mb']:8.1f} {result['disk_mb']:8.1f} "
+                      f"{result['recall']:7.3f}")
+        finally:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"dim": args.dim, "queries": args.queries, "k": args.k, "results": results}, f, indent=2)
+        print(f"📝 Results written to {args.json}")
+
+
+if __name__ == "__main__":
+    main()
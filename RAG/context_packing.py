@@ -0,0 +1,172 @@
+"""
+Token-budgeted context packing for the RAG prompts.
+
+Retrieved documents are turned into a compact, citation-tagged block
+before generation instead of being pasted in whole (or as Document
+reprs with their metadata):
+  - exact and near-duplicate passages are dropped
+  - long passages are cut down to the sentences that best match the
+    question, or truncated when there is no question
+  - passages are added in retrieval order until the token budget is spent
+  - the result reports how many tokens were saved against the unpacked text
+
+Tokens are counted with tiktoken's cl100k_base encoding. That is not the
+llama3.2 tokenizer, but it is close enough to keep prompt size bounded.
+"""
+import hashlib
+import re
+from dataclasses import dataclass, field
+from functools import lru_cache
+
+_WORD = re.compile(r"\w+")
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s+|\n{2,}")
+_WHITESPACE = re.compile(r"\s+")
+
+CITATION_KEYS = ("source", "page", "rating", "date")
+
+
+@lru_cache(maxsize=None)
+def _encoding(name):
+    try:
+        import tiktoken
+        return tiktoken.get_encoding(name)
+    except Exception as e:
+        # Encodings are downloaded on first use; fall back to an estimate offline
+        print(f"⚠️  tiktoken encoding {name} unavailable ({e}), estimating tokens")
+        return None
+
+
+def count_tokens(text, encoding_name="cl100k_base"):
+    encoding = _encoding(encoding_name)
+    if encoding is None:
+        return (len(text) + 3) // 4
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def truncate_tokens(text, max_tokens, encoding_name="cl100k_base"):
+    encoding = _encoding(encoding_name)
+    if encoding is None:
+        return text[:max_tokens * 4]
+    tokens = encoding.encode(text, disallowed_special=())
+    return text if len(tokens) <= max_tokens else encoding.decode(tokens[:max_tokens])
+
+
+def _shingles(text, size=3):
+    words = _WORD.findall(text.lower())
+    if len(words) < size:
+        return {tuple(words)} if words else set()
+    return {tuple(words[i:i + size]) for i in range(len(words) - size + 1)}
+
+
+def _jaccard(a, b):
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+def citation_label(metadata):
+    """Short tag like 'source=itinerary.pdf, page=3' from the known metadata keys"""
+    parts = [f"{key}={metadata[key]}" for key in CITATION_KEYS if metadata.get(key) not in (None, "")]
+    return ", ".join(parts)
+
+
+def excerpt(text, question, max_tokens, encoding_name="cl100k_base"):
+    """Keep the sentences sharing most words with the question, in original order"""
+    if count_tokens(text, encoding_name) <= max_tokens:
+        return text
+    query_words = set(_WORD.findall(question.lower())) if question else set()
+    sentences = [s.strip() for s in _SENTENCE_END.split(text) if s.strip()]
+    if not query_words or len(sentences) <= 1:
+        return truncate_tokens(text, max_tokens, encoding_name)
+
+    ranked = sorted(
+        range(len(sentences)),
+        key=lambda i: len(query_words & set(_WORD.findall(sentences[i].lower()))),
+        reverse=True,
+    )
+    chosen, seen, used = set(), set(), 0
+    for i in ranked:
+        key = sentences[i].lower()
+        cost = count_tokens(sentences[i], encoding_name) + 1
+        if key in seen or used + cost > max_tokens:
+            continue
+        chosen.add(i)
+        seen.add(key)
+        used += cost
+    if not chosen:
+        return truncate_tokens(sentences[ranked[0]], max_tokens, encoding_name)
+    return " … ".join(sentences[i] for i in sorted(chosen))
+
+
+@dataclass
+class PackedContext:
+    text: str
+    tokens: int
+    baseline_tokens: int
+    passages: int = 0
+    duplicates_dropped: int = 0
+    over_budget_dropped: int = 0
+    citations: list = field(default_factory=list)
+
+    @property
+    def tokens_saved(self):
+        return max(0, self.baseline_tokens - self.tokens)
+
+    def summary(self):
+        return (f"context: {self.tokens} tokens from {self.passages} passages "
+                f"(saved {self.tokens_saved} of {self.baseline_tokens}, "
+                f"{self.duplicates_dropped} duplicates dropped, {self.over_budget_dropped} over budget)")
+
+
+def pack_context(documents, question=None, budget_tokens=1500, passage_tokens=400,
+                 near_duplicate_threshold=0.8, baseline_text=None, encoding_name="cl100k_base"):
+    """Pack retrieved documents into a citation-tagged block within budget_tokens
+
+    baseline_text is what the prompt would have contained without packing
+    (defaults to the passages joined by blank lines) and is only used to
+    report tokens saved.
+    """
+    if baseline_text is None:
+        baseline_text = "\n\n".join(doc.page_content for doc in documents)
+
+    kept_hashes, kept_shingles = set(), []
+    blocks, citations = [], []
+    used = duplicates = over_budget = 0
+
+    for doc in documents:
+        content = _WHITESPACE.sub(" ", doc.page_content).strip()
+        if not content:
+            continue
+        digest = hashlib.sha1(content.lower().encode("utf-8")).hexdigest()
+        shingles = _shingles(content)
+        if digest in kept_hashes or any(_jaccard(shingles, s) >= near_duplicate_threshold for s in kept_shingles):
+            duplicates += 1
+            continue
+
+        label = citation_label(doc.metadata or {})
+        header = f"[{len(blocks) + 1}] {label}".rstrip()
+        remaining = budget_tokens - used - count_tokens(header, encoding_name) - 1
+        if remaining < 32:
+            over_budget += 1
+            continue
+        limit = min(passage_tokens, remaining)
+        # Separators between excerpted sentences cost tokens too
+        body = truncate_tokens(excerpt(content, question, limit, encoding_name), limit, encoding_name)
+        block = f"{header}\n{body}"
+
+        kept_hashes.add(digest)
+        kept_shingles.append(shingles)
+        blocks.append(block)
+        citations.append(label)
+        used += count_tokens(block, encoding_name) + 1
+
+    text = "\n\n".join(blocks)
+    return PackedContext(
+        text=text,
+        tokens=count_tokens(text, encoding_name),
+        baseline_tokens=count_tokens(baseline_text, encoding_name),
+        passages=len(blocks),
+        duplicates_dropped=duplicates,
+        over_budget_dropped=over_budget,
+        citations=citations,
+    )
@@ -0,0 +1,322 @@
+"""
+Persistent, content-addressed embedding cache shared by all vector stores.
+
+Vectors are stored as packed float32 blobs in one SQLite file, keyed by
+(model name, hash of the normalized text). A model served anywhere but
+the default local Ollama endpoint is keyed with its host too, so vectors
+from fake_ollama.py or another server never stand in for real ones.
+Rebuilding a collection, or
+switching back and forth between embedding models, only pays for text
+that has not been embedded with that model before. The file is kept under
+a size bound by evicting the least recently used vectors.
+
+    embeddings = CachedEmbeddings(OllamaEmbeddings(model="mxbai-embed-large"))
+
+RAG_EMBEDDING_CACHE overrides the cache file, RAG_EMBEDDING_CACHE=off
+disables caching.
+"""
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from array import array
+from urllib.parse import urlsplit
+
+from langchain_core.embeddings import Embeddings
+
+from tracing import incr, span
+
+DEFAULT_CACHE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "embeddings.sqlite3")
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+DEFAULT_ENDPOINTS = ("localhost:11434", "127.0.0.1:11434")
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_text(text):
+    """Unicode-normalize and collapse whitespace so trivial edits still hit"""
+    return _WHITESPACE.sub(" ", unicodedata.normalize("NFC", text)).strip()
+
+
+def text_key(text):
+    return hashlib.sha256(normalize_text(text).encode("utf-8")).hexdigest()
+
+
+def endpoint_model_name(model, base_url):
+    """Cache namespace of a model served at base_url; the default local Ollama keeps the bare name"""
+    netloc = urlsplit(base_url if "://" in base_url else f"http://{base_url}").netloc
+    return model if netloc in DEFAULT_ENDPOINTS else f"{model}@{netloc}"
+
+
+def pack_vector(vector):
+    return array("f", vector).tobytes()
+
+
+def unpack_vector(blob):
+    values = array("f")
+    values.frombytes(blob)
+    return values.tolist()
+
+
+class EmbeddingCache:
+    """SQLite-backed vector store with LRU eviction and hit/miss stats"""
+
+    def __init__(self, path=DEFAULT_CACHE_PATH, max_bytes=DEFAULT_MAX_BYTES):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS embeddings (
+                model TEXT NOT NULL,
+                text_hash TEXT NOT NULL,
+                dim INTEGER NOT NULL,
+                vector BLOB NOT NULL,
+                last_access REAL NOT NULL,
+                PRIMARY KEY (model, text_hash)
+            ) WITHOUT ROWID
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS embeddings_lru ON embeddings (last_access)")
+        # Total vector bytes, kept up to date by triggers so eviction never scans the table.
+        # REPLACE only fires the delete trigger with recursive_triggers on.
+        self._conn.execute("PRAGMA recursive_triggers=ON")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS cache_meta (key TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+        if self._conn.execute("SELECT 1 FROM cache_meta WHERE key = 'bytes'").fetchone() is None:
+            # New file, or one written before the counter existed
+            self._conn.execute("INSERT INTO cache_meta VALUES ('bytes', "
+                               "(SELECT COALESCE(SUM(LENGTH(vector)), 0) FROM embeddings))")
+        self._conn.execute("""
+            CREATE TRIGGER IF NOT EXISTS embeddings_bytes_insert AFTER INSERT ON embeddings BEGIN
+                UPDATE cache_meta SET value = value + LENGTH(new.vector) WHERE key = 'bytes';
+            END
+        """)
+        self._conn.execute("""
+            CREATE TRIGGER IF NOT EXISTS embeddings_bytes_delete AFTER DELETE ON embeddings BEGIN
+                UPDATE cache_meta SET value = value - LENGTH(old.vector) WHERE key = 'bytes';
+            END
+        """)
+        self._conn.commit()
+
+    @classmethod
+    def from_env(cls):
+        """Cache configured by RAG_EMBEDDING_CACHE / RAG_EMBEDDING_CACHE_MB, or None when off"""
+        path = os.getenv("RAG_EMBEDDING_CACHE", DEFAULT_CACHE_PATH)
+        if path.lower() in ("off", "0", "false", ""):
+            return None
+        max_mb = float(os.getenv("RAG_EMBEDDING_CACHE_MB", DEFAULT_MAX_BYTES / (1024 * 1024)))
+        return cls(path, max_bytes=int(max_mb * 1024 * 1024))
+
+    def get_many(self, model, texts):
+        """Cached vectors for texts (None for misses), refreshing their LRU position"""
+        keys = [text_key(t) for t in texts]
+        found = {}
+        with self._lock:
+            unique = list(dict.fromkeys(keys))
+            # Stay well below SQLite's bound-parameter limit
+            for start in range(0, len(unique), 500):
+                chunk = unique[start:start + 500]
+                placeholders = ",".join("?" * len(chunk))
+                rows = self._conn.execute(
+                    f"SELECT text_hash, vector FROM embeddings WHERE model = ? AND text_hash IN ({placeholders})",
+                    [model, *chunk],
+                ).fetchall()
+                found.update(rows)
+            if found:
+                now = time.time()
+                self._conn.executemany(
+                    "UPDATE embeddings SET last_access = ? WHERE model = ? AND text_hash = ?",
+                    [(now, model, key) for key in found],
+                )
+                self._conn.commit()
+            hits = sum(1 for key in keys if key in found)
+            self.hits += hits
+            self.misses += len(keys) - hits
+        incr("embedding_cache_hits", hits)
+        incr("embedding_cache_misses", len(keys) - hits)
+        return [unpack_vector(found[key]) if key in found else None for key in keys]
+
+    def put_many(self, model, texts, vectors):
+        now = time.time()
+        rows = [(model, text_key(t), len(v), pack_vector(v), now) for t, v in zip(texts, vectors)]
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (model, text_hash, dim, vector, last_access) VALUES (?, ?, ?, ?, ?)",
+                rows,
+            )
+            self._conn.commit()
+            self._evict()
+
+    def _evict(self):
+        """Drop least recently used vectors until the cache is 90% of max_bytes"""
+        if not self.max_bytes:
+            return
+        total = self._total_bytes()
+        if total <= self.max_bytes:
+            return
+        target = total - int(self.max_bytes * 0.9)
+        freed = 0
+        victims = []
+        for model, text_hash, size in self._conn.execute(
+            "SELECT model, text_hash, LENGTH(vector) FROM embeddings ORDER BY last_access"
+        ):
+            victims.append((model, text_hash))
+            freed += size
+            if freed >= target:
+                break
+        self._conn.executemany("DELETE FROM embeddings WHERE model = ? AND text_hash = ?", victims)
+        self._conn.commit()
+        self.evictions += len(victims)
+
+    def _total_bytes(self):
+        return self._conn.execute("SELECT value FROM cache_meta WHERE key = 'bytes'").fetchone()[0]
+
+    def stats(self):
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+            size = self._total_bytes()
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "entries": entries,
+            "bytes": size,
+        }
+
+    def summary(self):
+        s = self.stats()
+        return (f"embedding cache: {s['hits']} hits, {s['misses']} misses "
+                f"({s['hit_rate']:.0%} hit rate), {s['entries']} vectors, {s['bytes'] / 1024 / 1024:.1f} MB")
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+_shared_cache = None
+_shared_lock = threading.Lock()
+
+
+def get_shared_cache():
+    """Process-wide cache instance configured from the environment"""
+    global _shared_cache
+    with _shared_lock:
+        if _shared_cache is None:
+            _shared_cache = EmbeddingCache.from_env() or False
+    return _shared_cache or None
+
+
+def model_name_of(embeddings):
+    """Best-effort model identifier of a LangChain embeddings instance"""
+    name = getattr(embeddings, "model", None) or getattr(embeddings, "model_name", None) or type(embeddings).__name__
+    dimensions = getattr(embeddings, "dimensions", None)
+    name = f"{name}@{dimensions}" if dimensions else str(name)
+    if hasattr(embeddings, "base_url"):
+        # Ollama clients: an unset base_url means OLLAMA_HOST or the default
+        from embedding_client import ollama_base_url
+
+        name = endpoint_model_name(name, embeddings.base_url or ollama_base_url())
+    return name
+
+
+class CachedEmbeddings(Embeddings):
+    """Wraps an Embeddings instance so each (model, text) is only embedded once"""
+
+    def __init__(self, embeddings, cache=None, model_name=None):
+        self.embeddings = embeddings
+        self.cache = cache if cache is not None else get_shared_cache()
+        self.model_name = model_name or model_name_of(embeddings)
+
+    def __getattr__(self, name):
+        # Expose the wrapped instance's settings (model, base_url, ...)
+        if name == "embeddings":
+            raise AttributeError(name)
+        return getattr(self.embeddings, name)
+
+    @property
+    def query_model_name(self):
+        # Some models embed queries differently from documents
+        return f"{self.model_name}#query"
+
+    def _split(self, texts):
+        cached = self.cache.get_many(self.model_name, texts)
+        # Texts that normalize to the same string are embedded once
+        groups = {}
+        for i, vector in enumerate(cached):
+            if vector is None:
+                groups.setdefault(normalize_text(texts[i]), []).append(i)
+        return cached, groups
+
+    def _merge(self, texts, cached, groups, vectors):
+        firsts = [texts[indexes[0]] for indexes in groups.values()]
+        self.cache.put_many(self.model_name, firsts, vectors)
+        for indexes, vector in zip(groups.values(), vectors):
+            for i in indexes:
+                cached[i] = vector
+        return cached
+
+    def embed_documents(self, texts):
+        with span("embed", texts=len(texts)):
+            if not self.cache:
+                return self.embeddings.embed_documents(texts)
+            cached, groups = self._split(texts)
+            firsts = [texts[indexes[0]] for indexes in groups.values()]
+            vectors = self.embeddings.embed_documents(firsts) if firsts else []
+            return self._merge(texts, cached, groups, vectors)
+
+    def embed_query(self, text):
+        with span("embed_query") as s:
+            if not self.cache:
+                return self.embeddings.embed_query(text)
+            vector = self.cache.get_many(self.query_model_name, [text])[0]
+            s.set(cached=vector is not None)
+            if vector is None:
+                vector = self.embeddings.embed_query(text)
+                self.cache.put_many(self.query_model_name, [text], [vector])
+            return vector
+
+    def embed_queries(self, texts, batch_size=32):
+        """Embed many queries in batched requests and cache them for embed_query
+
+        Relies on the wrapped model embedding a query the same way as a
+        document, which holds for OllamaEmbeddings and OpenAIEmbeddings.
+        """
+        if not self.cache:
+            return [self.embeddings.embed_query(text) for text in texts]
+        cached = self.cache.get_many(self.query_model_name, texts)
+        missing = list(dict.fromkeys(text for text, vector in zip(texts, cached) if vector is None))
+        vectors = {}
+        for start in range(0, len(missing), batch_size):
+            batch = missing[start:start + batch_size]
+            batch_vectors = self.embeddings.embed_documents(batch)
+            self.cache.put_many(self.query_model_name, batch, batch_vectors)
+            vectors.update(zip(batch, batch_vectors))
+        return [vector if vector is not None else vectors[text] for text, vector in zip(texts, cached)]
+
+    async def aembed_documents(self, texts):
+        if not self.cache:
+            return await self.embeddings.aembed_documents(texts)
+        cached, groups = self._split(texts)
+        firsts = [texts[indexes[0]] for indexes in groups.values()]
+        vectors = await self.embeddings.aembed_documents(firsts) if firsts else []
+        return self._merge(texts, cached, groups, vectors)
+
+    async def aembed_query(self, text):
+        if not self.cache:
+            return await self.embeddings.aembed_query(text)
+        vector = self.cache.get_many(self.query_model_name, [text])[0]
+        if vector is None:
+            vector = await self.embeddings.aembed_query(text)
+            self.cache.put_many(self.query_model_name, [text], [vector])
+        return vector
@@ -0,0 +1,361 @@
+"""
+Concurrent, batched embedding client for Ollama.
+
+Texts are sent to Ollama's /api/embed endpoint in batches, with a cap on
+the number of requests in flight and a retry with backoff for each batch.
+upsert_documents() writes every batch into a Chroma collection as soon as
+its vectors arrive, so a failure only costs the batches that failed;
+upsert_deduplicated() does the same for rows that repeat texts, embedding
+each distinct text once.
+
+Point OLLAMA_BASE_URL (or OLLAMA_HOST) at fake_ollama.py to run it
+without a real model.
+"""
+import asyncio
+import os
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+
+import aiohttp
+from langchain_core.embeddings import Embeddings
+
+from embedding_cache import endpoint_model_name, get_shared_cache
+from tracing import incr, span
+
+DEFAULT_BASE_URL = "http://localhost:11434"
+RETRYABLE_STATUS = {408, 429, 500, 502, 503, 504}
+
+
+def ollama_base_url():
+    """OLLAMA_BASE_URL, else OLLAMA_HOST (as the ollama client reads it), else the default"""
+    url = os.getenv("OLLAMA_BASE_URL") or os.getenv("OLLAMA_HOST")
+    if not url:
+        return DEFAULT_BASE_URL
+    return url if "://" in url else f"http://{url}"
+
+
+def _run_sync(make_coroutine):
+    """asyncio.run() a coroutine from sync code, on a worker thread when this thread runs an event loop
+
+    asyncio.run() refuses to start inside a running loop (Jupyter, an async
+    caller using the sync Embeddings API), so the coroutine gets its own loop
+    on a fresh thread there; the caller blocks until it finishes.
+    """
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.run(make_coroutine())
+    with ThreadPoolExecutor(max_workers=1, thread_name_prefix="embed-sync") as executor:
+        return executor.submit(lambda: asyncio.run(make_coroutine())).result()
+
+
+class EmbeddingRequestError(Exception):
+    """A batch could not be embedded"""
+
+    def __init__(self, message, status=None):
+        super().__init__(message)
+        self.status = status
+
+
+@dataclass
+class ThroughputMeter:
+    """Counts embedded texts and tokens against wall-clock time"""
+    texts: int = 0
+    tokens: int = 0
+    batches: int = 0
+    retries: int = 0
+    failed_batches: int = 0
+    cache_hits: int = 0
+    started: float = field(default_factory=time.perf_counter)
+
+    def record(self, texts, tokens):
+        self.texts += texts
+        self.tokens += tokens
+        self.batches += 1
+
+    @property
+    def elapsed(self):
+        return time.perf_counter() - self.started
+
+    @property
+    def texts_per_second(self):
+        return self.texts / self.elapsed if self.elapsed > 0 else 0.0
+
+    @property
+    def tokens_per_second(self):
+        return self.tokens / self.elapsed if self.elapsed > 0 else 0.0
+
+    def summary(self):
+        return (f"{self.texts} texts in {self.batches} batches, {self.elapsed:.1f}s "
+                f"({self.texts_per_second:.1f} texts/s, {self.tokens_per_second:.0f} tokens/s, "
+                f"{self.cache_hits} cache hits, {self.retries} retries, {self.failed_batches} failed batches)")
+
+
+@dataclass
+class UpsertReport:
+    """Outcome of an upsert_documents run"""
+    meter: ThroughputMeter
+    upserted_ids: list = field(default_factory=list)
+    failed_ids: list = field(default_factory=list)
+    errors: list = field(default_factory=list)
+    duplicates: int = 0
+
+
+class OllamaBatchEmbedder(Embeddings):
+    """Embeddings implementation that batches and parallelizes Ollama calls"""
+
+    def __init__(self, model, base_url=None, batch_size=32, max_concurrency=4,
+                 max_retries=3, backoff=0.5, timeout=120.0, cache=None, verbose=False):
+        self.model = model
+        self.base_url = (base_url or ollama_base_url()).rstrip("/")
+        self.batch_size = batch_size
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self.cache = cache
+        self.verbose = verbose
+        # Same cache key as CachedEmbeddings(OllamaEmbeddings(...)) for this endpoint
+        self.cache_model = endpoint_model_name(model, self.base_url)
+
+    @classmethod
+    def from_env(cls, model, **kwargs):
+        """Build from EMBED_BATCH_SIZE / EMBED_CONCURRENCY / EMBED_MAX_RETRIES and the shared cache"""
+        kwargs.setdefault("batch_size", int(os.getenv("EMBED_BATCH_SIZE", "32")))
+        kwargs.setdefault("max_concurrency", int(os.getenv("EMBED_CONCURRENCY", "4")))
+        kwargs.setdefault("max_retries", int(os.getenv("EMBED_MAX_RETRIES", "3")))
+        kwargs.setdefault("cache", get_shared_cache())
+        return cls(model, **kwargs)
+
+    def session(self):
+        """HTTP session for aembed_batch(): `async with embedder.session() as session:`"""
+        return aiohttp.ClientSession(
+            timeout=aiohttp.ClientTimeout(total=self.timeout),
+            connector=aiohttp.TCPConnector(limit=self.max_concurrency),
+        )
+
+    async def _post_batch(self, session, texts):
+        payload = {"model": self.model, "input": texts}
+        async with session.post(f"{self.base_url}/api/embed", json=payload) as resp:
+            if resp.status != 200:
+                body = await resp.text()
+                raise EmbeddingRequestError(f"HTTP {resp.status}: {body[:200]}", status=resp.status)
+            data = await resp.json()
+        vectors = data.get("embeddings") or []
+        if len(vectors) != len(texts):
+            raise EmbeddingRequestError(f"expected {len(texts)} embeddings, got {len(vectors)}")
+        # Ollama reports the prompt tokens it evaluated; estimate when it does not
+        tokens = data.get("prompt_eval_count") or sum(len(t) for t in texts) // 4
+        return vectors, tokens
+
+    async def aembed_batch(self, session, texts, meter):
+        """Embed one batch, serving what it can from the cache and recording it in meter"""
+        if not self.cache:
+            return await self._request_batch(session, texts, meter)
+        vectors = self.cache.get_many(self.cache_model, texts)
+        missing = [i for i, v in enumerate(vectors) if v is None]
+        meter.cache_hits += len(texts) - len(missing)
+        if missing:
+            fresh = await self._request_batch(session, [texts[i] for i in missing], meter)
+            self.cache.put_many(self.cache_model, [texts[i] for i in missing], fresh)
+            for i, vector in zip(missing, fresh):
+                vectors[i] = vector
+        return vectors
+
+    async def _request_batch(self, session, texts, meter):
+        """Send one batch, retrying transient failures with exponential backoff"""
+        attempt = 0
+        while True:
+            try:
+                with span("embed_batch", texts=len(texts), attempt=attempt):
+                    vectors, tokens = await self._post_batch(session, texts)
+                meter.record(len(texts), tokens)
+                incr("documents_embedded", len(texts))
+                incr("embedding_tokens", tokens)
+                return vectors
+            except (aiohttp.ClientError, asyncio.TimeoutError, EmbeddingRequestError) as e:
+                retryable = not isinstance(e, EmbeddingRequestError) or e.status in RETRYABLE_STATUS
+                if not retryable or attempt >= self.max_retries:
+                    raise
+                attempt += 1
+                meter.retries += 1
+                incr("embedding_retries")
+                delay = self.backoff * (2 ** (attempt - 1)) * (0.5 + random.random())
+                if self.verbose:
+                    print(f"  ⚠️  Embedding batch failed ({e}), retry {attempt}/{self.max_retries} in {delay:.1f}s")
+                await asyncio.sleep(delay)
+
+    def _batches(self, items):
+        for start in range(0, len(items), self.batch_size):
+            yield start, items[start:start + self.batch_size]
+
+    async def _run_bounded(self, batches, handle):
+        """Run handle(start, batch) for every batch with at most max_concurrency in flight
+
+        If a batch raises, the batches still in flight are cancelled and
+        awaited before the error is re-raised, naming the failed batch.
+        """
+        in_flight = {}
+        try:
+            for start, batch in batches:
+                if len(in_flight) >= self.max_concurrency:
+                    done, _ = await asyncio.wait(in_flight, return_when=asyncio.FIRST_COMPLETED)
+                    self._collect(done, in_flight)
+                in_flight[asyncio.create_task(handle(start, batch))] = start
+            while in_flight:
+                done, _ = await asyncio.wait(in_flight, return_when=asyncio.FIRST_COMPLETED)
+                self._collect(done, in_flight)
+        finally:
+            for task in in_flight:
+                task.cancel()
+            if in_flight:
+                await asyncio.gather(*in_flight, return_exceptions=True)
+
+    @staticmethod
+    def _collect(done, in_flight):
+        """Forget finished tasks; raises for the first failed batch once every exception is retrieved"""
+        errors = []
+        for task in done:
+            start = in_flight.pop(task)
+            if not task.cancelled() and task.exception() is not None:
+                errors.append((start, task.exception()))
+        if errors:
+            start, error = min(errors, key=lambda item: item[0])
+            raise EmbeddingRequestError(f"batch at {start} failed: {error}",
+                                        status=getattr(error, "status", None)) from error
+
+    async def aembed_documents(self, texts):
+        meter = ThroughputMeter()
+        results = [None] * len(texts)
+        async with self.session() as session:
+            async def handle(start, batch):
+                vectors = await self.aembed_batch(session, batch, meter)
+                results[start:start + len(batch)] = vectors
+            await self._run_bounded(self._batches(list(texts)), handle)
+        if self.verbose:
+            print(f"✅ Embedded {meter.summary()}")
+        return results
+
+    async def aembed_query(self, text):
+        return (await self.aembed_documents([text]))[0]
+
+    def embed_documents(self, texts):
+        return _run_sync(lambda: self.aembed_documents(texts))
+
+    def embed_query(self, text):
+        return self.embed_documents([text])[0]
+
+    async def aupsert_documents(self, vector_store, documents, ids):
+        """Embed documents batch by batch and upsert each batch as it arrives"""
+        report = UpsertReport(meter=ThroughputMeter())
+        collection = vector_store._collection
+        # Chroma writes are serialized; embedding requests keep running meanwhile
+        upsert_lock = asyncio.Lock()
+        pairs = list(zip(ids, documents))
+
+        async with self.session() as session:
+            async def handle(start, batch):
+                batch_ids = [doc_id for doc_id, _ in batch]
+                texts = [doc.page_content for _, doc in batch]
+                try:
+                    vectors = await self.aembed_batch(session, texts, report.meter)
+                except Exception as e:
+                    report.meter.failed_batches += 1
+                    incr("embedding_failed_batches")
+                    report.failed_ids.extend(batch_ids)
+                    report.errors.append(f"batch at {start}: {e}")
+                    if self.verbose:
+                        print(f"  ❌ Embedding batch at {start} failed: {e}")
+                    return
+                try:
+                    async with upsert_lock:
+                        with span("upsert", documents=len(batch_ids)):
+                            await asyncio.to_thread(
+                                collection.upsert,
+                                ids=batch_ids,
+                                embeddings=vectors,
+                                documents=texts,
+                                metadatas=[doc.metadata for _, doc in batch],
+                            )
+                except Exception as e:
+                    self._upsert_failed(report, start, batch_ids, e)
+                    return
+                report.upserted_ids.extend(batch_ids)
+                incr("documents_upserted", len(batch_ids))
+                if self.verbose:
+                    print(f"  📦 Upserted {len(report.upserted_ids)}/{len(pairs)} "
+                          f"({report.meter.texts_per_second:.1f} texts/s)")
+
+            await self._run_bounded(self._batches(pairs), handle)
+        return report
+
+    def _upsert_failed(self, report, start, batch_ids, error):
+        """Record a batch whose vectors could not be written; the other batches carry on"""
+        report.failed_ids.extend(batch_ids)
+        report.errors.append(f"upsert of batch at {start}: {error}")
+        incr("upsert_failed_batches")
+        if self.verbose:
+            print(f"  ❌ Upsert of batch at {start} failed ({len(batch_ids)} rows): {error}")
+
+    def upsert_documents(self, vector_store, documents, ids):
+        return _run_sync(lambda: self.aupsert_documents(vector_store, documents, ids))
+
+    async def aupsert_deduplicated(self, vector_store, documents, ids, report=None, upsert_batch_size=1000):
+        """upsert_documents for rows that repeat texts
+
+        Each distinct text is embedded once and its vector is written under
+        every ID that carries it. Pass the same report for successive
+        chunks of a large source to collect one UpsertReport.
+        """
+        report = report or UpsertReport(meter=ThroughputMeter())
+        collection = vector_store._collection
+        upsert_lock = asyncio.Lock()
+        rows_by_text = {}
+        for row, doc in enumerate(documents):
+            rows_by_text.setdefault(doc.page_content, []).append(row)
+        texts = list(rows_by_text)
+        duplicates = len(documents) - len(texts)
+        report.duplicates += duplicates
+        incr("embedding_duplicates_skipped", duplicates)
+
+        async with self.session() as session:
+            async def handle(start, batch):
+                try:
+                    vectors = await self.aembed_batch(session, batch, report.meter)
+                except Exception as e:
+                    failed = [ids[row] for text in batch for row in rows_by_text[text]]
+                    report.meter.failed_batches += 1
+                    incr("embedding_failed_batches")
+                    report.failed_ids.extend(failed)
+                    report.errors.append(f"batch at {start}: {e}")
+                    if self.verbose:
+                        print(f"  ❌ Embedding batch at {start} failed ({len(failed)} rows): {e}")
+                    return
+                # Fan each vector out to every row with that text
+                rows = [(row, vector) for text, vector in zip(batch, vectors) for row in rows_by_text[text]]
+                for offset in range(0, len(rows), upsert_batch_size):
+                    part = rows[offset:offset + upsert_batch_size]
+                    batch_ids = [ids[row] for row, _ in part]
+                    try:
+                        async with upsert_lock:
+                            with span("upsert", documents=len(part)):
+                                await asyncio.to_thread(
+                                    collection.upsert,
+                                    ids=batch_ids,
+                                    embeddings=[vector for _, vector in part],
+                                    documents=[documents[row].page_content for row, _ in part],
+                                    metadatas=[documents[row].metadata for row, _ in part],
+                                )
+                    except Exception as e:
+                        self._upsert_failed(report, start, batch_ids, e)
+                        continue
+                    report.upserted_ids.extend(batch_ids)
+                    incr("documents_upserted", len(batch_ids))
+
+            await self._run_bounded(self._batches(texts), handle)
+        return report
+
+    def upsert_deduplicated(self, vector_store, documents, ids, report=None):
+        return _run_sync(lambda: self.aupsert_deduplicated(vector_store, documents, ids, report=report))
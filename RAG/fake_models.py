@@ -0,0 +1,128 @@
+"""
+Deterministic in-process stand-ins for the embedding model and the LLM.
+
+Used by the benchmarks to run every stage offline on a CPU-only box:
+  - FakeEmbeddings hashes words and word pairs into a fixed-size vector
+    (the hashing trick), so texts sharing words land close together and
+    retrieval results are meaningful, not random; a per-call delay stands
+    in for the request overhead of a real embedding server
+  - FakeLLM answers with the first words of the context it was given and
+    can simulate time-to-first-token and per-token generation delays
+
+Both are pure functions of their input, so repeated runs give identical
+documents, vectors and answers.
+"""
+import asyncio
+import hashlib
+import re
+import time
+from typing import Any, AsyncIterator, Iterator, List, Optional
+
+import numpy as np
+from langchain_core.callbacks import AsyncCallbackManagerForLLMRun, CallbackManagerForLLMRun
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models.llms import LLM
+from langchain_core.outputs import GenerationChunk
+
+_WORD = re.compile(r"\w+")
+
+
+def _bucket(feature, dim):
+    digest = hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest()
+    value = int.from_bytes(digest, "little")
+    # Low bits pick the dimension, one high bit the sign
+    return value % dim, 1.0 if value >> 63 else -1.0
+
+
+class FakeEmbeddings(Embeddings):
+    """Feature-hashed bag of words and word pairs, L2-normalized"""
+
+    def __init__(self, dim=1024, seconds_per_text=0.0, seconds_per_call=0.0):
+        self.dim = dim
+        self.seconds_per_text = seconds_per_text
+        self.seconds_per_call = seconds_per_call
+        self.model = "fake-hashing"
+        self.texts_embedded = 0
+        self.calls = 0
+
+    def _vector(self, text):
+        words = _WORD.findall(text.lower())
+        vector = np.zeros(self.dim, dtype=np.float32)
+        for feature in words + [f"{a} {b}" for a, b in zip(words, words[1:])]:
+            index, sign = _bucket(feature, self.dim)
+            vector[index] += sign
+        norm = np.linalg.norm(vector)
+        if norm == 0:
+            # Empty text: a fixed direction instead of a zero vector
+            vector[0] = norm = 1.0
+        return (vector / norm).tolist()
+
+    def embed_documents(self, texts):
+        if self.seconds_per_text or self.seconds_per_call:
+            time.sleep(self.seconds_per_call + self.seconds_per_text * len(texts))
+        self.calls += 1
+        self.texts_embedded += len(texts)
+        return [self._vector(text) for text in texts]
+
+    def embed_query(self, text):
+        return self.embed_documents([text])[0]
+
+    async def aembed_documents(self, texts):
+        # Simulated latency must not hold an executor thread
+        if self.seconds_per_text or self.seconds_per_call:
+            await asyncio.sleep(self.seconds_per_call + self.seconds_per_text * len(texts))
+        self.calls += 1
+        self.texts_embedded += len(texts)
+        return [self._vector(text) for text in texts]
+
+    async def aembed_query(self, text):
+        return (await self.aembed_documents([text]))[0]
+
+
+class FakeLLM(LLM):
+    """Echoes the start of the prompt's context, optionally at a simulated speed"""
+
+    answer_words: int = 40
+    first_token_seconds: float = 0.0
+    seconds_per_token: float = 0.0
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-echo"
+
+    def _answer_words(self, prompt):
+        # The retrieved context follows the template's instructions; echo from its middle on
+        words = prompt.split()
+        start = len(words) // 3
+        return words[start:start + self.answer_words] or ["(empty)"]
+
+    def _call(self, prompt: str, stop: Optional[List[str]] = None,
+              run_manager: Optional[CallbackManagerForLLMRun] = None, **kwargs: Any) -> str:
+        words = self._answer_words(prompt)
+        time.sleep(self.first_token_seconds + self.seconds_per_token * max(0, len(words) - 1))
+        return " ".join(words)
+
+    async def _acall(self, prompt: str, stop: Optional[List[str]] = None,
+                     run_manager: Optional[AsyncCallbackManagerForLLMRun] = None, **kwargs: Any) -> str:
+        words = self._answer_words(prompt)
+        await asyncio.sleep(self.first_token_seconds + self.seconds_per_token * max(0, len(words) - 1))
+        return " ".join(words)
+
+    def _stream(self, prompt: str, stop: Optional[List[str]] = None,
+                run_manager: Optional[CallbackManagerForLLMRun] = None, **kwargs: Any) -> Iterator[GenerationChunk]:
+        for i, word in enumerate(self._answer_words(prompt)):
+            time.sleep(self.first_token_seconds if i == 0 else self.seconds_per_token)
+            chunk = GenerationChunk(text=word if i == 0 else " " + word)
+            if run_manager:
+                run_manager.on_llm_new_token(chunk.text, chunk=chunk)
+            yield chunk
+
+    async def _astream(self, prompt: str, stop: Optional[List[str]] = None,
+                       run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+                       **kwargs: Any) -> AsyncIterator[GenerationChunk]:
+        for i, word in enumerate(self._answer_words(prompt)):
+            await asyncio.sleep(self.first_token_seconds if i == 0 else self.seconds_per_token)
+            chunk = GenerationChunk(text=word if i == 0 else " " + word)
+            if run_manager:
+                await run_manager.on_llm_new_token(chunk.text, chunk=chunk)
+            yield chunk
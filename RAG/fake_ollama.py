@@ -0,0 +1,224 @@
+#!/usr/bin/env python3
+"""
+Local fake of the Ollama API for offline runs.
+
+Serves POST /api/embed (and the older /api/embeddings) with deterministic
+vectors derived from a hash of each text, so the same text always gets
+the same vector. Latency and failure rate can be injected to exercise the
+batching, concurrency and retry paths of embedding_client.py.
+
+POST /api/generate answers with a canned text, and GET /api/ps lists the
+loaded models. With --load-seconds, the first request to a model (or the
+first after its keep_alive ran out) pays a simulated load, as with a real
+Ollama, which is what model_keeper.py is tested against.
+
+Vectors from this server are cached under the model name plus its host
+(see embedding_cache.py), but the Chroma DB is created in the working
+directory, so ingest into a scratch directory, never the real one:
+
+    python RAG/fake_ollama.py --port 11435 --latency 0.05 --fail-rate 0.1
+    python RAG/fake_ollama.py --load-seconds 2 --default-keep-alive 5m
+
+    mkdir -p /tmp/fake_rag && ln -sfn "$PWD/RAG/local_travel_pdf_files/travel" /tmp/fake_rag/travel
+    (cd /tmp/fake_rag && OLLAMA_HOST=http://127.0.0.1:11435 RAG_EMBEDDING_CACHE=/tmp/fake_rag/embeddings.sqlite3 \
+        python "$OLDPWD/RAG/local_travel_pdf_files/vector_store_PDF.py")
+"""
+import argparse
+import hashlib
+import json
+import math
+import random
+import struct
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from model_keeper import _tagged, parse_keep_alive
+
+FAKE_ANSWER = "This is a fake answer from the fake Ollama server."
+
+
+def fake_vector(text, dim=1024):
+    """Deterministic unit vector for a text"""
+    values = []
+    counter = 0
+    while len(values) < dim:
+        digest = hashlib.sha256(f"{counter}:{text}".encode("utf-8")).digest()
+        values.extend(v / 2**31 for v in struct.unpack("<8i", digest))
+        counter += 1
+    values = values[:dim]
+    norm = math.sqrt(sum(v * v for v in values)) or 1.0
+    return [v / norm for v in values]
+
+
+class FakeOllamaHandler(BaseHTTPRequestHandler):
+    server_version = "FakeOllama/1.0"
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+    def _send_json(self, status, payload):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _read_json(self):
+        length = int(self.headers.get("Content-Length", 0))
+        return json.loads(self.rfile.read(length) or b"{}")
+
+    def _send_ndjson(self, lines):
+        body = "".join(json.dumps(line) + "\n" for line in lines).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path in ("/", "/api/version"):
+            self._send_json(200, {"version": "fake"})
+        elif self.path == "/api/ps":
+            self._send_json(200, {"models": [{"name": name, "model": name, "expires_at": expires_at}
+                                             for name, expires_at in self.server.running().items()]})
+        else:
+            self._send_json(404, {"error": "not found"})
+
+    def do_POST(self):
+        server = self.server
+        with server.lock:
+            server.requests += 1
+        if server.latency:
+            time.sleep(server.latency)
+        if server.fail_rate and random.random() < server.fail_rate:
+            self._send_json(503, {"error": "injected failure"})
+            return
+
+        payload = self._read_json()
+        model = payload.get("model", "fake")
+        if self.path in ("/api/embed", "/api/embeddings", "/api/generate"):
+            load_duration = server.use_model(model, payload.get("keep_alive"))
+        if self.path == "/api/embed":
+            texts = payload.get("input", [])
+            if isinstance(texts, str):
+                texts = [texts]
+            with server.lock:
+                server.texts += len(texts)
+            self._send_json(200, {
+                "model": model,
+                "embeddings": [fake_vector(t, server.dim) for t in texts],
+                "prompt_eval_count": sum(max(1, len(t) // 4) for t in texts),
+                "load_duration": int(load_duration * 1e9),
+            })
+        elif self.path == "/api/embeddings":
+            self._send_json(200, {"embedding": fake_vector(payload.get("prompt", ""), server.dim)})
+        elif self.path == "/api/generate":
+            # No prompt only loads the model, as with Ollama
+            words = FAKE_ANSWER.split(" ") if payload.get("prompt") else []
+            done = {"model": model, "response": "", "done": True, "done_reason": "load" if not words else "stop",
+                    "load_duration": int(load_duration * 1e9), "eval_count": len(words)}
+            if payload.get("stream", True):
+                self._send_ndjson([{"model": model, "response": word if i == 0 else " " + word, "done": False}
+                                   for i, word in enumerate(words)] + [done])
+            else:
+                self._send_json(200, {**done, "response": " ".join(words)})
+        else:
+            self._send_json(404, {"error": "not found"})
+
+
+class FakeOllamaServer(ThreadingHTTPServer):
+    """Keeps track of which models are "loaded" and until when"""
+
+    daemon_threads = True
+
+    def __init__(self, address, dim=1024, latency=0.0, fail_rate=0.0, verbose=False,
+                 load_seconds=0.0, default_keep_alive="5m"):
+        super().__init__(address, FakeOllamaHandler)
+        self.dim = dim
+        self.latency = latency
+        self.fail_rate = fail_rate
+        self.verbose = verbose
+        self.load_seconds = load_seconds
+        self.default_keep_alive = parse_keep_alive(default_keep_alive)
+        self.lock = threading.Lock()
+        # Held while a model loads, so concurrent requests wait for one load
+        self.load_lock = threading.Lock()
+        self.requests = 0
+        self.texts = 0
+        self.loads = 0
+        self.loaded = {}
+
+    def _is_loaded(self, name):
+        expires_at = self.loaded.get(name, 0)
+        return expires_at is None or expires_at > time.time()
+
+    def use_model(self, model, keep_alive=None):
+        """Load the model if it is not in memory and reset its expiry; returns the load time"""
+        name = _tagged(model)
+        load_duration = 0.0
+        with self.load_lock:
+            if not self._is_loaded(name):
+                started = time.perf_counter()
+                if self.load_seconds:
+                    time.sleep(self.load_seconds)
+                load_duration = time.perf_counter() - started
+                with self.lock:
+                    self.loads += 1
+            seconds = self.default_keep_alive if keep_alive is None else parse_keep_alive(keep_alive)
+            self.loaded[name] = None if seconds < 0 else time.time() + seconds
+        return load_duration
+
+    def evict(self, model=None):
+        """Unload one model (or all), as an idle timeout or `ollama stop` would"""
+        with self.load_lock:
+            if model is None:
+                self.loaded.clear()
+            else:
+                self.loaded.pop(_tagged(model), None)
+
+    def running(self):
+        """Loaded model names with their expiry as a timestamp (None: never)"""
+        with self.load_lock:
+            return {name: expires_at for name, expires_at in self.loaded.items() if self._is_loaded(name)}
+
+
+def make_server(host="127.0.0.1", port=11435, dim=1024, latency=0.0, fail_rate=0.0, verbose=False,
+                load_seconds=0.0, default_keep_alive="5m"):
+    """Build a fake server; port 0 picks a free port (see server.server_address)"""
+    return FakeOllamaServer((host, port), dim, latency, fail_rate, verbose, load_seconds, default_keep_alive)
+
+
+def start_in_thread(**kwargs):
+    """Start a fake server in a daemon thread and return (server, base_url)"""
+    server = make_server(**kwargs)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    host, port = server.server_address[:2]
+    return server, f"http://{host}:{port}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fake Ollama server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11435)
+    parser.add_argument("--dim", type=int, default=1024)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added to every request")
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="fraction of requests answered with 503")
+    parser.add_argument("--load-seconds", type=float, default=0.0, help="simulated time to load a cold model")
+    parser.add_argument("--default-keep-alive", default="5m", help="how long an idle model stays loaded")
+    parser.add_argument("--verbose", action="store_true")
+    args = parser.parse_args()
+
+    server = make_server(args.host, args.port, args.dim, args.latency, args.fail_rate, args.verbose,
+                         args.load_seconds, args.default_keep_alive)
+    print(f"🧪 Fake Ollama listening on http://{args.host}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
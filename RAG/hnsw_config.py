@@ -0,0 +1,111 @@
+"""
+HNSW index settings for the Chroma collections.
+
+    RAG_HNSW_SPACE=cosine           distance: l2 (Chroma's default), cosine or ip
+    RAG_HNSW_M=32                   graph links per node; more = better recall, more memory
+    RAG_HNSW_CONSTRUCTION_EF=200    candidates considered while inserting; slower builds, better graph
+    RAG_HNSW_SEARCH_EF=64           candidates considered per query; the recall/latency knob
+
+Unset values keep Chroma's defaults (l2, 16, 100, 100). space, M and
+construction_ef are fixed when a collection is created, so changing them
+on an existing database takes a rebuild (index_generations.py); search_ef
+is applied whenever a collection is opened. Pick values by measuring with
+benchmarks/hnsw_sweep.py.
+"""
+import os
+from dataclasses import dataclass
+
+# Our names -> Chroma's HNSW configuration keys
+CHROMA_KEYS = {"space": "space", "M": "max_neighbors", "construction_ef": "ef_construction",
+               "search_ef": "ef_search"}
+# ... and the collection metadata keys older Chroma versions keep them under
+LEGACY_KEYS = {"space": "hnsw:space", "M": "hnsw:M", "construction_ef": "hnsw:construction_ef",
+               "search_ef": "hnsw:search_ef"}
+CHROMA_DEFAULTS = {"space": "l2", "M": 16, "construction_ef": 100, "search_ef": 100}
+BUILD_PARAMS = ("space", "M", "construction_ef")
+SPACES = ("l2", "cosine", "ip")
+
+
+@dataclass
+class HnswParams:
+    space: str = None
+    M: int = None
+    construction_ef: int = None
+    search_ef: int = None
+
+    @classmethod
+    def from_env(cls):
+        def env_int(name):
+            value = os.getenv(name)
+            return int(value) if value else None
+
+        space = os.getenv("RAG_HNSW_SPACE") or None
+        if space and space not in SPACES:
+            raise ValueError(f"RAG_HNSW_SPACE must be one of {', '.join(SPACES)}, got {space!r}")
+        return cls(space=space, M=env_int("RAG_HNSW_M"), construction_ef=env_int("RAG_HNSW_CONSTRUCTION_EF"),
+                   search_ef=env_int("RAG_HNSW_SEARCH_EF"))
+
+    def chroma_configuration(self):
+        """collection_configuration for a new collection, or None for Chroma's defaults"""
+        hnsw = {CHROMA_KEYS[name]: value for name, value in vars(self).items() if value is not None}
+        return {"hnsw": hnsw} if hnsw else None
+
+    def describe(self):
+        return ", ".join(f"{name}={value}" for name, value in vars(self).items() if value is not None) or "defaults"
+
+
+def stored_params(collection):
+    """HnswParams a collection was created or last modified with
+
+    Reads the collection configuration, then the legacy hnsw:* metadata;
+    settings stored in neither are Chroma's defaults.
+    """
+    configuration = getattr(collection, "configuration", None) or {}
+    hnsw = configuration.get("hnsw") or {}
+    metadata = collection.metadata or {}
+    stored = {}
+    for name in CHROMA_KEYS:
+        value = hnsw.get(CHROMA_KEYS[name])
+        if value is None:
+            value = metadata.get(LEGACY_KEYS[name])
+        stored[name] = CHROMA_DEFAULTS[name] if value is None else value
+    return HnswParams(**stored)
+
+
+def apply_to_collection(collection, params):
+    """Set search_ef on an opened collection and report build settings it was not created with
+
+    Must run before the first query: Chroma reads ef_search when it loads
+    the index. The collection is only modified when its stored search_ef
+    differs, so a normal open does not write to the database. Returns the
+    mismatched build parameters as {name: (configured, actual)}.
+    """
+    current = stored_params(collection)
+    if params.search_ef is not None and current.search_ef != params.search_ef:
+        collection.modify(configuration={"hnsw": {"ef_search": params.search_ef}})
+    mismatched = {}
+    for name in BUILD_PARAMS:
+        wanted = getattr(params, name)
+        actual = getattr(current, name)
+        if wanted is not None and wanted != actual:
+            mismatched[name] = (wanted, actual)
+    return mismatched
+
+
+def open_chroma(collection_name, persist_directory, embedding_function, params=None):
+    """Chroma vector store whose collection uses params (RAG_HNSW_* by default)"""
+    from langchain_chroma import Chroma
+
+    params = params or HnswParams.from_env()
+    vector_store = Chroma(
+        collection_name=collection_name,
+        persist_directory=persist_directory,
+        embedding_function=embedding_function,
+        collection_configuration=params.chroma_configuration(),
+    )
+    mismatched = apply_to_collection(vector_store._collection, params)
+    if mismatched:
+        settings = ", ".join(f"{name}={wanted} (built with {actual})" for name, (wanted, actual) in mismatched.items())
+        print(f"⚠️  {collection_name} was built with other HNSW settings: {settings}. "
+              f"Rebuild it to apply them: python RAG/index_generations.py rebuild --pipeline ...")
+    return vector_store
@@ -0,0 +1,216 @@
+"""
+Hybrid retrieval: BM25 keyword index plus Chroma vector search.
+
+Routing per query:
+  - metadata filters are taken from the caller and from the query text
+    ("1-star reviews from 2024", "page 3 of itinerary.pdf") and applied
+    before ranking on both sides; a filter read from the query is only
+    used when the collection's documents carry that field
+  - exact-term queries (reservation numbers, dates, other digit-bearing
+    tokens or quoted phrases) whose term the keyword hits actually contain
+    are served from the keyword index alone, without embedding the query
+  - queries that are only filters return the filtered documents, ranked
+    by vector similarity to the query (there are no terms for BM25)
+  - everything else runs both searches and merges them with reciprocal
+    rank fusion
+
+The route taken is reported per call, not kept on the (shared) retriever:
+in the metadata of each returned document under ROUTE_KEY and as the route
+attribute of the "hybrid_retrieval" span.
+"""
+import re
+from typing import Any, List, Optional
+
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+
+from keyword_index import matches_filters, tokenize
+from tracing import incr, span
+
+_STAR_RATING = re.compile(r"\b([1-5])[- ]?stars?\b", re.I)
+_YEAR = re.compile(r"\b((?:19|20)\d\d)\b")
+_MONTH = re.compile(r"\b((?:19|20)\d\d-[01]\d)\b")
+_DATE = re.compile(r"\b((?:19|20)\d\d-[01]\d-[0-3]\d)\b")
+_PAGE = re.compile(r"\bpage\s+(\d+)\b", re.I)
+_PDF = re.compile(r"\b([\w.-]+\.pdf)\b", re.I)
+_QUOTED = re.compile(r'"([^"]+)"')
+
+ROUTE_KEY = "retrieval_route"
+
+# Query-text filters by the metadata key they set, with the patterns that produce them
+_FILTER_PATTERNS = {
+    "rating": (_STAR_RATING,),
+    "date": (_DATE, _MONTH, _YEAR),
+    "page": (_PAGE,),
+    "source": (_PDF,),
+}
+REVIEW_FILTER_KEYS = ("rating", "date")
+TRAVEL_FILTER_KEYS = ("page", "source")
+
+# Words that only describe the filter or the collection, not the content
+_FILTER_WORDS = frozenset("review reviews star stars rating ratings page pages from during dated document documents".split())
+
+
+def parse_filters(query, keys=None):
+    """Metadata filters implied by the query text, limited to keys (all when None)"""
+    keys = _FILTER_PATTERNS if keys is None else keys
+    filters = {}
+    match = _STAR_RATING.search(query)
+    if match and "rating" in keys:
+        filters["rating"] = int(match.group(1))
+    match = _DATE.search(query)
+    if match and "date" in keys:
+        filters["date"] = match.group(1)
+    elif "date" in keys:
+        match = _MONTH.search(query) or _YEAR.search(query)
+        if match:
+            prefix = match.group(1)
+            # ISO dates compare correctly as strings
+            filters["date"] = {"$gte": prefix, "$lte": prefix + "\uffff"}
+    match = _PAGE.search(query)
+    if match and "page" in keys:
+        filters["page"] = int(match.group(1))
+    match = _PDF.search(query)
+    if match and "source" in keys:
+        filters["source"] = match.group(1)
+    return filters
+
+
+def _strip_filters(query, keys=None):
+    """The query without the text of the filters on keys (all when None)"""
+    for key, patterns in _FILTER_PATTERNS.items():
+        if keys is None or key in keys:
+            for pattern in patterns:
+                query = pattern.sub(" ", query)
+    return query
+
+
+def _chroma_where(filters):
+    """Filter clauses Chroma can evaluate itself (numbers and equality)"""
+    clauses = []
+    for key, condition in filters.items():
+        if not isinstance(condition, dict):
+            clauses.append({key: {"$eq": condition}})
+            continue
+        for op, value in condition.items():
+            if op in ("$eq", "$ne", "$in") or isinstance(value, (int, float)):
+                clauses.append({key: {op: value}})
+    if not clauses:
+        return None
+    return clauses[0] if len(clauses) == 1 else {"$and": clauses}
+
+
+def exact_terms(query, filter_keys=None):
+    """Quoted phrases and identifier-like terms (digit-bearing, 4+ characters) named by the query
+
+    Text of the filters on filter_keys is not counted (all filters when None).
+    """
+    phrases = [" ".join(phrase.lower().split()) for phrase in _QUOTED.findall(query)]
+    identifiers = [term for term in tokenize(_strip_filters(query, filter_keys))
+                   if any(c.isdigit() for c in term) and len(term) >= 4]
+    return [term for term in dict.fromkeys(phrases + identifiers) if term]
+
+
+def is_exact_term_query(query, filter_keys=None):
+    """Queries naming an identifier or a quoted phrase are best answered by keywords"""
+    return bool(exact_terms(query, filter_keys))
+
+
+def contains_term(doc, term):
+    """Whether a document holds a term from exact_terms(): a phrase as text, an identifier as a token"""
+    if " " in term:
+        return term in " ".join(doc.page_content.lower().split())
+    return term in tokenize(doc.page_content)
+
+
+def _doc_key(doc):
+    return getattr(doc, "id", None) or hash(doc.page_content)
+
+
+def reciprocal_rank_fusion(result_lists, k=5, rrf_k=60):
+    """Merge ranked Document lists by summed 1 / (rrf_k + rank)"""
+    scores, documents = {}, {}
+    for results in result_lists:
+        for rank, doc in enumerate(results):
+            key = _doc_key(doc)
+            scores[key] = scores.get(key, 0.0) + 1.0 / (rrf_k + rank + 1)
+            documents.setdefault(key, doc)
+    ranked = sorted(scores, key=scores.get, reverse=True)
+    return [documents[key] for key in ranked[:k]]
+
+
+class HybridRetriever(BaseRetriever):
+    """Keyword + vector retrieval with metadata pre-filtering"""
+
+    vector_store: Any
+    keyword_index: Any
+    k: int = 5
+    fetch_k: int = 20
+    rrf_k: int = 60
+    filters: Optional[dict] = None
+    parse_query_filters: bool = True
+    # Fields query-text filters may use (e.g. REVIEW_FILTER_KEYS); None allows all the index has
+    filter_keys: Optional[tuple] = None
+
+    def _query_filter_keys(self):
+        """Filter keys the query text may set: the allowed ones the indexed documents carry"""
+        present = self.keyword_index.metadata_keys()
+        return tuple(key for key in (self.filter_keys or _FILTER_PATTERNS) if key in present)
+
+    def _get_relevant_documents(
+        self, query: str, *, run_manager: CallbackManagerForRetrieverRun
+    ) -> List[Document]:
+        with span("hybrid_retrieval") as s:
+            route, documents = self._route(query)
+            s.set(route=route, hits=len(documents))
+        incr("retrieval_routes", route=route)
+        return [Document(id=doc.id, page_content=doc.page_content, metadata={**doc.metadata, ROUTE_KEY: route})
+                for doc in documents]
+
+    def _route(self, query):
+        """(route, documents) for a query, the route being filter, keyword or hybrid"""
+        filters = parse_filters(query, self._query_filter_keys()) if self.parse_query_filters else {}
+        filters.update(self.filters or {})
+        content_query = _strip_filters(query, filters) if filters else query
+        has_terms = any(term not in _FILTER_WORDS for term in tokenize(content_query))
+
+        # Filters only: nothing for BM25 to score, so rank the filtered documents by vector similarity
+        if filters and not has_terms:
+            with span("metadata_filter") as s:
+                allowed = self.keyword_index.filter_ids(filters)
+                s.set(hits=len(allowed))
+            if not allowed:
+                return "filter", []
+            with span("vector_search") as s:
+                ranked = [doc for doc in self._vector_search(query, filters) if doc.id in allowed][:self.k]
+                s.set(hits=len(ranked))
+            # Filtered documents beyond fetch_k still fill up to k
+            seen = {doc.id for doc in ranked}
+            rest = sorted(doc_id for doc_id in allowed if doc_id not in seen)[:self.k - len(ranked)]
+            return "filter", ranked + self.keyword_index.get_documents(rest)
+
+        with span("keyword_search") as s:
+            keyword_hits = self.keyword_index.search(content_query, k=self.fetch_k, filters=filters)
+            keyword_docs = self.keyword_index.get_documents([doc_id for doc_id, _ in keyword_hits])
+            s.set(hits=len(keyword_docs))
+
+        terms = exact_terms(query, filters)
+        # Only when the identifier itself was found, not just the words around it
+        exact_docs = [doc for doc in keyword_docs if any(contains_term(doc, term) for term in terms)]
+        if exact_docs:
+            others = [doc for doc in keyword_docs if doc not in exact_docs]
+            return "keyword", (exact_docs + others)[:self.k]
+
+        with span("vector_search") as s:
+            vector_docs = self._vector_search(content_query, filters)
+            s.set(hits=len(vector_docs))
+        return "hybrid", reciprocal_rank_fusion([keyword_docs, vector_docs], k=self.k, rrf_k=self.rrf_k)
+
+    def _vector_search(self, query, filters):
+        if not filters:
+            return self.vector_store.similarity_search(query, k=self.fetch_k)
+        where = _chroma_where(filters)
+        results = self.vector_store.similarity_search(query, k=self.fetch_k, filter=where)
+        # String ranges (dates) are not supported by Chroma; finish them here
+        return [doc for doc in results if matches_filters(doc.metadata, filters)]
@@ -0,0 +1,256 @@
+#!/usr/bin/env python3
+"""
+Shadow rebuilds with an atomic switch for the vector store directories.
+
+A full rebuild no longer deletes the live database first. It builds a new
+generation directory beside it and validates it (document count, sample
+queries, no large drop against the live one). Only then does it point
+readers at it by atomically replacing a small pointer file. If the build
+or the validation fails, the live index is untouched.
+
+    chroma_travel_db                      the original, in-place database ("legacy")
+    chroma_travel_db.generations/<name>   one self-contained directory per rebuild
+    chroma_travel_db.current.json         {"current": <name>, "previous": <name>}
+
+Without a pointer file readers use the original directory, so existing
+databases keep working. A generation still being built holds a .building
+marker; if the build fails or is interrupted the directory is kept, and
+`rebuild --resume` continues it instead of starting over. The previous generation is kept for rollback();
+older ones are pruned (the legacy directory is never deleted).
+
+The vector store modules open whatever current_location() names and
+notice a switch on their next query, so a running REPL moves over too.
+
+    python RAG/index_generations.py rebuild --pipeline travel
+    python RAG/index_generations.py rebuild --pipeline travel --resume
+    python RAG/index_generations.py rollback --pipeline reviews
+    python RAG/index_generations.py status --pipeline travel
+"""
+import argparse
+import importlib
+import json
+import os
+import shutil
+import sys
+import time
+
+from tracing import configure_from_env
+
+LEGACY = "legacy"
+BUILDING = ".building"
+RAG_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(RAG_DIR)
+
+# name: (vector store module, its directory, working directory its db paths are relative to)
+PIPELINES = {
+    "reviews": ("vector_store", os.path.join(RAG_DIR, "local_restaurant_reviews"), REPO_DIR),
+    "travel": ("vector_store_PDF", os.path.join(RAG_DIR, "local_travel_pdf_files"),
+               os.path.join(RAG_DIR, "local_travel_pdf_files")),
+}
+
+
+class RebuildError(Exception):
+    """A new generation failed to build or validate; the live index was left as it was"""
+
+
+def pointer_path(base):
+    return f"{base}.current.json"
+
+
+def generations_dir(base):
+    return f"{base}.generations"
+
+
+def generation_path(base, name):
+    return base if name == LEGACY else os.path.join(generations_dir(base), name)
+
+
+def read_pointer(base):
+    try:
+        with open(pointer_path(base), encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def _write_pointer(base, pointer):
+    tmp_path = f"{pointer_path(base)}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(pointer, f, indent=2)
+        f.flush()
+        os.fsync(f.fileno())
+    # Readers see either the old pointer or the new one, never a partial file
+    os.replace(tmp_path, pointer_path(base))
+
+
+def current_location(base):
+    """Directory readers should open: the current generation, or base itself"""
+    pointer = read_pointer(base)
+    return generation_path(base, pointer["current"]) if pointer else base
+
+
+def pointer_version(base):
+    """Changes whenever the pointer file is replaced (cheap enough to check per query)"""
+    try:
+        stat = os.stat(pointer_path(base))
+    except FileNotFoundError:
+        return None
+    return stat.st_ino, stat.st_mtime_ns
+
+
+def new_generation(base):
+    """Create and return an empty directory for the next generation"""
+    name = time.strftime("%Y%m%d-%H%M%S")
+    path = generation_path(base, name)
+    suffix = 1
+    while os.path.exists(path):
+        path = generation_path(base, f"{name}-{suffix}")
+        suffix += 1
+    os.makedirs(path)
+    return path
+
+
+def unfinished_generation(base):
+    """Newest generation whose build never finished, or None"""
+    root = generations_dir(base)
+    if not os.path.isdir(root):
+        return None
+    for name in sorted(os.listdir(root), reverse=True):
+        if os.path.exists(os.path.join(root, name, BUILDING)):
+            return os.path.join(root, name)
+    return None
+
+
+def switch(base, path, keep=2):
+    """Point readers at the generation in path, keeping the one it replaces for rollback"""
+    pointer = read_pointer(base)
+    if pointer:
+        previous = pointer["current"]
+    else:
+        previous = LEGACY if os.path.exists(base) else None
+    _write_pointer(base, {"current": os.path.basename(path), "previous": previous, "switched_at": time.time()})
+    prune(base, keep=keep)
+
+
+def rollback(base):
+    """Swap the current and previous generations; returns the directory now current"""
+    pointer = read_pointer(base)
+    if not pointer or not pointer.get("previous"):
+        raise RebuildError(f"No previous generation of {base} to roll back to")
+    if not os.path.exists(generation_path(base, pointer["previous"])):
+        raise RebuildError(f"Previous generation {pointer['previous']} of {base} no longer exists")
+    _write_pointer(base, {"current": pointer["previous"], "previous": pointer["current"],
+                          "switched_at": time.time()})
+    return current_location(base)
+
+
+def prune(base, keep=2):
+    """Delete all but the newest `keep` generations, never the current or previous one"""
+    pointer = read_pointer(base) or {}
+    protected = {pointer.get("current"), pointer.get("previous")}
+    root = generations_dir(base)
+    if not os.path.isdir(root):
+        return []
+    names = sorted(os.listdir(root), reverse=True)
+    removed = []
+    for name in names[keep:]:
+        if name not in protected:
+            shutil.rmtree(os.path.join(root, name), ignore_errors=True)
+            removed.append(name)
+    return removed
+
+
+def validate(vector_store, expected_count, sample_queries, live_count=None, min_ratio=0.9):
+    """Raise RebuildError unless the new store holds what was built and answers sample queries"""
+    count = vector_store._collection.count()
+    if count != expected_count:
+        raise RebuildError(f"new generation holds {count} documents, expected {expected_count}")
+    if live_count and count < live_count * min_ratio:
+        raise RebuildError(f"new generation holds {count} documents, the live one {live_count} "
+                           f"(below {min_ratio:.0%}; pass force=True if that is intended)")
+    for query in sample_queries:
+        if not vector_store.similarity_search(query, k=3):
+            raise RebuildError(f"sample query {query!r} returned nothing")
+    return count
+
+
+def rebuild(base, build, sample_queries, live_count=None, keep=2, min_ratio=0.9, force=False, resume=False):
+    """Build a generation beside the live one, validate it and switch readers to it
+
+    build(path) fills a store in path and returns (vector_store,
+    expected_count), raising if anything failed to ingest. A failed build
+    keeps its directory; resume=True hands it to build again instead of
+    starting an empty one. Returns the new generation's directory.
+    """
+    path = unfinished_generation(base) if resume else None
+    if path:
+        print(f"⏯️  Resuming the unfinished generation in {path}")
+    else:
+        path = new_generation(base)
+        open(os.path.join(path, BUILDING), "w").close()
+        print(f"🏗️  Building new generation in {path}")
+    started = time.perf_counter()
+    try:
+        vector_store, expected_count = build(path)
+    except Exception as e:
+        raise RebuildError(f"building {path} failed: {e} (rebuild with --resume to continue it)") from e
+    try:
+        count = validate(vector_store, expected_count, sample_queries,
+                         live_count=None if force else live_count, min_ratio=min_ratio)
+    except RebuildError:
+        shutil.rmtree(path, ignore_errors=True)
+        raise
+    except Exception as e:
+        raise RebuildError(f"validating {path} failed: {e} (rebuild with --resume to retry)") from e
+    os.remove(os.path.join(path, BUILDING))
+    switch(base, path, keep=keep)
+    print(f"✅ Switched to {os.path.basename(path)} ({count} documents, built in "
+          f"{time.perf_counter() - started:.1f} s); previous generation kept for rollback")
+    return path
+
+
+def status(base):
+    pointer = read_pointer(base)
+    lines = [f"current:  {current_location(base)}"]
+    if pointer:
+        previous = pointer.get("previous")
+        lines.append(f"previous: {generation_path(base, previous) if previous else '-'}")
+        lines.append(f"switched: {time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(pointer['switched_at']))}")
+    root = generations_dir(base)
+    if os.path.isdir(root):
+        lines.append(f"generations: {', '.join(sorted(os.listdir(root)))}")
+    unfinished = unfinished_generation(base)
+    if unfinished:
+        lines.append(f"unfinished: {unfinished} (rebuild --resume continues it)")
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rebuild a vector store beside the live one and switch atomically")
+    parser.add_argument("command", choices=["rebuild", "rollback", "status"])
+    parser.add_argument("--pipeline", choices=list(PIPELINES), default="travel")
+    parser.add_argument("--keep", type=int, default=2, help="generations kept on disk")
+    parser.add_argument("--force", action="store_true", help="switch even if the new generation is much smaller")
+    parser.add_argument("--resume", action="store_true", help="continue an interrupted rebuild instead of starting over")
+    args = parser.parse_args()
+    configure_from_env()
+
+    module_name, module_dir, cwd = PIPELINES[args.pipeline]
+    # The vector store modules use database paths relative to where their REPL runs
+    os.chdir(cwd)
+    sys.path.insert(0, module_dir)
+    store = importlib.import_module(module_name)
+
+    try:
+        if args.command == "rebuild":
+            store.rebuild(keep=args.keep, force=args.force, resume=args.resume)
+        elif args.command == "rollback":
+            print(f"↩️  Rolled back to {store.rollback()}")
+        print(status(store.db_location))
+    except RebuildError as e:
+        print(f"❌ {e}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
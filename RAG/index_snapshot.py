@@ -0,0 +1,143 @@
+"""
+On-disk snapshots for InMemoryVectorStore indexes.
+
+A snapshot is one .npz file holding the chunk vectors as a float32 matrix
+plus the chunk IDs, text and metadata as JSON. It is keyed by a hash of
+the source content, the splitter parameters, the embedding model and the
+snapshot format, so any of those changing means a new snapshot rather
+than stale vectors.
+
+cached_index() puts it together for a fetched source:
+  - warm start: the source was checked less than max_age seconds ago, so
+    the snapshot is loaded without fetching anything (milliseconds)
+  - stale check: the source is fetched and hashed; unchanged content loads
+    the existing snapshot without splitting or embedding
+  - changed content (or new parameters): split, embed, save a new snapshot
+
+RAG_SNAPSHOT_MAX_AGE sets max_age in seconds (0 checks the source on
+every start), RAG_SNAPSHOT=off always rebuilds in memory.
+"""
+import hashlib
+import io
+import json
+import os
+import time
+
+import numpy as np
+from langchain_core.vectorstores import InMemoryVectorStore
+
+FORMAT_VERSION = 1
+DEFAULT_SNAPSHOT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "snapshots")
+
+
+def _digest(value):
+    return hashlib.sha256(value.encode("utf-8")).hexdigest()
+
+
+def content_hash(documents):
+    """Hash of the documents' text and metadata, in order"""
+    h = hashlib.sha256()
+    for doc in documents:
+        h.update(doc.page_content.encode("utf-8"))
+        h.update(json.dumps(doc.metadata, sort_keys=True, default=str).encode("utf-8"))
+        h.update(b"\0")
+    return h.hexdigest()
+
+
+def snapshot_key(source_hash, params):
+    """Key for a snapshot of content source_hash built with params (splitter, model, ...)"""
+    return _digest(json.dumps({"format": FORMAT_VERSION, "source": source_hash, "params": params},
+                              sort_keys=True))[:24]
+
+
+def save_snapshot(path, vector_store):
+    """Write an InMemoryVectorStore's vectors and chunks to path atomically"""
+    records = list(vector_store.store.values())
+    vectors = np.asarray([record["vector"] for record in records], dtype=np.float32)
+    chunks = [{"id": r["id"], "text": r["text"], "metadata": r["metadata"]} for r in records]
+    payload = json.dumps(chunks, default=str).encode("utf-8")
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    buffer = io.BytesIO()
+    np.savez(buffer, vectors=vectors, chunks=np.frombuffer(payload, dtype=np.uint8))
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(buffer.getvalue())
+    os.replace(tmp_path, path)
+
+
+def load_snapshot(path, embedding):
+    """InMemoryVectorStore restored from a snapshot (queries still use embedding)"""
+    with np.load(path, allow_pickle=False) as data:
+        vectors = data["vectors"]
+        chunks = json.loads(data["chunks"].tobytes().decode("utf-8"))
+    vector_store = InMemoryVectorStore(embedding)
+    vector_store.store = {
+        chunk["id"]: {"id": chunk["id"], "vector": vector.tolist(), "text": chunk["text"], "metadata": chunk["metadata"]}
+        for chunk, vector in zip(chunks, vectors)
+    }
+    return vector_store
+
+
+def _read_json(path):
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+def _write_json(path, data):
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+def cached_index(source, fetch, split, embedding, params, snapshot_dir=DEFAULT_SNAPSHOT_DIR, max_age=None):
+    """InMemoryVectorStore for source, loaded from a snapshot unless the content changed
+
+    fetch() returns the source Documents and split(documents) the chunks;
+    params identifies how chunks and vectors are made (splitter settings,
+    embedding model) and is part of the snapshot key.
+    """
+    if os.getenv("RAG_SNAPSHOT", "on").lower() in ("off", "0", "false"):
+        vector_store = InMemoryVectorStore(embedding)
+        vector_store.add_documents(documents=split(fetch()))
+        return vector_store
+    if max_age is None:
+        max_age = float(os.getenv("RAG_SNAPSHOT_MAX_AGE", "86400"))
+
+    os.makedirs(snapshot_dir, exist_ok=True)
+    params_hash = _digest(json.dumps(params, sort_keys=True))[:12]
+    state_path = os.path.join(snapshot_dir, f"{_digest(source)[:16]}-{params_hash}.json")
+    state = _read_json(state_path)
+
+    if state and time.time() - state["checked_at"] < max_age:
+        path = os.path.join(snapshot_dir, f"{state['key']}.npz")
+        if os.path.exists(path):
+            started = time.perf_counter()
+            vector_store = load_snapshot(path, embedding)
+            print(f"📦 Loaded {len(vector_store.store)} chunks from snapshot in "
+                  f"{(time.perf_counter() - started) * 1000:.0f} ms")
+            return vector_store
+
+    documents = fetch()
+    key = snapshot_key(content_hash(documents), params)
+    path = os.path.join(snapshot_dir, f"{key}.npz")
+    if os.path.exists(path):
+        vector_store = load_snapshot(path, embedding)
+        print(f"📦 Source unchanged, loaded {len(vector_store.store)} chunks from snapshot")
+    else:
+        chunks = split(documents)
+        print(f"🔄 Source or parameters changed, embedding {len(chunks)} chunks")
+        vector_store = InMemoryVectorStore(embedding)
+        vector_store.add_documents(documents=chunks)
+        save_snapshot(path, vector_store)
+        if state and state["key"] != key:
+            try:
+                os.remove(os.path.join(snapshot_dir, f"{state['key']}.npz"))
+            except FileNotFoundError:
+                pass
+    _write_json(state_path, {"source": source, "key": key, "params": params, "checked_at": time.time()})
+    return vector_store
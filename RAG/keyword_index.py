@@ -0,0 +1,252 @@
+"""
+Persistent BM25 keyword index kept next to a Chroma collection.
+
+The index lives in keyword_index.sqlite3 inside the collection's persist
+directory and is updated by ingestion together with the collection
+(upsert/delete by document ID). Besides the inverted index it keeps every
+document's text and metadata, so keyword hits are served without touching
+Chroma or the embedding model, and a metadata table answers pre-filters
+such as rating, date, source or page.
+
+Filters are a dict of metadata key to either a value (equality) or an
+operator dict: {"rating": 1, "date": {"$gte": "2024-01-01", "$lte": "2024-12-31"}}.
+Supported operators: $eq, $ne, $gt, $gte, $lt, $lte, $in.
+"""
+import json
+import math
+import os
+import re
+import sqlite3
+import threading
+from collections import Counter
+
+from langchain_core.documents import Document
+
+INDEX_NAME = "keyword_index.sqlite3"
+
+# Words plus compound tokens such as dates (2024-09-30) and codes (AB-1234)
+_TOKEN = re.compile(r"[a-z0-9]+(?:[-/.:][a-z0-9]+)+|\w+")
+_PART = re.compile(r"[a-z0-9]+")
+
+STOPWORDS = frozenset("""
+a an and are as at be by for from has have how i in is it its me my of on or our that the their this
+to was were what when where which who why will with you your do does did can could should would
+""".split())
+
+_OPERATORS = {"$eq": "=", "$ne": "!=", "$gt": ">", "$gte": ">=", "$lt": "<", "$lte": "<="}
+
+
+def tokenize(text):
+    """Lowercased terms; compound tokens are kept whole and also split into parts"""
+    terms = []
+    for token in _TOKEN.findall(text.lower()):
+        if token in STOPWORDS:
+            continue
+        terms.append(token)
+        if not token.isalnum():
+            terms.extend(p for p in _PART.findall(token) if p not in STOPWORDS)
+    return terms
+
+
+def _plain(value):
+    """numpy scalars (e.g. ratings read with pandas) as plain Python values"""
+    return value.item() if hasattr(value, "item") else value
+
+
+def matches_filters(metadata, filters):
+    """Python-side check of the same filter syntax (used to post-filter vector hits)"""
+    for key, condition in (filters or {}).items():
+        value = metadata.get(key)
+        if not isinstance(condition, dict):
+            condition = {"$eq": condition}
+        for op, expected in condition.items():
+            if value is None:
+                return False
+            if op == "$in":
+                if value not in expected:
+                    return False
+                continue
+            try:
+                ok = {"$eq": value == expected, "$ne": value != expected, "$gt": value > expected,
+                      "$gte": value >= expected, "$lt": value < expected, "$lte": value <= expected}[op]
+            except TypeError:
+                return False
+            if not ok:
+                return False
+    return True
+
+
+class KeywordIndex:
+    """BM25 inverted index with a metadata pre-filter table, stored in SQLite"""
+
+    def __init__(self, db_location, k1=1.5, b=0.75):
+        self.path = os.path.join(db_location, INDEX_NAME)
+        self.k1 = k1
+        self.b = b
+        self._lock = threading.Lock()
+        self._meta_keys = None
+        os.makedirs(db_location, exist_ok=True)
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS docs (
+                doc_id TEXT PRIMARY KEY, length INTEGER NOT NULL, text TEXT NOT NULL, metadata TEXT NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS postings (
+                term TEXT NOT NULL, doc_id TEXT NOT NULL, tf INTEGER NOT NULL, PRIMARY KEY (term, doc_id)
+            ) WITHOUT ROWID;
+            CREATE INDEX IF NOT EXISTS postings_doc ON postings (doc_id);
+            CREATE TABLE IF NOT EXISTS meta (key TEXT NOT NULL, value, doc_id TEXT NOT NULL);
+            CREATE INDEX IF NOT EXISTS meta_key_value ON meta (key, value);
+            CREATE INDEX IF NOT EXISTS meta_doc ON meta (doc_id);
+        """)
+        self._conn.commit()
+        self._refresh_stats()
+
+    def _refresh_stats(self):
+        count, total = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(length), 0) FROM docs").fetchone()
+        self.doc_count = count
+        self.avg_length = total / count if count else 0.0
+
+    def __len__(self):
+        return self.doc_count
+
+    def _delete_locked(self, ids):
+        self._meta_keys = None
+        rows = [(doc_id,) for doc_id in ids]
+        self._conn.executemany("DELETE FROM postings WHERE doc_id = ?", rows)
+        self._conn.executemany("DELETE FROM meta WHERE doc_id = ?", rows)
+        self._conn.executemany("DELETE FROM docs WHERE doc_id = ?", rows)
+
+    def upsert(self, ids, documents):
+        """Index (or re-index) documents under their IDs"""
+        with self._lock:
+            self._delete_locked(ids)
+            for doc_id, doc in zip(ids, documents):
+                terms = Counter(tokenize(doc.page_content))
+                metadata = {key: _plain(value) for key, value in (doc.metadata or {}).items()}
+                self._conn.execute(
+                    "INSERT INTO docs (doc_id, length, text, metadata) VALUES (?, ?, ?, ?)",
+                    (doc_id, sum(terms.values()), doc.page_content, json.dumps(metadata, default=str)),
+                )
+                self._conn.executemany(
+                    "INSERT INTO postings (term, doc_id, tf) VALUES (?, ?, ?)",
+                    [(term, doc_id, tf) for term, tf in terms.items()],
+                )
+                self._conn.executemany(
+                    "INSERT INTO meta (key, value, doc_id) VALUES (?, ?, ?)",
+                    [(key, value, doc_id) for key, value in metadata.items()
+                     if isinstance(value, (str, int, float, bool))],
+                )
+            self._conn.commit()
+            self._refresh_stats()
+
+    def delete(self, ids):
+        with self._lock:
+            self._delete_locked(ids)
+            self._conn.commit()
+            self._refresh_stats()
+
+    def clear(self):
+        with self._lock:
+            self._meta_keys = None
+            self._conn.executescript("DELETE FROM postings; DELETE FROM meta; DELETE FROM docs;")
+            self._conn.commit()
+            self._refresh_stats()
+
+    def rebuild_from_chroma(self, vector_store, batch_size=1000):
+        """Index everything already stored in a Chroma collection (no embedding needed)"""
+        collection = vector_store._collection
+        total = collection.count()
+        for offset in range(0, total, batch_size):
+            stored = collection.get(include=["documents", "metadatas"], limit=batch_size, offset=offset)
+            documents = [
+                Document(page_content=text or "", metadata=metadata or {})
+                for text, metadata in zip(stored["documents"], stored["metadatas"])
+            ]
+            self.upsert(stored["ids"], documents)
+        return total
+
+    def metadata_keys(self):
+        """Metadata keys that documents in the index carry, e.g. {"rating", "date"}"""
+        with self._lock:
+            if not self._meta_keys:
+                # Walks the (key, value) index one key at a time instead of scanning every row
+                rows = self._conn.execute("""
+                    WITH RECURSIVE keys(key) AS (
+                        SELECT MIN(key) FROM meta
+                        UNION ALL
+                        SELECT (SELECT MIN(key) FROM meta WHERE key > keys.key) FROM keys WHERE keys.key IS NOT NULL
+                    )
+                    SELECT key FROM keys WHERE key IS NOT NULL
+                """)
+                self._meta_keys = frozenset(row[0] for row in rows)
+            return self._meta_keys
+
+    def filter_ids(self, filters):
+        """IDs of documents matching every filter clause, or None when there are no filters"""
+        if not filters:
+            return None
+        result = None
+        with self._lock:
+            for key, condition in filters.items():
+                if not isinstance(condition, dict):
+                    condition = {"$eq": condition}
+                for op, expected in condition.items():
+                    if op == "$in":
+                        values = list(expected)
+                        placeholders = ",".join("?" * len(values))
+                        rows = self._conn.execute(
+                            f"SELECT doc_id FROM meta WHERE key = ? AND value IN ({placeholders})", [key, *values]
+                        )
+                    else:
+                        rows = self._conn.execute(
+                            f"SELECT doc_id FROM meta WHERE key = ? AND value {_OPERATORS[op]} ?", (key, expected)
+                        )
+                    ids = {row[0] for row in rows}
+                    result = ids if result is None else result & ids
+        return result
+
+    def get_documents(self, ids):
+        ids = list(ids)
+        if not ids:
+            return []
+        with self._lock:
+            rows = {}
+            for start in range(0, len(ids), 500):
+                chunk = ids[start:start + 500]
+                placeholders = ",".join("?" * len(chunk))
+                for doc_id, text, metadata in self._conn.execute(
+                    f"SELECT doc_id, text, metadata FROM docs WHERE doc_id IN ({placeholders})", chunk
+                ):
+                    rows[doc_id] = Document(page_content=text, metadata=json.loads(metadata), id=doc_id)
+        return [rows[doc_id] for doc_id in ids if doc_id in rows]
+
+    def search(self, query, k=10, filters=None):
+        """BM25 top-k as (doc_id, score), restricted to documents matching filters"""
+        terms = list(dict.fromkeys(tokenize(query)))
+        allowed = self.filter_ids(filters)
+        if not terms or self.doc_count == 0 or allowed == set():
+            return []
+        scores = Counter()
+        with self._lock:
+            for term in terms:
+                postings = self._conn.execute(
+                    "SELECT postings.doc_id, postings.tf, docs.length FROM postings "
+                    "JOIN docs ON docs.doc_id = postings.doc_id WHERE postings.term = ?",
+                    (term,),
+                ).fetchall()
+                if not postings:
+                    continue
+                df = len(postings)
+                idf = math.log(1 + (self.doc_count - df + 0.5) / (df + 0.5))
+                for doc_id, tf, length in postings:
+                    if allowed is not None and doc_id not in allowed:
+                        continue
+                    norm = self.k1 * (1 - self.b + self.b * length / (self.avg_length or 1))
+                    scores[doc_id] += idf * tf * (self.k1 + 1) / (tf + norm)
+        return scores.most_common(k)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,28 @@
+"""
+Retriever that defers opening its vector store until the first query.
+
+The vector store modules export one of these as `retriever`, so importing
+them costs no I/O and no embedding calls; the real retriever is built by
+the module's factory on first use and reused for the life of the process.
+"""
+from typing import Any, Callable, List
+
+from langchain_core.callbacks import AsyncCallbackManagerForRetrieverRun, CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+
+
+class LazyRetriever(BaseRetriever):
+    """Delegates to factory() (which should cache what it builds)"""
+
+    factory: Callable[[], Any]
+
+    def _get_relevant_documents(
+        self, query: str, *, run_manager: CallbackManagerForRetrieverRun
+    ) -> List[Document]:
+        return self.factory().invoke(query, config={"callbacks": run_manager.get_child()})
+
+    async def _aget_relevant_documents(
+        self, query: str, *, run_manager: AsyncCallbackManagerForRetrieverRun
+    ) -> List[Document]:
+        return await self.factory().ainvoke(query, config={"callbacks": run_manager.get_child()})
@@ -0,0 +1,284 @@
+"""
+Persistent LLM response cache for the RAG chains and agents.
+
+Responses are stored in one SQLite file, keyed by a hash of the fully
+rendered prompt (question and retrieved context included), the model and
+its sampling parameters. Asking the same thing about the same context
+again is answered from disk in milliseconds instead of regenerating.
+
+Only deterministic calls are cached: a model whose temperature is above 0,
+or not set (so the provider's sampling default applies), is passed
+through unless the cache is forced. Entries expire after a TTL and the
+least recently used ones are evicted beyond max_entries.
+
+    llm = with_llm_cache(OllamaLLM(model="llama3.2", temperature=0))
+
+LangChain consults the cache on invoke/batch; for `prompt | llm` chains,
+cached_stream() does the same for streamed answers. RAG_LLM_CACHE
+overrides the cache file (off disables it), RAG_LLM_CACHE_ENTRIES and
+RAG_LLM_CACHE_TTL set the bounds, RAG_LLM_CACHE_FORCE=1 caches sampled
+responses too. The REPLs and batch_qa.py leave the model's temperature at
+its default unless RAG_LLM_TEMPERATURE is set (sampling_from_env()), so
+caching their answers is opt-in with RAG_LLM_TEMPERATURE=0.
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from langchain_core.caches import BaseCache
+from langchain_core.language_models.llms import BaseLLM
+from langchain_core.messages import message_to_dict, messages_from_dict
+from langchain_core.outputs import ChatGeneration, Generation
+
+from tracing import incr
+
+DEFAULT_CACHE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "llm_responses.sqlite3")
+DEFAULT_MAX_ENTRIES = 10000
+DEFAULT_TTL_SECONDS = 7 * 24 * 3600
+
+SAMPLING_PARAMS = ("temperature", "top_p", "top_k", "seed", "max_tokens", "num_predict", "num_ctx",
+                   "repeat_penalty", "presence_penalty", "frequency_penalty", "mirostat", "format")
+
+
+def model_params(llm):
+    """Model identity and sampling parameters that change what an LLM answers"""
+    params = {"class": type(llm).__name__,
+              "model": getattr(llm, "model", None) or getattr(llm, "model_name", None)}
+    for name in SAMPLING_PARAMS:
+        value = getattr(llm, name, None)
+        if value is not None:
+            params[name] = value
+    return params
+
+
+def _encode(generation):
+    if isinstance(generation, ChatGeneration):
+        return {"message": message_to_dict(generation.message), "info": generation.generation_info}
+    return {"text": generation.text, "info": generation.generation_info}
+
+
+def _decode(item):
+    if "message" in item:
+        return ChatGeneration(message=messages_from_dict([item["message"]])[0], generation_info=item["info"])
+    return Generation(text=item["text"], generation_info=item["info"])
+
+
+def is_deterministic(params):
+    temperature = params.get("temperature")
+    return temperature is not None and float(temperature) <= 0
+
+
+def sampling_from_env(temperature=None):
+    """Model kwargs for temperature, else RAG_LLM_TEMPERATURE; {} keeps the model's default"""
+    if temperature is None and os.getenv("RAG_LLM_TEMPERATURE"):
+        temperature = float(os.environ["RAG_LLM_TEMPERATURE"])
+    return {} if temperature is None else {"temperature": temperature}
+
+
+class LLMResponseCache:
+    """SQLite-backed response store with TTL and LRU eviction and hit/miss stats"""
+
+    def __init__(self, path=DEFAULT_CACHE_PATH, max_entries=DEFAULT_MAX_ENTRIES, ttl_seconds=DEFAULT_TTL_SECONDS,
+                 force=False):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.force = force
+        self.hits = 0
+        self.misses = 0
+        self.skipped = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                generations TEXT NOT NULL,
+                created REAL NOT NULL,
+                last_access REAL NOT NULL
+            ) WITHOUT ROWID
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS responses_lru ON responses (last_access)")
+        self._conn.commit()
+
+    @classmethod
+    def from_env(cls):
+        """Cache configured by RAG_LLM_CACHE / _ENTRIES / _TTL / _FORCE, or None when off"""
+        path = os.getenv("RAG_LLM_CACHE", DEFAULT_CACHE_PATH)
+        if path.lower() in ("off", "0", "false", ""):
+            return None
+        return cls(
+            path,
+            max_entries=int(os.getenv("RAG_LLM_CACHE_ENTRIES", DEFAULT_MAX_ENTRIES)),
+            ttl_seconds=float(os.getenv("RAG_LLM_CACHE_TTL", DEFAULT_TTL_SECONDS)),
+            force=os.getenv("RAG_LLM_CACHE_FORCE", "").lower() in ("1", "true", "on"),
+        )
+
+    @staticmethod
+    def key(prompt, llm_string, params):
+        payload = json.dumps({"prompt": prompt, "llm": llm_string, "params": params}, sort_keys=True, default=str)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key):
+        """Cached generations for key, or None when missing or expired"""
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute("SELECT generations, created FROM responses WHERE key = ?", (key,)).fetchone()
+            if row and now - row[1] > self.ttl_seconds:
+                self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self._conn.commit()
+                row = None
+            if row:
+                self._conn.execute("UPDATE responses SET last_access = ? WHERE key = ?", (now, key))
+                self._conn.commit()
+                self.hits += 1
+            else:
+                self.misses += 1
+        incr("llm_cache_hits" if row else "llm_cache_misses")
+        return [_decode(item) for item in json.loads(row[0])] if row else None
+
+    def put(self, key, generations):
+        now = time.time()
+        payload = json.dumps([_encode(generation) for generation in generations], default=str)
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, generations, created, last_access) VALUES (?, ?, ?, ?)",
+                (key, payload, now, now),
+            )
+            self._evict(now)
+            self._conn.commit()
+
+    def _evict(self, now):
+        """Drop expired responses, then the least recently used ones beyond max_entries"""
+        expired = self._conn.execute("DELETE FROM responses WHERE created < ?", (now - self.ttl_seconds,)).rowcount
+        excess = self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0] - self.max_entries
+        if excess > 0:
+            self._conn.execute(
+                "DELETE FROM responses WHERE key IN (SELECT key FROM responses ORDER BY last_access LIMIT ?)",
+                (excess,),
+            )
+        self.evictions += max(0, expired) + max(0, excess)
+
+    def skip(self):
+        """Count a lookup that was not cacheable (sampled response, cache not forced)"""
+        self.skipped += 1
+        incr("llm_cache_skipped")
+
+    def bind(self, llm, force=None):
+        """BaseCache for one model, to be set as its `cache` field"""
+        return BoundLLMCache(self, llm, self.force if force is None else force)
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM responses")
+            self._conn.commit()
+
+    def stats(self):
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "skipped": self.skipped,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "entries": entries,
+        }
+
+    def summary(self):
+        s = self.stats()
+        return (f"LLM cache: {s['hits']} hits, {s['misses']} misses ({s['hit_rate']:.0%} hit rate), "
+                f"{s['skipped']} not cacheable, {s['entries']} responses")
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class BoundLLMCache(BaseCache):
+    """LangChain cache interface over an LLMResponseCache for one model
+
+    LangChain's llm_string does not always name the model or its sampling
+    parameters (OllamaLLM's does not), so they are read off the model and
+    added to every key.
+    """
+
+    def __init__(self, store, llm, force=False):
+        self.store = store
+        self.params = model_params(llm)
+        self.cacheable = force or is_deterministic(self.params)
+
+    def lookup(self, prompt, llm_string):
+        if not self.cacheable:
+            self.store.skip()
+            return None
+        return self.store.get(self.store.key(prompt, llm_string, self.params))
+
+    def update(self, prompt, llm_string, return_val):
+        if self.cacheable:
+            self.store.put(self.store.key(prompt, llm_string, self.params), return_val)
+
+    def clear(self, **kwargs):
+        self.store.clear()
+
+
+_shared_cache = None
+_shared_lock = threading.Lock()
+
+
+def get_shared_llm_cache():
+    """Process-wide response cache configured from the environment, or None when off"""
+    global _shared_cache
+    with _shared_lock:
+        if _shared_cache is None:
+            _shared_cache = LLMResponseCache.from_env() or False
+    return _shared_cache or None
+
+
+def with_llm_cache(llm, cache=None, force=None):
+    """Set llm's cache to the shared (or given) response cache; returns llm"""
+    cache = cache or get_shared_llm_cache()
+    if cache is not None:
+        llm.cache = cache.bind(llm, force=force)
+    return llm
+
+
+def _llm_string(llm):
+    # What BaseLLM.invoke passes to the cache for a call without stop words
+    params = llm.asdict() if hasattr(llm, "asdict") else llm.dict()
+    return str(sorted({**params, "stop": None}.items()))
+
+
+def cached_stream(chain, inputs, config=None):
+    """chain.stream(inputs), answered from the LLM's response cache when possible
+
+    Handles `prompt | llm` chains whose LLM (not chat model) went through
+    with_llm_cache(); a hit is yielded as one chunk, a fully streamed miss
+    is stored. Any other chain is streamed as is.
+    """
+    steps = getattr(chain, "steps", None)
+    llm = steps[-1] if steps and len(steps) == 2 else None
+    cache = getattr(llm, "cache", None)
+    if not isinstance(llm, BaseLLM) or not isinstance(cache, BoundLLMCache):
+        yield from chain.stream(inputs, config=config)
+        return
+
+    prompt = steps[0].invoke(inputs, config=config).to_string()
+    llm_string = _llm_string(llm)
+    cached = cache.lookup(prompt, llm_string)
+    if cached:
+        yield cached[0].text
+        return
+    parts = []
+    for chunk in llm.stream(prompt, config=config):
+        parts.append(chunk)
+        yield chunk
+    cache.update(prompt, llm_string, [Generation(text="".join(parts))])
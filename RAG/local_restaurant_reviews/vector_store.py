@@ -1,38 +1,298 @@
+"""
+Restaurant review vector store.
+
+Importing this module has no side effects: `retriever` opens the Chroma
+collection (building it from the CSV the first time) on its first query,
+and the opened store is reused for the life of the process.
+RAG_SELF_TEST=1 runs a sample query when the store is opened.
+The CSV is read in chunks of RAG_CSV_CHUNK_ROWS rows and identical
+review texts are embedded once.
+RAG_VECTOR_BACKEND=numpy keeps the vectors in a flat NumPy store
+(numpy_vector_store.py) instead of Chroma. RAG_HNSW_* tune the Chroma
+index (hnsw_config.py).
+
+rebuild() embeds the CSV into a new generation directory beside the live
+one and switches readers over only once it validates; rollback()
+switches back (see index_generations.py).
+
+The paths above are relative to the working directory (the repo root for
+the REPL). Processes that run elsewhere, like retrieval_server.py, open
+the collection through open_collection() and build_retriever() with
+absolute paths and keep what they open themselves.
+"""
 # from langchain_core.tools import retriever  # This was causing the conflict
-from langchain_ollama import OllamaEmbeddings
-from langchain_chroma import Chroma
-from langchain_core.documents import Document
 import os
-from ollama import embeddings
-import pandas as pd
-
-df = pd.read_csv("RAG/local_restaurant_reviews/synthetic_reviews.csv")
-embeddings = OllamaEmbeddings(model = "mxbai-embed-large")
-db_location =  "./chroma_langchain_db"
-add_documents = not os.path.exists(db_location)
-
-vector_store = Chroma(
-    collection_name = "restaurant_reviews",
-    persist_directory=db_location,
-    embedding_function=embeddings
-)
-
-if add_documents:
-    documents = []
-    ids = []
-    for i, row in df.iterrows():
-        document = Document(
-            page_content = row["title"] + " " + row["text_of_review"],
-            metadata = {"rating":row["rating"], "date":row["date_of_review"]}
+import sys
+import threading
+
+# Shared RAG helpers live one level up
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+import index_generations
+from lazy_retriever import LazyRetriever
+from tracing import incr, span
+
+csv_location = "RAG/local_restaurant_reviews/synthetic_reviews.csv"
+embedding_model = "mxbai-embed-large"
+vector_backend = os.getenv("RAG_VECTOR_BACKEND", "chroma").lower()
+db_location =  "./numpy_langchain_db" if vector_backend == "numpy" else "./chroma_langchain_db"
+collection_name = "restaurant_reviews"
+sample_queries = ("great food",)
+
+_lock = threading.RLock()
+_embeddings = None
+_vector_store = None
+_store_location = None
+_pointer_version = None
+_keyword_index = None
+_retrievers = {}
+
+
+def _review_metadata(rating, date):
+    """Typed metadata for one review; values pandas could not parse are left out"""
+    metadata = {}
+    if isinstance(rating, int):
+        metadata["rating"] = rating
+    if isinstance(date, str):
+        metadata["date"] = date
+    return metadata
+
+
+def iter_document_chunks(chunksize=None, csv_path=None):
+    """Read the review CSV (csv_location by default) as (documents, ids) chunks of RAG_CSV_CHUNK_ROWS rows
+
+    Texts and metadata are built a column at a time: rating becomes an
+    int and the date an ISO date string. IDs come from the
+    RAG_REVIEW_ID_COLUMN column when the CSV has one, otherwise from the
+    row's position in the file (the IDs this store has always used).
+    """
+    import pandas as pd
+    from langchain_core.documents import Document
+
+    csv_path = csv_path or csv_location
+    chunksize = chunksize or int(os.getenv("RAG_CSV_CHUNK_ROWS", "10000"))
+    id_column = os.getenv("RAG_REVIEW_ID_COLUMN", "review_id")
+    text_columns = {"title": "string", "text_of_review": "string", "date_of_review": "string"}
+    position = 0
+    reader = pd.read_csv(csv_path, chunksize=chunksize, dtype=text_columns)
+    while True:
+        with span("load", source=csv_path, offset=position):
+            chunk = next(reader, None)
+        if chunk is None:
+            break
+        with span("to_documents", rows=len(chunk)):
+            texts = chunk["title"].fillna("") + " " + chunk["text_of_review"].fillna("")
+            ratings = pd.to_numeric(chunk["rating"], errors="coerce").round().astype("Int64")
+            dates = pd.to_datetime(chunk["date_of_review"], errors="coerce").dt.strftime("%Y-%m-%d")
+            if id_column in chunk.columns:
+                ids = chunk[id_column].astype("string").tolist()
+            else:
+                ids = [str(i) for i in range(position, position + len(chunk))]
+            documents = [
+                Document(page_content=text, metadata=_review_metadata(rating, date))
+                for text, rating, date in zip(texts.tolist(), ratings.tolist(), dates.tolist())
+            ]
+        position += len(chunk)
+        incr("documents_loaded", len(documents))
+        yield documents, ids
+
+
+def load_documents():
+    """Read the whole review CSV into Documents and their IDs"""
+    documents, ids = [], []
+    for chunk_documents, chunk_ids in iter_document_chunks():
+        documents.extend(chunk_documents)
+        ids.extend(chunk_ids)
+    return documents, ids
+
+
+def ingest(vector_store, keyword_index=None, csv_path=None):
+    """Embed every review of csv_path (csv_location by default) into the collection and the keyword index
+
+    The CSV is streamed in chunks. Within a chunk each distinct review text
+    is embedded once and rows repeating it share the vector; repeats in
+    later chunks are served by the embedding cache.
+    """
+    from embedding_client import OllamaBatchEmbedder, ThroughputMeter, UpsertReport
+
+    csv_path = csv_path or csv_location
+    if keyword_index is None:
+        keyword_index = get_keyword_index(vector_store)
+    # Embed in concurrent batches and upsert each batch as it arrives
+    batch_embedder = OllamaBatchEmbedder.from_env(embedding_model, verbose=True)
+    report = UpsertReport(meter=ThroughputMeter())
+    rows = 0
+    with span("ingest", source=csv_path) as s:
+        for documents, ids in iter_document_chunks(csv_path=csv_path):
+            rows += len(ids)
+            failed_before = len(report.failed_ids)
+            batch_embedder.upsert_deduplicated(vector_store, documents, ids, report=report)
+            failed = set(report.failed_ids[failed_before:])
+            stored = [(doc_id, doc) for doc_id, doc in zip(ids, documents) if doc_id not in failed]
+            keyword_index.upsert([doc_id for doc_id, _ in stored], [doc for _, doc in stored])
+        s.set(documents=rows, duplicates=report.duplicates)
+    print(f"Embedded {report.meter.summary()}")
+    print(f"♻️  {report.duplicates} of {rows} reviews repeated a text and reused its vector")
+    if report.failed_ids:
+        print(f"❌ {len(report.failed_ids)} reviews were not stored: {report.errors[0]}")
+    return report
+
+
+def current_db_location():
+    """Directory of the live generation (db_location until the first rebuild)"""
+    return index_generations.current_location(db_location)
+
+
+def get_embeddings():
+    """Embedding client shared by the stores this process opens"""
+    global _embeddings
+    with _lock:
+        if _embeddings is None:
+            from langchain_ollama import OllamaEmbeddings
+            from embedding_cache import CachedEmbeddings
+            from model_keeper import model_keep_alive
+
+            _embeddings = CachedEmbeddings(OllamaEmbeddings(model = embedding_model, keep_alive=model_keep_alive()))
+        return _embeddings
+
+
+def open_store(location, embeddings=None):
+    """Chroma collection (or NumPy store) persisted in location, queried with embeddings (get_embeddings())"""
+    embeddings = embeddings or get_embeddings()
+    if vector_backend == "numpy":
+        from numpy_vector_store import NumpyVectorStore
+        return NumpyVectorStore.from_env(location, embeddings)
+    from hnsw_config import open_chroma
+
+    # HNSW settings come from RAG_HNSW_* (see hnsw_config.py)
+    return open_chroma(collection_name, location, embeddings)
+
+
+def _follow_switch():
+    """Drop the opened store and retrievers once a rebuild or rollback has switched generations"""
+    global _vector_store, _keyword_index, _pointer_version
+    version = index_generations.pointer_version(db_location)
+    if version != _pointer_version:
+        _pointer_version = version
+        _vector_store = _keyword_index = None
+        _retrievers.clear()
+
+
+def open_collection(location, embeddings=None, keyword_index=None, base_dir=None):
+    """Open the store in location, building it from the CSV if it does not exist yet
+
+    keyword_index(vector_store) gives the keyword index ingestion writes to
+    (get_keyword_index by default); csv_location is resolved against
+    base_dir when given.
+    """
+    add_documents = not os.path.exists(location)
+    vector_store = open_store(location, embeddings)
+    if add_documents:
+        csv_path = os.path.join(base_dir, csv_location) if base_dir else csv_location
+        ingest(vector_store, keyword_index=(keyword_index or get_keyword_index)(vector_store), csv_path=csv_path)
+    if os.getenv("RAG_SELF_TEST", "").lower() in ("1", "true", "yes"):
+        results = vector_store.similarity_search("great food", k=2)
+        print(f"✅ Retriever test successful! Retrieved {len(results)} reviews")
+    return vector_store
+
+
+def get_vector_store():
+    """Open the Chroma collection once per process, building it on first run"""
+    global _vector_store, _store_location
+    with _lock:
+        _follow_switch()
+        if _vector_store is not None:
+            return _vector_store
+
+        location = current_db_location()
+        _store_location = location
+        _vector_store = open_collection(location)
+        return _vector_store
+
+
+def open_keyword_index(vector_store, location):
+    """BM25 index stored next to the collection in location, built from it if missing"""
+    from keyword_index import KeywordIndex
+
+    keyword_index = KeywordIndex(location)
+    if len(keyword_index) == 0 and vector_store._collection.count() > 0:
+        print("🔤 Building keyword index from the existing collection...")
+        keyword_index.rebuild_from_chroma(vector_store)
+    return keyword_index
+
+
+def get_keyword_index(vector_store):
+    """BM25 index stored next to the collection, built from it if missing"""
+    global _keyword_index
+    with _lock:
+        if _keyword_index is None:
+            _keyword_index = open_keyword_index(vector_store, _store_location or current_db_location())
+        return _keyword_index
+
+
+def build_retriever(vector_store, location, k, keyword_index=None):
+    """Retriever over the store opened from location; keyword_index(vector_store) as in open_collection()"""
+    from retrieval_cache import CachedRetriever, RetrievalCache, chroma_version
+
+    if os.getenv("RAG_HYBRID", "on").lower() in ("off", "0", "false"):
+        retriever = vector_store.as_retriever(
+                search_kwargs = {"k": k}
         )
-        ids.append(str(i))
-        documents.append(document)
+    else:
+        from hybrid_retriever import REVIEW_FILTER_KEYS, HybridRetriever
+        retriever = HybridRetriever(vector_store=vector_store,
+                                    keyword_index=(keyword_index or get_keyword_index)(vector_store), k=k,
+                                    filter_keys=REVIEW_FILTER_KEYS)
+    version_fn = vector_store.version if vector_backend == "numpy" else chroma_version(location)
+    cache = RetrievalCache.from_env(version_fn=version_fn)
+    if cache:
+        retriever = CachedRetriever(retriever=retriever, cache=cache, embeddings=vector_store.embeddings)
+    return retriever
+
+
+def get_retriever(k=5):
+    """Retriever over the review collection, cached per k
+
+    Searches are hybrid (BM25 + vector, RAG_HYBRID=off for vector only):
+    "1-star reviews from 2024" filters on rating and date before ranking.
+    Repeated queries are answered from a RetrievalCache that is dropped
+    whenever the collection is written to (RAG_RETRIEVAL_CACHE=off disables it).
+    """
+    with _lock:
+        _follow_switch()
+        if k not in _retrievers:
+            vector_store = get_vector_store()
+            _retrievers[k] = build_retriever(vector_store, _store_location, k)
+        return _retrievers[k]
+
+
+def rebuild(keep=2, force=False, resume=False):
+    """Embed the CSV into a new generation and switch readers to it once it validates
+
+    The live collection keeps serving queries meanwhile and stays as it is
+    if anything fails. Reviews already embedded come from the embedding cache.
+    """
+    from keyword_index import KeywordIndex
+
+    def build(location):
+        vector_store = open_store(location)
+        report = ingest(vector_store, keyword_index=KeywordIndex(location))
+        if report.failed_ids:
+            raise RuntimeError(f"{len(report.failed_ids)} reviews were not stored: {report.errors[0]}")
+        return vector_store, len(report.upserted_ids)
+
+    live_location = current_db_location()
+    live_count = open_store(live_location)._collection.count() if os.path.exists(live_location) else None
+    return index_generations.rebuild(db_location, build, sample_queries, live_count=live_count,
+                                     keep=keep, force=force, resume=resume)
+
+
+def rollback():
+    """Switch readers back to the previous generation"""
+    return index_generations.rollback(db_location)
 
-    vector_store.add_documents(documents=documents, ids = ids)
 
-retriever = vector_store.as_retriever(
-        search_kwargs = {"k": 5}
-)
+# Opens the store on first query; see get_retriever()
+retriever = LazyRetriever(factory=get_retriever)
 
 # Export the retriever for use in other modules
-__all__ = ['retriever']
\ No newline at end of file
+__all__ = ['retriever', 'get_retriever', 'get_vector_store', 'get_keyword_index', 'rebuild', 'rollback']
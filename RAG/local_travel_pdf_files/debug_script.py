@@ -3,10 +3,15 @@
 Smart debug script that auto-detects the travel folder location
 """
 import os
+import sys
 import glob
 from langchain_ollama import OllamaEmbeddings
 from langchain_chroma import Chroma
 
+# Shared RAG helpers live one level up
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from model_keeper import ModelKeeper
+
 def find_travel_folder():
     """Automatically find the travel folder"""
     possible_paths = [
@@ -30,11 +35,20 @@ def check_ollama_connection():
     """Test if Ollama is running and model is available"""
     print("=== OLLAMA CONNECTION TEST ===")
     try:
+        # Load both models first, timing the cold load against a warm request
+        keeper = ModelKeeper.from_env({"mxbai-embed-large": "embed", "llama3.2": "generate"})
+        keeper.warm_all()
+        keeper.stop()
         embeddings = OllamaEmbeddings(model="mxbai-embed-large")
         test_embedding = embeddings.embed_query("test")
         print(f"✅ Ollama connection successful!")
         print(f"✅ mxbai-embed-large model working!")
         print(f"✅ Embedding dimension: {len(test_embedding)}")
+        for name, stats in keeper.stats().items():
+            if stats["cold_load_s"] is None:
+                print(f"❌ {name} could not be loaded: {stats['last_error']}")
+            else:
+                print(f"🔥 {name}: cold load {stats['cold_load_s']:.2f}s, warm request {stats['warm_s']:.2f}s")
         return True
     except Exception as e:
         print(f"❌ Ollama connection failed: {e}")
@@ -102,7 +116,8 @@ def test_pdf_loading():
 def check_vector_database():
     """Check existing vector database"""
     print("\n=== VECTOR DATABASE CHECK ===")
-    db_location = "./chroma_travel_db"
+    from vector_store_PDF import current_db_location
+    db_location = current_db_location()
     
     if not os.path.exists(db_location):
         print(f"❌ No existing database found at {db_location}")
@@ -137,7 +152,7 @@ def check_vector_database():
         return False
 
 def rebuild_database():
-    """Offer to rebuild the database"""
+    """Offer to sync or rebuild the database"""
     print("\n=== DATABASE REBUILD OPTION ===")
     
     travel_folder = find_travel_folder()
@@ -145,25 +160,27 @@ def rebuild_database():
         print("❌ Cannot rebuild - no travel folder found")
         return False
     
-    response = input("Would you like to rebuild the vector database? (y/n): ").lower()
-    if response != 'y':
+    print("Sync only embeds new or changed PDFs and removes pages of deleted ones.")
+    print("A full rebuild builds a new copy beside the live database and switches to it once it validates.")
+    response = input("Sync (s), full rebuild (f), roll back to the previous build (r) or skip (n)? ").lower()
+    if response not in ('s', 'f', 'r'):
         return False
     
-    # Remove existing database
-    db_location = "./chroma_travel_db"
-    if os.path.exists(db_location):
-        import shutil
-        shutil.rmtree(db_location)
-        print("🗑️  Removed existing database")
-    
-    print("🔄 Rebuilding database...")
     try:
-        # Import and run vector store creation
-        exec(open("vector_store_PDF.py").read())
-        print("✅ Database rebuilt successfully!")
+        import vector_store_PDF
+        if response == 'r':
+            print(f"↩️  Rolled back to {vector_store_PDF.rollback()}")
+            return True
+        print("🔄 Syncing database..." if response == 's' else "🔄 Rebuilding database...")
+        if response == 'f':
+            # The live database keeps serving until the new one is complete and validated
+            vector_store_PDF.rebuild()
+        else:
+            vector_store_PDF.main()
+        print("✅ Database updated successfully!")
         return True
     except Exception as e:
-        print(f"❌ Failed to rebuild database: {e}")
+        print(f"❌ Failed to update database: {e}")
         return False
 
 def main():
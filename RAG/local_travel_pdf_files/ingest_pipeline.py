@@ -0,0 +1,289 @@
+"""
+Streaming ingestion pipeline for the travel PDF vector store.
+
+    parse PDFs -> diff pages against the manifest -> embed batches -> upsert
+
+The stages run concurrently and hand work on through bounded queues
+(INGEST_QUEUE_SIZE batches each), so a slow stage holds the others back
+instead of letting parsed pages or vectors pile up. A file's pages are
+dropped as soon as its batches are queued and only their hashes are kept,
+so memory stays flat whether the folder holds ten PDFs or ten thousand.
+
+Every batch written is journaled in an IngestCheckpoint next to the
+manifest, and the manifest itself is saved every INGEST_MANIFEST_EVERY
+files. After a crash the next run replays the journal and only embeds
+what had not been written yet; a failed batch no longer costs the rest of
+its file.
+"""
+import asyncio
+import os
+import sys
+from dataclasses import dataclass, field
+
+from pdf_manifest import hash_text
+from pdf_parsing import iter_parsed_pdfs
+
+# Shared RAG helpers live one level up
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from embedding_client import ThroughputMeter
+from tracing import incr, span
+
+_DONE = object()
+
+
+@dataclass
+class FileJob:
+    """A changed file whose batches are in flight"""
+    filename: str
+    state: tuple
+    page_hashes: dict
+    pending: int = 0
+    queued_all: bool = False
+    written: dict = field(default_factory=dict)
+    failed: list = field(default_factory=list)
+    errors: list = field(default_factory=list)
+    unchanged: int = 0
+    stale: int = 0
+
+
+class IngestPipeline:
+    """Runs the parse/embed/upsert stages over the changed files of one sync"""
+
+    def __init__(self, vector_store, manifest, checkpoint, batch_embedder, keyword_index=None,
+                 workers=1, queue_size=8, manifest_every=50, show_previews=False, stored_hashes=None):
+        self.vector_store = vector_store
+        self.manifest = manifest
+        self.checkpoint = checkpoint
+        self.embedder = batch_embedder
+        self.keyword_index = keyword_index
+        self.workers = workers
+        self.queue_size = queue_size
+        self.manifest_every = manifest_every
+        self.show_previews = show_previews
+        # Old page hashes of a file when there is no manifest yet (read from the collection)
+        self.stored_hashes = stored_hashes
+        self.stats = {"upserted": 0, "deleted": 0, "skipped": 0, "failed_files": 0}
+        self._in_flight = {}
+        self._finished_since_save = 0
+
+    @classmethod
+    def from_env(cls, vector_store, manifest, checkpoint, batch_embedder, **kwargs):
+        """Build with INGEST_QUEUE_SIZE / INGEST_MANIFEST_EVERY"""
+        kwargs.setdefault("queue_size", int(os.getenv("INGEST_QUEUE_SIZE", "8")))
+        kwargs.setdefault("manifest_every", int(os.getenv("INGEST_MANIFEST_EVERY", "50")))
+        return cls(vector_store, manifest, checkpoint, batch_embedder, **kwargs)
+
+    def run(self, changed, removed):
+        return asyncio.run(self.arun(changed, removed))
+
+    async def arun(self, changed, removed):
+        """Remove deleted files, stream the changed ones through, save the manifest; returns stats"""
+        for filename in removed:
+            stale_ids = list(self.manifest.page_hashes(filename))
+            print(f"\n🗑️  Removing {len(stale_ids)} pages of deleted file: {filename}")
+            if stale_ids:
+                self.vector_store.delete(ids=stale_ids)
+                if self.keyword_index is not None:
+                    self.keyword_index.delete(stale_ids)
+            self.manifest.forget_file(filename)
+            self.checkpoint.record_removed(filename)
+            self.stats["deleted"] += len(stale_ids)
+
+        self.meter = ThroughputMeter()
+        self._batches = asyncio.Queue(maxsize=self.queue_size)
+        self._embedded = asyncio.Queue(maxsize=self.queue_size)
+        # Deletes and upserts go to the store one at a time
+        self._write_lock = asyncio.Lock()
+        async with self.embedder.session() as session:
+            tasks = [asyncio.create_task(self._produce(changed))]
+            tasks += [asyncio.create_task(self._embed(session)) for _ in range(self.embedder.max_concurrency)]
+            tasks.append(asyncio.create_task(self._write()))
+            try:
+                await asyncio.gather(*tasks)
+            except BaseException:
+                # The journal keeps what was written; the next run resumes from it
+                for task in tasks:
+                    task.cancel()
+                await asyncio.gather(*tasks, return_exceptions=True)
+                self.checkpoint.close()
+                raise
+
+        # Also persists refreshed mtimes of unchanged files
+        self.manifest.save()
+        self.checkpoint.remove()
+        return self.stats
+
+    async def _produce(self, changed):
+        """Parse each changed file, queue deletes of stale pages and batches of pages to embed"""
+        parsed = iter_parsed_pdfs([pdf_file for pdf_file, _ in changed], workers=self.workers)
+        parsing = None
+        try:
+            for pdf_file, state in changed:
+                # Parsing blocks (and may wait on the process pool), so keep it off the event loop
+                parsing = asyncio.ensure_future(asyncio.to_thread(next, parsed))
+                _, page_documents, error = await asyncio.shield(parsing)
+                job, to_upsert = await self._prepare(pdf_file, state, page_documents, error)
+                del page_documents
+                if job is None:
+                    continue
+                batch_size = self.embedder.batch_size
+                for start in range(0, len(to_upsert), batch_size):
+                    job.pending += 1
+                    # Blocks while the embedding stage is behind
+                    await self._batches.put((job, to_upsert[start:start + batch_size]))
+                job.queued_all = True
+                if job.pending == 0:
+                    self._finish(job)
+        finally:
+            # Shut the parse pool down on failure and cancellation too; a parse still
+            # running in its thread has to return before the generator can be closed
+            if parsing is not None and not parsing.done():
+                await asyncio.wait([parsing])
+            await asyncio.to_thread(parsed.close)
+        for _ in range(self.embedder.max_concurrency):
+            await self._batches.put(_DONE)
+
+    async def _prepare(self, pdf_file, state, page_documents, error):
+        """Diff one parsed file against what is stored; returns (FileJob, pages to embed), job None on failure"""
+        filename = os.path.basename(pdf_file)
+        print(f"\n📄 Processing: {filename}")
+        if error:
+            print(f"  ❌ Error processing {pdf_file}: {error}")
+            self.stats["failed_files"] += 1
+            incr("files_failed")
+            return None, None
+        try:
+            print(f"  - Extracted {len(page_documents)} pages")
+            if self.show_previews:
+                for doc_id, doc in page_documents:
+                    # Show first 200 characters of content for verification
+                    content_preview = doc.page_content[:200].replace('\n', ' ')
+                    print(f"    Page {doc.metadata['page']}: {content_preview}...")
+
+            if self.stored_hashes is None:
+                old_hashes = self.manifest.page_hashes(filename)
+            else:
+                old_hashes = await asyncio.to_thread(self.stored_hashes, filename)
+            new_hashes = {doc_id: hash_text(doc.page_content) for doc_id, doc in page_documents}
+            to_upsert = [
+                (doc_id, doc) for doc_id, doc in page_documents
+                if old_hashes.get(doc_id) != new_hashes[doc_id]
+            ]
+            stale_ids = [doc_id for doc_id in old_hashes if doc_id not in new_hashes]
+
+            if stale_ids:
+                async with self._write_lock:
+                    with span("delete", file=filename, documents=len(stale_ids)):
+                        await asyncio.to_thread(self._delete, stale_ids)
+        except Exception as e:
+            print(f"  ❌ Error processing {pdf_file}: {str(e)}")
+            self.stats["failed_files"] += 1
+            incr("files_failed")
+            return None, None
+
+        job = FileJob(filename, state, new_hashes, unchanged=len(page_documents) - len(to_upsert),
+                      stale=len(stale_ids))
+        self._in_flight[filename] = job
+        return job, to_upsert
+
+    async def _embed(self, session):
+        """Embedding stage: one of max_concurrency workers pulling batches"""
+        while True:
+            item = await self._batches.get()
+            if item is _DONE:
+                await self._embedded.put(_DONE)
+                return
+            job, batch = item
+            vectors = error = None
+            try:
+                vectors = await self.embedder.aembed_batch(session, [doc.page_content for _, doc in batch], self.meter)
+            except Exception as e:
+                error = e
+                self.meter.failed_batches += 1
+                incr("embedding_failed_batches")
+            # Blocks while the writer is behind
+            await self._embedded.put((job, batch, vectors, error))
+
+    async def _write(self):
+        """Upsert stage: writes batches in arrival order and journals each one"""
+        running = self.embedder.max_concurrency
+        while running:
+            item = await self._embedded.get()
+            if item is _DONE:
+                running -= 1
+                continue
+            job, batch, vectors, error = item
+            batch_ids = [doc_id for doc_id, _ in batch]
+            if error is None:
+                try:
+                    async with self._write_lock:
+                        with span("upsert", documents=len(batch_ids)):
+                            await asyncio.to_thread(self._upsert, batch, vectors)
+                except Exception as e:
+                    error = e
+            if error is None:
+                written = {doc_id: job.page_hashes[doc_id] for doc_id in batch_ids}
+                job.written.update(written)
+                self.checkpoint.record_batch(job.filename, written)
+                incr("documents_upserted", len(batch_ids))
+            else:
+                job.failed.extend(batch_ids)
+                job.errors.append(str(error))
+                if self.embedder.verbose:
+                    print(f"  ❌ Batch of {job.filename} failed: {error}")
+            job.pending -= 1
+            if job.queued_all and job.pending == 0:
+                self._finish(job)
+
+    def _delete(self, ids):
+        self.vector_store.delete(ids=ids)
+        if self.keyword_index is not None:
+            self.keyword_index.delete(ids)
+
+    def _upsert(self, batch, vectors):
+        ids = [doc_id for doc_id, _ in batch]
+        documents = [doc for _, doc in batch]
+        self.vector_store._collection.upsert(
+            ids=ids,
+            embeddings=vectors,
+            documents=[doc.page_content for doc in documents],
+            metadatas=[doc.metadata for doc in documents],
+        )
+        if self.keyword_index is not None:
+            self.keyword_index.upsert(ids, documents)
+
+    def _finish(self, job):
+        """Record a file whose batches are all written (or failed)"""
+        del self._in_flight[job.filename]
+        embedded = len(job.page_hashes) - job.unchanged - len(job.failed)
+        if job.failed:
+            # Keep the pages that made it; the file stays "changed" so the rest is retried next run
+            failed = set(job.failed)
+            pages = {doc_id: h for doc_id, h in job.page_hashes.items() if doc_id not in failed}
+            self.manifest.record_file(job.filename, (None, None, None), pages)
+            self.checkpoint.record_file(job.filename, None, pages)
+            self.stats["failed_files"] += 1
+            incr("files_failed")
+            print(f"  ❌ {job.filename}: {len(job.failed)} pages failed to embed: {job.errors[0]}")
+        else:
+            # Record the file only once its pages are stored, so a failure is retried next run
+            self.manifest.record_file(job.filename, job.state, job.page_hashes)
+            self.checkpoint.record_file(job.filename, job.state, job.page_hashes)
+            print(f"  ✅ {job.filename}: {embedded} pages embedded, {job.unchanged} unchanged, {job.stale} removed")
+
+        self.stats["upserted"] += embedded
+        self.stats["deleted"] += job.stale
+        self.stats["skipped"] += job.unchanged
+        incr("pages_deleted", job.stale)
+        incr("pages_unchanged", job.unchanged)
+
+        self._finished_since_save += 1
+        if self._finished_since_save >= self.manifest_every:
+            self.save()
+
+    def save(self):
+        """Save the manifest and restart the journal from it"""
+        self.manifest.save()
+        self.checkpoint.reset({filename: dict(job.written) for filename, job in self._in_flight.items()
+                               if job.written})
+        self._finished_since_save = 0
@@ -0,0 +1,220 @@
+"""
+Ingestion manifest for the travel PDF vector store.
+
+Keeps a content hash for every PDF and for every page chunk that was
+embedded, so re-ingestion only parses and embeds files that were added or
+changed and only removes pages that no longer exist. Between manifest
+saves, IngestCheckpoint journals every batch written so an interrupted
+run resumes where it stopped.
+"""
+import hashlib
+import json
+import os
+
+MANIFEST_NAME = "ingest_manifest.json"
+CHECKPOINT_NAME = "ingest_checkpoint.jsonl"
+MANIFEST_VERSION = 1
+
+
+def hash_text(text):
+    """Content hash of a page chunk"""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def hash_file(path, block_size=1024 * 1024):
+    """Content hash of a file, read in blocks"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class IngestManifest:
+    """Per-file and per-page hashes of what is stored in a collection"""
+
+    def __init__(self, path, embedding_model, files=None, stored_model=None):
+        self.path = path
+        self.embedding_model = embedding_model
+        self.files = files or {}
+        self.stored_model = stored_model
+        # A manifest written for another embedding model cannot vouch for
+        # the vectors in the collection, so every page is treated as new.
+        self.model_changed = stored_model is not None and stored_model != embedding_model
+        if self.model_changed:
+            self.files = {}
+
+    @classmethod
+    def load(cls, db_location, embedding_model):
+        """Load the manifest stored next to the Chroma files, if any"""
+        path = os.path.join(db_location, MANIFEST_NAME)
+        if not os.path.exists(path):
+            return cls(path, embedding_model)
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        if data.get("version") != MANIFEST_VERSION:
+            return cls(path, embedding_model)
+        return cls(path, embedding_model, data.get("files"), data.get("embedding_model"))
+
+    @property
+    def exists(self):
+        return os.path.exists(self.path)
+
+    def save(self):
+        """Write the manifest atomically so a crash never leaves half a file"""
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        data = {
+            "version": MANIFEST_VERSION,
+            "embedding_model": self.embedding_model,
+            "files": self.files,
+        }
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f, indent=1, sort_keys=True)
+        os.replace(tmp_path, self.path)
+
+    def file_state(self, pdf_file):
+        """Return (sha256, size, mtime_ns), skipping the hash when size and mtime match"""
+        stat = os.stat(pdf_file)
+        entry = self.files.get(os.path.basename(pdf_file))
+        if entry and entry["size"] == stat.st_size and entry["mtime_ns"] == stat.st_mtime_ns:
+            return entry["sha256"], stat.st_size, stat.st_mtime_ns
+        return hash_file(pdf_file), stat.st_size, stat.st_mtime_ns
+
+    def diff(self, pdf_files):
+        """Split the folder contents into changed files and removed file names
+
+        Changed files are returned as (pdf_file, (sha256, size, mtime_ns)).
+        """
+        changed = []
+        unchanged = []
+        present = set()
+        for pdf_file in pdf_files:
+            filename = os.path.basename(pdf_file)
+            present.add(filename)
+            state = self.file_state(pdf_file)
+            entry = self.files.get(filename)
+            if entry and entry["sha256"] == state[0]:
+                # Refresh mtime so the next run can skip hashing this file
+                entry["size"], entry["mtime_ns"] = state[1], state[2]
+                unchanged.append(pdf_file)
+            else:
+                changed.append((pdf_file, state))
+        removed = sorted(set(self.files) - present)
+        return changed, unchanged, removed
+
+    def page_hashes(self, filename):
+        """Hashes of the pages stored for a file, keyed by document ID"""
+        entry = self.files.get(filename)
+        return dict(entry["pages"]) if entry else {}
+
+    def page_count(self):
+        """Pages recorded across all files"""
+        return sum(len(entry["pages"]) for entry in self.files.values())
+
+    def record_file(self, filename, state, page_hashes):
+        sha256, size, mtime_ns = state
+        self.files[filename] = {
+            "sha256": sha256,
+            "size": size,
+            "mtime_ns": mtime_ns,
+            "pages": page_hashes,
+        }
+
+    def forget_file(self, filename):
+        return self.files.pop(filename, None)
+
+
+class IngestCheckpoint:
+    """Append-only journal of what ingestion wrote since the manifest was last saved
+
+    One JSON line per upserted batch and per finished or removed file,
+    flushed to disk as it is written. Rewriting the whole manifest after
+    every batch would cost more than the batch itself on a large corpus, so
+    the manifest is saved now and then and, after a crash, replay() brings
+    it up to the last batch that made it into the collection.
+    """
+
+    def __init__(self, db_location, embedding_model):
+        self.path = os.path.join(db_location, CHECKPOINT_NAME)
+        self.embedding_model = embedding_model
+        self._file = None
+
+    @property
+    def exists(self):
+        return os.path.exists(self.path)
+
+    def replay(self, manifest):
+        """Apply a previous run's journal to the manifest; returns the number of entries applied"""
+        if not self.exists:
+            return 0
+        applied = 0
+        with open(self.path, "r", encoding="utf-8") as f:
+            for i, line in enumerate(f):
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    # Torn last line of a crashed run; the batch is simply redone
+                    break
+                if i == 0:
+                    if entry.get("embedding_model") != manifest.embedding_model:
+                        return 0
+                    continue
+                filename = entry["file"]
+                if entry["kind"] == "removed":
+                    manifest.forget_file(filename)
+                elif entry["kind"] == "file":
+                    manifest.record_file(filename, entry["state"] or (None, None, None), entry["pages"])
+                else:
+                    # Some pages of a file that never finished: keep them, leave the file "changed"
+                    pages = manifest.page_hashes(filename)
+                    pages.update(entry["pages"])
+                    manifest.record_file(filename, (None, None, None), pages)
+                applied += 1
+        return applied
+
+    def _append(self, entry):
+        if self._file is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            self._file = open(self.path, "a", encoding="utf-8")
+            if self._file.tell() == 0:
+                self._file.write(json.dumps({"embedding_model": self.embedding_model}) + "\n")
+        self._file.write(json.dumps(entry) + "\n")
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def record_batch(self, filename, page_hashes):
+        self._append({"kind": "batch", "file": filename, "pages": page_hashes})
+
+    def record_file(self, filename, state, page_hashes):
+        self._append({"kind": "file", "file": filename, "state": state, "pages": page_hashes})
+
+    def record_removed(self, filename):
+        self._append({"kind": "removed", "file": filename})
+
+    def reset(self, partial=None):
+        """Start a fresh journal once the manifest is saved
+
+        partial maps files still in flight to the pages already written for
+        them, which the saved manifest does not hold yet.
+        """
+        self.close()
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(json.dumps({"embedding_model": self.embedding_model}) + "\n")
+            for filename, page_hashes in (partial or {}).items():
+                f.write(json.dumps({"kind": "batch", "file": filename, "pages": page_hashes}) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+
+    def remove(self):
+        """Drop the journal after a run that finished and saved the manifest"""
+        self.close()
+        if self.exists:
+            os.remove(self.path)
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
@@ -0,0 +1,112 @@
+"""
+PDF parse/split stage for the travel vector store.
+
+Kept free of import-time side effects so process pool workers can import
+it under any start method (fork, spawn, forkserver).
+"""
+import multiprocessing
+import os
+import sys
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from langchain_core.documents import Document
+from langchain_community.document_loaders import PyPDFLoader
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+# Shared RAG helpers live one level up
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from tracing import configure_worker, span, worker_config
+
+
+def load_pdf_pages(pdf_file):
+    """Load and split one PDF into (doc_id, Document) pairs"""
+    loader = PyPDFLoader(pdf_file)
+    filename = os.path.basename(pdf_file)
+    # Same as loader.load_and_split(), timed per step
+    with span("load", file=filename) as s:
+        raw_pages = loader.load()
+        s.set(pages=len(raw_pages))
+    with span("split", file=filename) as s:
+        pages = RecursiveCharacterTextSplitter().split_documents(raw_pages)
+        s.set(chunks=len(pages))
+
+    page_documents = []
+    for i, page in enumerate(pages):
+        # Create document with content and metadata
+        document = Document(
+            page_content=page.page_content,
+            metadata={
+                "source": filename,
+                "page": i + 1,
+                "file_path": pdf_file,
+                "content_length": len(page.page_content)
+            }
+        )
+
+        # Create unique ID for each page
+        doc_id = f"{filename}_page_{i+1}"
+        page_documents.append((doc_id, document))
+    return page_documents
+
+
+def parse_pdf(pdf_file):
+    """Worker entry point: returns (pdf_file, page_documents, error) and never raises"""
+    try:
+        return pdf_file, load_pdf_pages(pdf_file), None
+    except Exception as e:
+        return pdf_file, None, f"{type(e).__name__}: {e}"
+
+
+def _pool_context():
+    # Parsing runs beside other threads (the ingest pipeline's event loop and
+    # to_thread workers, the model keeper), and a child forked from a
+    # multi-threaded process can deadlock on a lock another thread held.
+    # Workers start from a forkserver instead, which imports this module once;
+    # spawn where there is none.
+    if "forkserver" in multiprocessing.get_all_start_methods():
+        context = multiprocessing.get_context("forkserver")
+        context.set_forkserver_preload([__name__])
+        return context
+    return multiprocessing.get_context("spawn")
+
+
+def iter_parsed_pdfs(pdf_files, workers=1, prefetch=2):
+    """Yield parse_pdf results in input order
+
+    With workers > 1 the files are parsed in a process pool. At most
+    workers * prefetch files are in flight, so parsed pages of a large
+    corpus never pile up in memory ahead of the consumer.
+    """
+    if workers <= 1 or len(pdf_files) <= 1:
+        for pdf_file in pdf_files:
+            yield parse_pdf(pdf_file)
+        return
+
+    max_in_flight = workers * prefetch
+    pending = deque()
+    # Workers trace into the parent's trace file; metrics stay with the parent
+    with ProcessPoolExecutor(max_workers=workers, mp_context=_pool_context(),
+                             initializer=configure_worker, initargs=worker_config()) as executor:
+        files = iter(pdf_files)
+        for pdf_file in files:
+            pending.append(executor.submit(parse_pdf, pdf_file))
+            if len(pending) >= max_in_flight:
+                break
+        try:
+            while pending:
+                result = pending.popleft().result()
+                next_file = next(files, None)
+                if next_file is not None:
+                    pending.append(executor.submit(parse_pdf, next_file))
+                yield result
+        finally:
+            # Closed early: drop the files not started yet instead of parsing them on exit
+            for future in pending:
+                future.cancel()
+
+
+def parse_workers_from_env(default=1):
+    """Pool size from PDF_PARSE_WORKERS (0 means one worker per CPU)"""
+    value = int(os.getenv("PDF_PARSE_WORKERS", default))
+    return value if value > 0 else (os.cpu_count() or 1)
@@ -1,8 +1,24 @@
+import argparse
+import os
+import sys
+import time
 from langchain_ollama.llms import OllamaLLM
 from langchain_core.prompts import ChatPromptTemplate
+import vector_store_PDF
 from vector_store_PDF import retriever
 
-model = OllamaLLM(model="llama3.2")
+# Shared RAG helpers live one level up
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from streaming import generate_answer
+from context_packing import pack_context
+from tracing import configure_from_env, span
+from llm_cache import get_shared_llm_cache, sampling_from_env, with_llm_cache
+from retrieval_server import remote_retriever_from_env
+from model_keeper import model_keep_alive, start_model_keeper
+
+# With RAG_RETRIEVAL_SERVER set, ask the running retrieval_server.py instead of opening the store here
+retriever = remote_retriever_from_env("travel") or retriever
+
 template = """
 You are a helpful travel assistant that can answer questions about travel documents, reservations, and travel information.
 
@@ -11,18 +27,54 @@ Here are some relevant travel documents: {documents}
 Here is the question to answer: {question}
 """
 
-prompt = ChatPromptTemplate.from_template(template)
-
-chain = prompt | model
-
-while True:
-    print("\n\n ----------------------------------------")
-    question = input("Type in your travel question (q to quit): ")
-    print("\n\n ----------------------------------------")
-    
-    if question == 'q':
-        break
-    
-    documents = retriever.invoke(question)
-    result = chain.invoke({"documents": documents, "question": question})
-    print(result)
\ No newline at end of file
+
+def main():
+    parser = argparse.ArgumentParser(description="Ask questions about the travel documents")
+    parser.add_argument("--no-stream", action="store_true", help="print answers only once they are complete")
+    parser.add_argument("--context-tokens", type=int, default=1500, help="token budget for retrieved context")
+    parser.add_argument("--no-pack", action="store_true", help="pass the retrieved Documents to the prompt as they are")
+    args = parser.parse_args()
+    configure_from_env()
+
+    # Load both models in the background while the user types, and keep them loaded (RAG_WARMUP=0 disables)
+    keeper = start_model_keeper("llama3.2", vector_store_PDF.embedding_model)
+    # RAG_LLM_TEMPERATURE=0 makes answers repeatable, so repeated questions come from the response cache
+    model = with_llm_cache(OllamaLLM(model="llama3.2", keep_alive=model_keep_alive(), **sampling_from_env()))
+    prompt = ChatPromptTemplate.from_template(template)
+
+    chain = prompt | model
+
+    while True:
+        print("\n\n ----------------------------------------")
+        question = input("Type in your travel question (q to quit): ")
+        print("\n\n ----------------------------------------")
+
+        if question == 'q':
+            break
+
+        started = time.perf_counter()
+        # Timed per stage when RAG_TRACE / RAG_METRICS_* are set (see tracing.py)
+        with span("query"):
+            with span("retrieve"):
+                documents = retriever.invoke(question)
+            retrieval_seconds = time.perf_counter() - started
+            if not args.no_pack:
+                with span("pack"):
+                    packed = pack_context(documents, question, budget_tokens=args.context_tokens,
+                                          baseline_text=str(documents))
+                documents = packed.text
+            result, metrics = generate_answer(chain, {"documents": documents, "question": question},
+                                              started, retrieval_seconds, stream=not args.no_stream)
+        print(f"\n⏱️  {metrics.summary()}")
+        if get_shared_llm_cache():
+            print(f"💾 {get_shared_llm_cache().summary()}")
+        if not args.no_pack:
+            print(f"📦 {packed.summary()}")
+
+    if keeper:
+        print(f"\n🔥 Model warm-up:\n{keeper.summary()}")
+
+
+# The parse pool's workers re-import this script; only run the REPL when it is executed
+if __name__ == "__main__":
+    main()
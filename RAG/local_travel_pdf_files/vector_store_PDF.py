@@ -1,161 +1,352 @@
-from langchain_core.tools import retriever
-from langchain_ollama import OllamaEmbeddings
-from langchain_chroma import Chroma
-from langchain_core.documents import Document
-from langchain_community.document_loaders import PyPDFLoader
+"""
+Travel PDF vector store.
+
+Importing this module has no side effects: `retriever` opens the Chroma
+collection on its first query and the opened store is reused for the
+life of the process. Run the module directly to sync the collection with
+the travel folder and run the self-tests:
+
+    python vector_store_PDF.py
+
+RAG_SELF_TEST=1 runs the self-tests on first use as well, and
+RAG_SYNC_ON_START=1 syncs new or changed PDFs before the first query.
+Ingestion streams files through bounded queues (INGEST_QUEUE_SIZE) and
+journals every batch, so an interrupted sync resumes on the next run
+(ingest_pipeline.py). RAG_VECTOR_BACKEND=numpy keeps the vectors in a
+flat NumPy store (numpy_vector_store.py) instead of Chroma. RAG_HNSW_*
+tune the Chroma index (hnsw_config.py).
+
+rebuild() embeds everything into a new generation directory beside the
+live one and switches readers over only once it validates; rollback()
+switches back (see index_generations.py). rebuild(resume=True) continues
+an interrupted rebuild in its unfinished generation.
+
+The paths above are relative to the working directory (this folder for
+the REPL). Processes that run elsewhere, like retrieval_server.py, open
+the collection through open_collection() and build_retriever() with
+absolute paths and keep what they open themselves.
+"""
 import os
+import sys
 import glob
+import threading
+from pdf_manifest import IngestCheckpoint, IngestManifest, hash_text
 
-print("=== VECTOR STORE INITIALIZATION DEBUG ===")
+# Shared RAG helpers live one level up
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+import index_generations
+from lazy_retriever import LazyRetriever
+from tracing import configure_from_env, span
 
-# Initialize embeddings - you can switch between these models:
-embeddings = OllamaEmbeddings(model="mxbai-embed-large")      # Current choice - excellent performance
-# embeddings = OllamaEmbeddings(model="nomic-embed-text")         # Alternative - optimized for long documents
+# Embedding model - you can switch between these models:
+embedding_model = "mxbai-embed-large"      # Current choice - excellent performance
+# embedding_model = "nomic-embed-text"     # Alternative - optimized for long documents
 
-print(f"Using embedding model: mxbai-embed-large")
+# Database location (the live generation inside it: current_db_location())
+vector_backend = os.getenv("RAG_VECTOR_BACKEND", "chroma").lower()
+db_location = "./numpy_travel_db" if vector_backend == "numpy" else "./chroma_travel_db"
+collection_name = "travel_documents"
+sample_queries = ("travel reservation",)
 
-# Database location
-db_location = "./chroma_travel_db"
-add_documents = not os.path.exists(db_location)
+_lock = threading.RLock()
+_embeddings = None
+_vector_store = None
+_store_location = None
+_pointer_version = None
+_keyword_index = None
+_retrievers = {}
 
-print(f"Database location: {db_location}")
-print(f"Database exists: {os.path.exists(db_location)}")
-print(f"Will add documents: {add_documents}")
 
-# Initialize vector store
-print("Initializing Chroma vector store...")
-try:
-    vector_store = Chroma(
-        collection_name="travel_documents",
-        persist_directory=db_location,
-        embedding_function=embeddings
-    )
-    print("✅ Vector store initialized successfully!")
-except Exception as e:
-    print(f"❌ Error initializing vector store: {e}")
-    raise
-
-# Check if collection already has documents
-try:
-    existing_count = vector_store._collection.count()
-    print(f"Existing documents in collection: {existing_count}")
-except Exception as e:
-    print(f"Could not get existing document count: {e}")
-    existing_count = 0
-
-if add_documents:
-    documents = []
-    ids = []
-    
-    # Auto-detect travel folder location
-    possible_paths = ["./travel", "../travel", "../../travel"]
-    travel_folder = None
-    
+def _env_flag(name):
+    return os.getenv(name, "").lower() in ("1", "true", "yes")
+
+
+def find_travel_folder(possible_paths=("./travel", "../travel", "../../travel"), verbose=True, base_dir=None):
+    """Auto-detect travel folder location (possible_paths are relative to base_dir when given)"""
+    if base_dir:
+        possible_paths = [os.path.join(base_dir, path) for path in possible_paths]
     for path in possible_paths:
         if os.path.exists(path):
             test_pdfs = glob.glob(f"{path}/*.pdf")
             if test_pdfs:
-                travel_folder = path
-                print(f"✅ Found travel folder at: {os.path.abspath(travel_folder)}")
-                break
-    
-    if not travel_folder:
+                if verbose:
+                    print(f"✅ Found travel folder at: {os.path.abspath(path)}")
+                return path
+
+    if verbose:
         print("❌ Could not find travel folder with PDF files!")
         print("Checked paths:")
         for path in possible_paths:
             print(f"  - {os.path.abspath(path)}")
-        raise FileNotFoundError("Travel folder not found")
-    
-    pdf_files = glob.glob(f"{travel_folder}/*.pdf")
+    return None
+
+
+def get_embeddings():
+    """Embedding client shared by ingestion and queries"""
+    global _embeddings
+    with _lock:
+        if _embeddings is None:
+            from langchain_ollama import OllamaEmbeddings
+            from embedding_cache import CachedEmbeddings
+            from model_keeper import model_keep_alive
+
+            # Vectors are cached on disk by (model, text), so rebuilds only embed changed text
+            _embeddings = CachedEmbeddings(OllamaEmbeddings(model=embedding_model, keep_alive=model_keep_alive()))
+        return _embeddings
+
+
+def current_db_location():
+    """Directory of the live generation (db_location until the first rebuild)"""
+    return index_generations.current_location(db_location)
+
+
+def open_store(location, embeddings=None):
+    """Chroma collection (or NumPy store) persisted in location, queried with embeddings (get_embeddings())"""
+    embeddings = embeddings or get_embeddings()
+    if vector_backend == "numpy":
+        from numpy_vector_store import NumpyVectorStore
+        return NumpyVectorStore.from_env(location, embeddings)
+    from hnsw_config import open_chroma
+
+    # HNSW settings come from RAG_HNSW_* (see hnsw_config.py)
+    return open_chroma(collection_name, location, embeddings)
+
+
+def _follow_switch():
+    """Drop the opened store and retrievers once a rebuild or rollback has switched generations"""
+    global _vector_store, _keyword_index, _pointer_version
+    version = index_generations.pointer_version(db_location)
+    if version != _pointer_version:
+        _pointer_version = version
+        _vector_store = _keyword_index = None
+        _retrievers.clear()
+
+
+def open_collection(location, embeddings=None, keyword_index=None, base_dir=None, verbose=False):
+    """Open the store in location; a missing or empty one is filled from the travel folder first
+
+    keyword_index(vector_store) gives the keyword index ingestion writes to
+    (get_keyword_index by default); the travel folder is looked for from
+    base_dir when given.
+    """
+    vector_store = open_store(location, embeddings)
+    if vector_store._collection.count() == 0 or _env_flag("RAG_SYNC_ON_START"):
+        ingest(vector_store, verbose=verbose, location=location,
+               keyword_index=(keyword_index or get_keyword_index)(vector_store), base_dir=base_dir)
+    if _env_flag("RAG_SELF_TEST"):
+        self_test(vector_store)
+    return vector_store
+
+
+def get_vector_store(verbose=False):
+    """Open the Chroma collection (or NumPy store) once per process
+
+    A missing or empty collection is filled from the travel folder first.
+    """
+    global _vector_store, _store_location
+    with _lock:
+        _follow_switch()
+        if _vector_store is not None:
+            return _vector_store
+
+        location = current_db_location()
+        _store_location = location
+        _vector_store = open_collection(location, verbose=verbose)
+        return _vector_store
+
+
+def open_keyword_index(vector_store, location):
+    """BM25 index stored next to the collection in location, built from it if missing"""
+    from keyword_index import KeywordIndex
+
+    keyword_index = KeywordIndex(location)
+    if len(keyword_index) == 0 and vector_store._collection.count() > 0:
+        print("🔤 Building keyword index from the existing collection...")
+        keyword_index.rebuild_from_chroma(vector_store)
+    return keyword_index
+
+
+def get_keyword_index(vector_store):
+    """BM25 index stored next to the collection, built from it if missing"""
+    global _keyword_index
+    with _lock:
+        if _keyword_index is None:
+            _keyword_index = open_keyword_index(vector_store, _store_location or current_db_location())
+        return _keyword_index
+
+
+def build_retriever(vector_store, location, k, keyword_index=None):
+    """Retriever over the store opened from location; keyword_index(vector_store) as in open_collection()"""
+    from retrieval_cache import CachedRetriever, RetrievalCache, chroma_version
+
+    if os.getenv("RAG_HYBRID", "on").lower() in ("off", "0", "false"):
+        retriever = vector_store.as_retriever(search_kwargs={"k": k})
+    else:
+        from hybrid_retriever import TRAVEL_FILTER_KEYS, HybridRetriever
+        retriever = HybridRetriever(vector_store=vector_store,
+                                    keyword_index=(keyword_index or get_keyword_index)(vector_store), k=k,
+                                    filter_keys=TRAVEL_FILTER_KEYS)
+    version_fn = vector_store.version if vector_backend == "numpy" else chroma_version(location)
+    cache = RetrievalCache.from_env(version_fn=version_fn)
+    if cache:
+        retriever = CachedRetriever(retriever=retriever, cache=cache, embeddings=vector_store.embeddings)
+    return retriever
+
+
+def get_retriever(k=5):
+    """Retriever over the travel collection, cached per k
+
+    Searches are hybrid (BM25 + vector, RAG_HYBRID=off for vector only) and
+    repeated queries are answered from a RetrievalCache that is dropped
+    whenever the collection is written to (RAG_RETRIEVAL_CACHE=off disables it).
+    """
+    with _lock:
+        _follow_switch()
+        if k not in _retrievers:
+            vector_store = get_vector_store()
+            _retrievers[k] = build_retriever(vector_store, _store_location, k)
+        return _retrievers[k]
+
+
+def stored_page_hashes(vector_store, filename):
+    """Hash the pages already stored for a file (used before a manifest exists)"""
+    stored = vector_store.get(where={"source": filename}, include=["documents"])
+    return {
+        doc_id: hash_text(text)
+        for doc_id, text in zip(stored["ids"], stored["documents"])
+        if text is not None
+    }
+
+
+def sync_documents(vector_store, pdf_files, manifest, batch_embedder, keyword_index=None,
+                   workers=1, show_previews=None, checkpoint=None):
+    """Bring the collection in line with the PDF folder, touching only what changed
+
+    The keyword index, when given, gets the same upserts and deletes.
+    Files stream through ingest_pipeline.py (parse, embed, upsert) with
+    every written batch journaled in checkpoint, so an interrupted sync
+    resumes where it stopped. PDFs are parsed in a process pool when
+    workers > 1. Page previews are printed by default only for serial runs.
+    """
+    from ingest_pipeline import IngestPipeline
+
+    if show_previews is None:
+        show_previews = workers <= 1
+    if checkpoint is None:
+        checkpoint = IngestCheckpoint(os.path.dirname(manifest.path), manifest.embedding_model)
+    changed, unchanged, removed = manifest.diff(pdf_files)
+    print(f"Unchanged files: {len(unchanged)}")
+    print(f"New or changed files: {len(changed)}")
+    print(f"Removed files: {len(removed)}")
+    if workers > 1 and len(changed) > 1:
+        print(f"Parsing with {workers} worker processes")
+
+    # Database built before the manifest existed: diff against what is stored
+    stored_hashes = None if manifest.exists else (lambda filename: stored_page_hashes(vector_store, filename))
+    pipeline = IngestPipeline.from_env(vector_store, manifest, checkpoint, batch_embedder,
+                                       keyword_index=keyword_index, workers=workers,
+                                       show_previews=show_previews, stored_hashes=stored_hashes)
+    stats = pipeline.run(changed, removed)
+    print(f"\nEmbedding: {pipeline.meter.summary()}")
+    return stats
+
+
+def ingest(vector_store, verbose=True, location=None, keyword_index=None, base_dir=None):
+    """Sync the collection in location (the live generation by default) with the travel folder
+
+    The travel folder is looked for from base_dir (the working directory by default).
+    """
+    from embedding_client import OllamaBatchEmbedder
+    from pdf_parsing import parse_workers_from_env
+
+    travel_folder = find_travel_folder(base_dir=base_dir)
+    if not travel_folder:
+        if vector_store._collection.count() == 0:
+            raise FileNotFoundError("Travel folder not found")
+        print("📁 Using existing vector database")
+        return None
+
+    pdf_files = sorted(glob.glob(f"{travel_folder}/*.pdf"))
     print(f"Found {len(pdf_files)} PDF files:")
-    
-    for pdf in pdf_files:
-        print(f"  - {pdf}")
-    
-    if len(pdf_files) == 0:
-        print("❌ No PDF files found! Check your travel folder path.")
-    
-    total_pages = 0
-    successful_files = 0
-    
-    for pdf_file in pdf_files:
-        print(f"\n📄 Processing: {os.path.basename(pdf_file)}")
-        try:
-            # Load PDF using PyPDFLoader
-            loader = PyPDFLoader(pdf_file)
-            pages = loader.load_and_split()
-            
-            print(f"  - Extracted {len(pages)} pages")
-            
-            # Process each page
-            for i, page in enumerate(pages):
-                # Extract filename for metadata
-                filename = os.path.basename(pdf_file)
-                
-                # Show first 200 characters of content for verification
-                content_preview = page.page_content[:200].replace('\n', ' ')
-                print(f"    Page {i+1}: {content_preview}...")
-                
-                # Create document with content and metadata
-                document = Document(
-                    page_content=page.page_content,
-                    metadata={
-                        "source": filename,
-                        "page": i + 1,
-                        "file_path": pdf_file,
-                        "content_length": len(page.page_content)
-                    }
-                )
-                
-                # Create unique ID for each page
-                doc_id = f"{filename}_page_{i+1}"
-                
-                ids.append(doc_id)
-                documents.append(document)
-                total_pages += 1
-                
-            successful_files += 1
-            print(f"  ✅ Successfully processed {len(pages)} pages")
-                
-        except Exception as e:
-            print(f"  ❌ Error processing {pdf_file}: {str(e)}")
-            continue
-    
-    print(f"\n=== PROCESSING SUMMARY ===")
+    if verbose:
+        for pdf in pdf_files:
+            print(f"  - {pdf}")
+
+    location = location or current_db_location()
+    if keyword_index is None:
+        keyword_index = get_keyword_index(vector_store)
+    manifest = IngestManifest.load(location, embedding_model)
+    checkpoint = IngestCheckpoint(location, embedding_model)
+    if manifest.model_changed:
+        # Vectors from another model cannot be mixed with new ones
+        print(f"⚠️  Collection was embedded with {manifest.stored_model}, rebuilding it for {embedding_model}")
+        vector_store.reset_collection()
+        keyword_index.clear()
+        checkpoint.remove()
+    elif checkpoint.exists:
+        resumed = checkpoint.replay(manifest)
+        # Fold the journal into the manifest so new entries never follow a torn line
+        manifest.save()
+        checkpoint.reset()
+        print(f"⏯️  Resuming an interrupted sync ({resumed} journaled batches and files already written)")
+
+    # Ingestion embeds in concurrent batches (EMBED_BATCH_SIZE, EMBED_CONCURRENCY)
+    batch_embedder = OllamaBatchEmbedder.from_env(embedding_model, verbose=verbose)
+    # PDF parsing processes (PDF_PARSE_WORKERS=0 uses every CPU)
+    workers = parse_workers_from_env()
+    with span("ingest", files=len(pdf_files), workers=workers) as s:
+        stats = sync_documents(vector_store, pdf_files, manifest, batch_embedder,
+                               keyword_index=keyword_index, workers=workers,
+                               show_previews=None if verbose else False, checkpoint=checkpoint)
+        s.set(**stats)
+
+    print("\n=== SYNC SUMMARY ===")
     print(f"Total PDF files found: {len(pdf_files)}")
-    print(f"Successfully processed files: {successful_files}")
-    print(f"Total pages extracted: {total_pages}")
-    print(f"Documents to add to vector store: {len(documents)}")
-    
-    if documents:
-        print(f"\n🔄 Adding {len(documents)} document pages to vector store...")
-        try:
-            # Test embedding generation first
-            print("Testing embedding generation...")
-            test_text = documents[0].page_content[:500]  # Test with first 500 chars
-            test_embedding = embeddings.embed_query(test_text)
-            print(f"✅ Test embedding successful! Dimension: {len(test_embedding)}")
-            
-            # Add documents to vector store
-            vector_store.add_documents(documents=documents, ids=ids)
-            print("✅ Documents added successfully to vector store!")
-            
-            # Verify documents were added
-            final_count = vector_store._collection.count()
-            print(f"✅ Final document count in collection: {final_count}")
-            
-        except Exception as e:
-            print(f"❌ Error adding documents to vector store: {e}")
-            raise
-    else:
-        print("❌ No documents were processed successfully.")
+    print(f"Pages embedded: {stats['upserted']}")
+    print(f"Pages unchanged: {stats['skipped']}")
+    print(f"Pages removed: {stats['deleted']}")
+    print(f"Files failed: {stats['failed_files']}")
+    if batch_embedder.cache:
+        print(batch_embedder.cache.summary())
+    print(f"✅ Final document count in collection: {vector_store._collection.count()}")
+    return stats
 
-else:
-    print("📁 Using existing vector database")
+
+def rebuild(keep=2, force=False, resume=False):
+    """Embed the travel folder into a new generation and switch readers to it once it validates
+
+    The live collection keeps serving queries meanwhile and stays as it is
+    if anything fails. Unchanged pages come from the embedding cache.
+    """
+    from keyword_index import KeywordIndex
+
+    def build(location):
+        vector_store = open_store(location)
+        stats = ingest(vector_store, verbose=False, location=location, keyword_index=KeywordIndex(location))
+        if stats is None:
+            raise FileNotFoundError("Travel folder not found")
+        if stats["failed_files"]:
+            raise RuntimeError(f"{stats['failed_files']} PDF files failed to ingest")
+        # A resumed build only synced what was missing, so count every page the manifest holds
+        return vector_store, IngestManifest.load(location, embedding_model).page_count()
+
+    live_location = current_db_location()
+    live_count = open_store(live_location)._collection.count() if os.path.exists(live_location) else None
+    return index_generations.rebuild(db_location, build, sample_queries, live_count=live_count,
+                                     keep=keep, force=force, resume=resume)
+
+
+def rollback():
+    """Switch readers back to the previous generation"""
+    return index_generations.rollback(db_location)
+
+
+def self_test(vector_store):
+    """Sample search and retriever round trip (two embedding calls)"""
     try:
         existing_count = vector_store._collection.count()
-        print(f"Documents in existing collection: {existing_count}")
-        
+        print(f"Documents in collection: {existing_count}")
+
         # Show sample documents
         if existing_count > 0:
             sample_docs = vector_store.similarity_search("travel", k=2)
@@ -166,31 +357,44 @@ else:
     except Exception as e:
         print(f"Error accessing existing collection: {e}")
 
-# Create retriever
-print("\n🔍 Creating retriever...")
-try:
-    retriever = vector_store.as_retriever(
-        search_kwargs={"k": 5}
-    )
-    
-    # Test the retriever
-    print("Testing retriever with sample query...")
-    test_results = retriever.invoke("travel reservation")
+    print("\n🔍 Testing retriever with sample query...")
+    test_results = vector_store.as_retriever(search_kwargs={"k": 5}).invoke("travel reservation")
     print(f"✅ Retriever test successful! Retrieved {len(test_results)} documents")
-    
+
     if test_results:
         print("Sample retrieved document:")
         sample_doc = test_results[0]
         print(f"  Source: {sample_doc.metadata.get('source', 'Unknown')}")
         print(f"  Page: {sample_doc.metadata.get('page', 'Unknown')}")
         print(f"  Content: {sample_doc.page_content[:200]}...")
-    
-except Exception as e:
-    print(f"❌ Error creating or testing retriever: {e}")
-    raise
 
-print("\n✅ Vector store setup complete!")
-print("=" * 50)
+
+def main():
+    """Sync the collection and run the self-tests"""
+    configure_from_env()
+    print("=== VECTOR STORE INITIALIZATION DEBUG ===")
+    print(f"Using embedding model: {embedding_model}")
+    location = current_db_location()
+    print(f"Database location: {location}")
+    print(f"Database exists: {os.path.exists(location)}")
+
+    print("Initializing vector store...")
+    vector_store = open_store(location)
+    print("✅ Vector store initialized successfully!")
+    print(f"Existing documents in collection: {vector_store._collection.count()}")
+
+    ingest(vector_store, location=location)
+    self_test(vector_store)
+
+    print("\n✅ Vector store setup complete!")
+    print("=" * 50)
+
+
+# Opens the store on first query; see get_retriever()
+retriever = LazyRetriever(factory=get_retriever)
 
 # Export the retriever for use in other modules
-__all__ = ['retriever']
\ No newline at end of file
+__all__ = ['retriever', 'get_retriever', 'get_vector_store', 'get_keyword_index', 'rebuild', 'rollback']
+
+if __name__ == "__main__":
+    main()
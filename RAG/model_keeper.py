@@ -0,0 +1,251 @@
+"""
+Warm-up and keep-alive for the local Ollama models.
+
+Ollama loads a model on its first request and unloads it after
+keep_alive of idleness (5 minutes unless a request says otherwise), so
+the first question of a session used to pay the load of both llama3.2
+and mxbai-embed-large. ModelKeeper preloads the models in a background
+thread at startup, asks Ollama to keep them for RAG_KEEP_ALIVE, and
+checks /api/ps every RAG_REWARM_SECONDS to reload any model that was
+evicted anyway (idle timeout, memory pressure, `ollama stop`).
+
+Ollama resets a model's expiry on every request to that request's
+keep_alive, so the LangChain clients must send the same policy:
+
+    OllamaLLM(model="llama3.2", keep_alive=model_keep_alive())
+
+For each model the keeper records the cold load time and the latency of
+a warm request, so stats() shows what the preload saved. RAG_WARMUP=0
+turns it off.
+
+    python RAG/model_keeper.py                      # warm both models and report
+    python RAG/model_keeper.py --watch              # keep them warm until Ctrl+C
+"""
+import argparse
+import json
+import os
+import re
+import threading
+import time
+
+from tracing import configure_from_env, incr, span
+
+DEFAULT_LLM = "llama3.2"
+DEFAULT_EMBEDDING_MODEL = "mxbai-embed-large"
+DEFAULT_KEEP_ALIVE = "30m"
+DEFAULT_REWARM_SECONDS = 60.0
+
+_UNITS = {"": 1, "s": 1, "m": 60, "h": 3600}
+
+
+def parse_keep_alive(value):
+    """Seconds from an Ollama style duration ("30m", "1h", "600", "-1" for forever)"""
+    if isinstance(value, (int, float)):
+        return int(value)
+    match = re.fullmatch(r"\s*(-?\d+(?:\.\d+)?)\s*([smh]?)\s*", str(value))
+    if not match:
+        raise ValueError(f"invalid keep_alive: {value!r}")
+    number, unit = float(match.group(1)), match.group(2)
+    # Any negative value means "never unload"
+    return -1 if number < 0 else int(number * _UNITS[unit])
+
+
+def model_keep_alive():
+    """Keep-alive in seconds for Ollama clients, from RAG_KEEP_ALIVE"""
+    return parse_keep_alive(os.getenv("RAG_KEEP_ALIVE", DEFAULT_KEEP_ALIVE))
+
+
+def _tagged(name):
+    # /api/ps lists "llama3.2:latest" for a model requested as "llama3.2"
+    return name if ":" in name else f"{name}:latest"
+
+
+class ModelKeeper:
+    """Preloads Ollama models and reloads them after eviction
+
+    models maps a model name to "generate" or "embed", the endpoint used
+    to load it.
+    """
+
+    def __init__(self, models, base_url=None, keep_alive=DEFAULT_KEEP_ALIVE,
+                 rewarm_interval=DEFAULT_REWARM_SECONDS, timeout=300.0):
+        from embedding_client import ollama_base_url
+
+        self.models = dict(models)
+        self.base_url = (base_url or ollama_base_url()).rstrip("/")
+        self.keep_alive = parse_keep_alive(keep_alive)
+        self.rewarm_interval = rewarm_interval
+        self.timeout = timeout
+        self._stats = {name: {"kind": kind, "cold_load_s": None, "server_load_s": None, "warm_s": None,
+                              "rewarms": 0, "errors": 0, "last_error": None}
+                       for name, kind in self.models.items()}
+        self._lock = threading.Lock()
+        self._warm = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        self._client = None
+
+    @classmethod
+    def from_env(cls, models, **kwargs):
+        """Build with RAG_KEEP_ALIVE / RAG_REWARM_SECONDS"""
+        kwargs.setdefault("keep_alive", os.getenv("RAG_KEEP_ALIVE", DEFAULT_KEEP_ALIVE))
+        kwargs.setdefault("rewarm_interval", float(os.getenv("RAG_REWARM_SECONDS", str(DEFAULT_REWARM_SECONDS))))
+        return cls(models, **kwargs)
+
+    def _http(self):
+        if self._client is None:
+            import httpx
+
+            self._client = httpx.Client(base_url=self.base_url, timeout=self.timeout)
+        return self._client
+
+    def _request(self, name, warm_up):
+        """One request to a model; returns (client seconds, Ollama's load_duration in seconds)"""
+        if self.models[name] == "embed":
+            path = "/api/embed"
+            payload = {"model": name, "keep_alive": self.keep_alive}
+            if not warm_up:
+                payload["input"] = "warm"
+        else:
+            path = "/api/generate"
+            # A request without a prompt only loads the model
+            payload = {"model": name, "keep_alive": self.keep_alive, "stream": False}
+            if not warm_up:
+                payload.update(prompt="Hi", options={"num_predict": 1})
+        started = time.perf_counter()
+        response = self._http().post(path, json=payload)
+        response.raise_for_status()
+        seconds = time.perf_counter() - started
+        return seconds, response.json().get("load_duration", 0) / 1e9
+
+    def warm(self, name):
+        """Load one model and time a warm request to it; returns True on success"""
+        stats = self._stats[name]
+        try:
+            with span("model_warmup", model=name):
+                cold, server_load = self._request(name, warm_up=True)
+                warm, _ = self._request(name, warm_up=False)
+        except Exception as e:
+            with self._lock:
+                stats["errors"] += 1
+                stats["last_error"] = str(e)
+            incr("model_warmup_errors", model=name)
+            return False
+        with self._lock:
+            stats.update(cold_load_s=cold, server_load_s=server_load, warm_s=warm, last_error=None)
+        return True
+
+    def warm_all(self):
+        """Warm every model in order (the first one listed is ready first); returns True if all loaded"""
+        ok = True
+        for name in self.models:
+            ok = self.warm(name) and ok
+        self._warm.set()
+        return ok
+
+    def loaded(self):
+        """Names of the models Ollama has in memory right now"""
+        data = self._http().get("/api/ps").json()
+        return {entry.get("name") or entry.get("model") for entry in data.get("models", [])}
+
+    def check(self):
+        """Reload the models Ollama evicted; returns their names"""
+        loaded = self.loaded()
+        evicted = [name for name in self.models if _tagged(name) not in loaded and name not in loaded]
+        for name in evicted:
+            if self.warm(name):
+                with self._lock:
+                    self._stats[name]["rewarms"] += 1
+                incr("model_rewarms", model=name)
+        return evicted
+
+    def _run(self):
+        self.warm_all()
+        while not self._stop.wait(self.rewarm_interval):
+            try:
+                self.check()
+            except Exception:
+                # Ollama down for a moment; try again on the next tick
+                incr("model_check_errors")
+
+    def start(self):
+        """Warm the models and keep them loaded from a daemon thread"""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="model-keeper", daemon=True)
+            self._thread.start()
+        return self
+
+    def wait(self, timeout=None):
+        """Block until the first warm-up pass is over; returns False on timeout"""
+        return self._warm.wait(timeout)
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            # A warm-up in flight may take minutes on a real model; the thread is a daemon
+            self._thread.join(timeout=5)
+            self._thread = None
+        if self._client is not None:
+            self._client.close()
+            self._client = None
+
+    def stats(self):
+        with self._lock:
+            return {name: dict(stats) for name, stats in self._stats.items()}
+
+    def summary(self):
+        lines = []
+        for name, stats in self.stats().items():
+            if stats["cold_load_s"] is None:
+                lines.append(f"{name}: not loaded ({stats['last_error']})")
+            else:
+                lines.append(f"{name}: cold load {stats['cold_load_s'] * 1000:.0f} ms, "
+                             f"warm request {stats['warm_s'] * 1000:.0f} ms, {stats['rewarms']} re-warms")
+        return "\n".join(lines)
+
+
+def start_model_keeper(llm=DEFAULT_LLM, embedding_model=DEFAULT_EMBEDDING_MODEL, **kwargs):
+    """Start a keeper for the REPL models unless RAG_WARMUP=0; returns it or None"""
+    if os.getenv("RAG_WARMUP", "1") == "0":
+        return None
+    # The embedding model first: retrieval needs it before the LLM
+    models = {}
+    if embedding_model:
+        models[embedding_model] = "embed"
+    if llm:
+        models[llm] = "generate"
+    return ModelKeeper.from_env(models, **kwargs).start()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Preload the Ollama models and report cold vs warm latency")
+    parser.add_argument("--llm", default=DEFAULT_LLM)
+    parser.add_argument("--embedding-model", default=DEFAULT_EMBEDDING_MODEL)
+    parser.add_argument("--keep-alive", default=os.getenv("RAG_KEEP_ALIVE", DEFAULT_KEEP_ALIVE))
+    parser.add_argument("--rewarm-seconds", type=float,
+                        default=float(os.getenv("RAG_REWARM_SECONDS", str(DEFAULT_REWARM_SECONDS))))
+    parser.add_argument("--watch", action="store_true", help="keep the models loaded until Ctrl+C")
+    parser.add_argument("--json", action="store_true", help="print the stats as JSON")
+    args = parser.parse_args()
+    configure_from_env()
+
+    keeper = ModelKeeper({args.embedding_model: "embed", args.llm: "generate"}, keep_alive=args.keep_alive,
+                         rewarm_interval=args.rewarm_seconds)
+    print(f"🔥 Warming {', '.join(keeper.models)} on {keeper.base_url} (keep_alive {keeper.keep_alive} s)")
+    if args.watch:
+        keeper.start()
+        keeper.wait()
+        print(keeper.summary())
+        try:
+            while True:
+                time.sleep(3600)
+        except KeyboardInterrupt:
+            pass
+    else:
+        keeper.warm_all()
+    keeper.stop()
+    print(json.dumps(keeper.stats(), indent=2) if args.json else keeper.summary())
+
+
+if __name__ == "__main__":
+    main()
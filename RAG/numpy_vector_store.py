@@ -0,0 +1,584 @@
+"""
+Flat NumPy vector store for small and mid-sized collections.
+
+An alternative to Chroma when a collection is a few thousand vectors or
+less: no SQLite or HNSW graph to open, just memory-mapped matrices.
+  - vectors are L2-normalized and kept in a float32 matrix on disk; with
+    RAG_NUMPY_QUANTIZATION=int8 (or float16) a quantized copy is scanned
+    instead and only the best k * rescore_factor candidates per query are
+    read back from the float32 file and rescored
+  - search is exact and batched: the scanned matrix is multiplied with all
+    queries block by block
+  - opening the store maps the files and replays one small record log, so
+    it takes milliseconds and only the pages a search touches are resident
+
+float32 is the default: NumPy has no fast int8 matrix product, so a
+quantized scan converts every block and is slower than scanning float32.
+It only pays off when the float32 matrix would not fit in memory.
+
+Writes append: new and updated vectors go to the end of the matrix files,
+then one line per batch to records.<generation>.jsonl, which is what
+commits them. An updated or deleted document leaves a dead row behind;
+once dead rows outnumber live ones the store is compacted into a new
+generation and store.json is switched over atomically, so readers never
+see a half-written store.
+
+The store implements the subset of Chroma's collection API the ingestion
+code uses (count, get, upsert, delete, reset_collection), and
+`_collection` is the store itself, so it can stand in for Chroma(...).
+"""
+import json
+import os
+import threading
+import uuid
+from typing import Any, Iterable, List, Optional
+
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.vectorstores import VectorStore
+
+from keyword_index import _plain, matches_filters
+
+STORE_FILE = "store.json"
+QUANTIZATIONS = ("float32", "int8", "float16")
+DEFAULT_QUANTIZATION = "float32"
+# Dead rows tolerated before a compaction, besides as many as there are live ones
+MIN_DEAD_ROWS = 1024
+
+
+def normalize_rows(vectors):
+    vectors = np.atleast_2d(np.asarray(vectors, dtype=np.float32))
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+def quantize_int8(vectors):
+    """Symmetric per-row int8 quantization: row ≈ codes * scale"""
+    scales = np.abs(vectors).max(axis=1) / 127.0
+    scales[scales == 0] = 1.0
+    codes = np.clip(np.rint(vectors / scales[:, None]), -127, 127).astype(np.int8)
+    return codes, scales.astype(np.float32)
+
+
+def where_matches(metadata, where):
+    """Chroma-style where clause ($and / $or over field conditions)"""
+    if not where:
+        return True
+    for key, condition in where.items():
+        if key == "$and":
+            if not all(where_matches(metadata, clause) for clause in condition):
+                return False
+        elif key == "$or":
+            if not any(where_matches(metadata, clause) for clause in condition):
+                return False
+        elif not matches_filters(metadata, {key: condition}):
+            return False
+    return True
+
+
+def _read_rows(fd, rows, dim):
+    """float32 rows of an open vectors.*.f32 file"""
+    row_bytes = 4 * dim
+    vectors = np.empty((len(rows), dim), dtype=np.float32)
+    for i, row in enumerate(rows):
+        vectors[i] = np.frombuffer(os.pread(fd, row_bytes, int(row) * row_bytes), dtype=np.float32)
+    return vectors
+
+
+class _Snapshot:
+    """Matrices and row data of the store as one search saw them"""
+
+    def __init__(self, full, codes, scales, count, live, ids, texts, metadatas, mask):
+        self.full, self.codes, self.scales = full, codes, scales
+        self.count, self.live = count, live
+        self.ids, self.texts, self.metadatas = ids, texts, metadatas
+        self.mask = mask
+        self.fd = None
+
+    def document(self, row):
+        return Document(page_content=self.texts[row], metadata=dict(self.metadatas[row]), id=self.ids[row])
+
+    def close(self):
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+
+
+class NumpyVectorStore(VectorStore):
+    """Exact cosine search over memory-mapped, optionally quantized vectors"""
+
+    def __init__(self, persist_directory, embedding_function=None, quantization=DEFAULT_QUANTIZATION,
+                 rescore_factor=4, block_rows=4096):
+        if quantization not in QUANTIZATIONS:
+            raise ValueError(f"quantization must be one of {QUANTIZATIONS}, got {quantization!r}")
+        self.persist_directory = persist_directory
+        self._embedding_function = embedding_function
+        self.quantization = quantization
+        self.rescore_factor = rescore_factor
+        self.block_rows = block_rows
+        self._lock = threading.RLock()
+        self._load()
+
+    @classmethod
+    def from_env(cls, persist_directory, embedding_function=None):
+        """Store configured by RAG_NUMPY_QUANTIZATION and RAG_NUMPY_RESCORE"""
+        return cls(
+            persist_directory,
+            embedding_function,
+            quantization=os.getenv("RAG_NUMPY_QUANTIZATION", DEFAULT_QUANTIZATION).lower(),
+            rescore_factor=int(os.getenv("RAG_NUMPY_RESCORE", "4")),
+        )
+
+    @property
+    def embeddings(self):
+        return self._embedding_function
+
+    @property
+    def _collection(self):
+        # Ingestion code talks to Chroma's collection object; this store is its own
+        return self
+
+    # --- storage -----------------------------------------------------------
+
+    def _path(self, name):
+        return os.path.join(self.persist_directory, name)
+
+    def _files(self, generation, quantization):
+        files = {"full": f"vectors.{generation}.f32", "records": f"records.{generation}.jsonl"}
+        if quantization == "int8":
+            files.update(codes=f"vectors.{generation}.i8", scales=f"scales.{generation}.f32")
+        elif quantization == "float16":
+            files.update(codes=f"vectors.{generation}.f16")
+        return files
+
+    def _row_formats(self):
+        """(file key, dtype, values per row) of every matrix file of the stored quantization"""
+        formats = [("full", np.float32, self._dim)]
+        if self._stored_quantization == "int8":
+            formats += [("codes", np.int8, self._dim), ("scales", np.float32, 1)]
+        elif self._stored_quantization == "float16":
+            formats.append(("codes", np.float16, self._dim))
+        return formats
+
+    def _load(self):
+        self._generation = 0
+        self._stored_quantization = self.quantization
+        self._dim = None
+        self._ids, self._texts, self._metadatas = [], [], []
+        self._index = {}
+        self._live = 0
+        self._alive = None
+        self._full = self._codes = self._scales = None
+        try:
+            with open(self._path(STORE_FILE), encoding="utf-8") as f:
+                state = json.load(f)
+        except FileNotFoundError:
+            return
+
+        self._generation = state["generation"]
+        self._stored_quantization = state["quantization"]
+        self._dim = state["dim"]
+        self._replay()
+        self._map()
+        if self._stored_quantization != self.quantization and self._live:
+            # Re-quantize once from the float32 rows
+            self._compact()
+
+    def _replay(self):
+        """Rebuild ids, texts and metadatas per row from the record log"""
+        path = self._path(self._files(self._generation, self._stored_quantization)["records"])
+        if not os.path.exists(path):
+            return
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    # Torn line of a write that never committed
+                    continue
+                if entry["op"] == "put":
+                    self._put_rows(entry["start"], entry["ids"], entry["documents"], entry["metadatas"])
+                else:
+                    self._drop_ids(entry["ids"])
+
+    def _put_rows(self, start, ids, texts, metadatas):
+        """Record a batch stored in rows start, start + 1, ...; earlier rows of its IDs die"""
+        stop = start + len(ids)
+        if stop > len(self._ids):
+            grow = stop - len(self._ids)
+            self._ids.extend([None] * grow)
+            self._texts.extend([None] * grow)
+            self._metadatas.extend([None] * grow)
+        self._drop_ids([doc_id for doc_id in ids if doc_id in self._index])
+        self._ids[start:stop], self._texts[start:stop], self._metadatas[start:stop] = ids, texts, metadatas
+        self._index.update(zip(ids, range(start, stop)))
+        self._live += len(ids)
+        self._alive = None
+
+    def _drop_ids(self, ids):
+        for doc_id in ids:
+            row = self._index.pop(doc_id, None)
+            if row is not None:
+                self._ids[row] = self._texts[row] = self._metadatas[row] = None
+                self._live -= 1
+                self._alive = None
+
+    def _map(self):
+        """Memory-map the rows the log has committed"""
+        self._full = self._codes = self._scales = None
+        rows = len(self._ids)
+        if not rows:
+            return
+        files = self._files(self._generation, self._stored_quantization)
+        for key, dtype, width in self._row_formats():
+            shape = (rows, width) if width > 1 else (rows,)
+            setattr(self, f"_{key}", np.memmap(self._path(files[key]), dtype=dtype, mode="r", shape=shape))
+
+    def _file_rows(self):
+        """Rows fully written to every matrix file (the next free row)"""
+        files = self._files(self._generation, self._stored_quantization)
+        rows = []
+        for key, dtype, width in self._row_formats():
+            try:
+                size = os.path.getsize(self._path(files[key]))
+            except FileNotFoundError:
+                size = 0
+            rows.append(size // (np.dtype(dtype).itemsize * width))
+        return min(rows)
+
+    def _write_state(self, generation, quantization):
+        state = {"generation": generation, "dim": self._dim, "quantization": quantization}
+        tmp_path = self._path(STORE_FILE + ".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(state, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self._path(STORE_FILE))
+
+    def _append(self, vectors, ids, texts, metadatas):
+        """Append rows to the matrix files, then commit them with one write to the record log"""
+        os.makedirs(self.persist_directory, exist_ok=True)
+        if not self._generation:
+            self._generation = 1
+            self._stored_quantization = self.quantization
+            self._write_state(self._generation, self.quantization)
+        files = self._files(self._generation, self._stored_quantization)
+        # Rows past the log's end belong to a write that never committed; overwrite them
+        start = max(len(self._ids), self._file_rows())
+        parts = {"full": vectors}
+        if self._stored_quantization == "int8":
+            parts["codes"], parts["scales"] = quantize_int8(vectors)
+        elif self._stored_quantization == "float16":
+            parts["codes"] = vectors.astype(np.float16)
+        for key, dtype, width in self._row_formats():
+            path = self._path(files[key])
+            with open(path, "r+b" if os.path.exists(path) else "wb") as f:
+                f.seek(start * np.dtype(dtype).itemsize * width)
+                f.write(np.ascontiguousarray(parts[key], dtype=dtype).tobytes())
+                f.flush()
+                os.fsync(f.fileno())
+
+        self._append_log(files["records"], [self._put_entry(start, ids, texts, metadatas)])
+        # Rows skipped over stay dead
+        self._put_rows(start, ids, texts, metadatas)
+        self._map()
+
+    @staticmethod
+    def _put_entry(start, ids, texts, metadatas):
+        """Record log line for a batch stored in rows start, start + 1, ..."""
+        return json.dumps({"op": "put", "start": start, "ids": ids, "documents": texts, "metadatas": metadatas})
+
+    def _append_log(self, name, lines):
+        path = self._path(name)
+        with open(path, "ab") as f:
+            if f.tell():
+                # Start on a fresh line if a crashed write left a torn one
+                with open(path, "rb") as tail:
+                    tail.seek(-1, os.SEEK_END)
+                    if tail.read(1) != b"\n":
+                        f.write(b"\n")
+            f.write(("\n".join(lines) + "\n").encode("utf-8"))
+            f.flush()
+            os.fsync(f.fileno())
+
+    def _maybe_compact(self):
+        dead = len(self._ids) - self._live
+        if dead > max(MIN_DEAD_ROWS, self._live):
+            self._compact()
+
+    def _compact(self):
+        """Write the live rows into a new generation and switch store.json to it"""
+        os.makedirs(self.persist_directory, exist_ok=True)
+        old_files = self._files(self._generation, self._stored_quantization) if self._generation else {}
+        rows = [row for row, doc_id in enumerate(self._ids) if doc_id is not None]
+        vectors = self._read_full(rows)
+        ids = [self._ids[row] for row in rows]
+        texts = [self._texts[row] for row in rows]
+        metadatas = [self._metadatas[row] for row in rows]
+
+        generation = self._generation + 1
+        files = self._files(generation, self.quantization)
+        vectors.tofile(self._path(files["full"]))
+        if self.quantization == "int8":
+            codes, scales = quantize_int8(vectors)
+            codes.tofile(self._path(files["codes"]))
+            scales.tofile(self._path(files["scales"]))
+        elif self.quantization == "float16":
+            vectors.astype(np.float16).tofile(self._path(files["codes"]))
+        with open(self._path(files["records"]), "w", encoding="utf-8") as f:
+            if ids:
+                f.write(self._put_entry(0, ids, texts, metadatas) + "\n")
+        self._write_state(generation, self.quantization)
+
+        # Open maps keep the old files readable until they are dropped
+        for name in old_files.values():
+            try:
+                os.remove(self._path(name))
+            except FileNotFoundError:
+                pass
+        self._load()
+
+    def _full_path(self):
+        return self._path(self._files(self._generation, self._stored_quantization)["full"])
+
+    def _read_full(self, rows):
+        """float32 vectors of rows, read from the file without mapping all of it"""
+        rows = list(rows)
+        if not rows:
+            return np.empty((0, self._dim or 0), dtype=np.float32)
+        fd = os.open(self._full_path(), os.O_RDONLY)
+        try:
+            return _read_rows(fd, rows, self._dim)
+        finally:
+            os.close(fd)
+
+    def version(self):
+        """Changes whenever the store is written to (for RetrievalCache)"""
+        try:
+            stat = os.stat(self._path(STORE_FILE))
+            with open(self._path(STORE_FILE), encoding="utf-8") as f:
+                state = json.load(f)
+            log = os.stat(self._path(self._files(state["generation"], state["quantization"])["records"]))
+        except FileNotFoundError:
+            return None
+        return stat.st_mtime_ns, log.st_size
+
+    # --- Chroma collection API subset ----------------------------------------
+
+    def _live_rows(self):
+        return [row for row, doc_id in enumerate(self._ids) if doc_id is not None]
+
+    def _alive_mask(self):
+        """Rows holding a current document, rebuilt only after writes"""
+        if self._alive is None:
+            self._alive = np.fromiter((doc_id is not None for doc_id in self._ids), dtype=bool, count=len(self._ids))
+        return self._alive
+
+    def count(self):
+        return self._live
+
+    def upsert(self, ids, embeddings, documents=None, metadatas=None):
+        vectors = normalize_rows(embeddings)
+        ids = list(ids)
+        documents = list(documents) if documents is not None else [""] * len(ids)
+        if metadatas is None:
+            metadatas = [{}] * len(ids)
+        metadatas = [{key: _plain(value) for key, value in (m or {}).items()} for m in metadatas]
+        # The last occurrence of an ID within a batch wins
+        last = {doc_id: i for i, doc_id in enumerate(ids)}
+        keep = sorted(last.values())
+        if len(keep) < len(ids):
+            vectors = vectors[keep]
+            ids, documents, metadatas = ([values[i] for i in keep] for values in (ids, documents, metadatas))
+        with self._lock:
+            if self._dim is None:
+                self._dim = vectors.shape[1]
+            elif vectors.shape[1] != self._dim:
+                raise ValueError(f"Vector dimension {vectors.shape[1]} does not match the store ({self._dim})")
+            self._append(vectors, ids, documents, metadatas)
+            self._maybe_compact()
+
+    def get(self, ids=None, where=None, limit=None, offset=None, include=("documents", "metadatas"), **kwargs):
+        with self._lock:
+            if ids is not None:
+                rows = [self._index[doc_id] for doc_id in ids if doc_id in self._index]
+            else:
+                rows = self._live_rows()
+            if where:
+                rows = [row for row in rows if where_matches(self._metadatas[row], where)]
+            rows = list(rows)[offset or 0:]
+            if limit is not None:
+                rows = rows[:limit]
+            result = {"ids": [self._ids[row] for row in rows]}
+            include = include or ()
+            result["documents"] = [self._texts[row] for row in rows] if "documents" in include else None
+            result["metadatas"] = [self._metadatas[row] for row in rows] if "metadatas" in include else None
+            if "embeddings" in include:
+                result["embeddings"] = self._read_full(rows)
+            return result
+
+    def delete(self, ids: Optional[List[str]] = None, **kwargs: Any) -> None:
+        if not ids:
+            return
+        with self._lock:
+            ids = [doc_id for doc_id in dict.fromkeys(ids) if doc_id in self._index]
+            if not ids:
+                return
+            self._append_log(self._files(self._generation, self._stored_quantization)["records"],
+                             [json.dumps({"op": "del", "ids": ids})])
+            self._drop_ids(ids)
+            self._maybe_compact()
+
+    def reset_collection(self):
+        with self._lock:
+            self._ids, self._texts, self._metadatas = [], [], []
+            self._index = {}
+            self._live = 0
+            if self._generation:
+                self._compact()
+            self._dim = None
+
+    # --- search --------------------------------------------------------------
+
+    def _scores(self, queries, scan, scales, count):
+        """queries x rows similarity, scanned in blocks of block_rows"""
+        scores = np.empty((len(queries), count), dtype=np.float32)
+        buffer = None
+        for start in range(0, count, self.block_rows):
+            stop = min(count, start + self.block_rows)
+            block = scan[start:stop]
+            if block.dtype != np.float32:
+                # Convert into one reused buffer, so memory stays at one block whatever the store size
+                if buffer is None:
+                    buffer = np.empty((min(self.block_rows, count), scan.shape[1]), dtype=np.float32)
+                np.copyto(buffer[:stop - start], block, casting="unsafe")
+                block = buffer[:stop - start]
+            np.matmul(queries, block.T, out=scores[:, start:stop])
+            if scales is not None:
+                scores[:, start:stop] *= scales[start:stop]
+        return scores
+
+    def _snapshot(self):
+        """Everything a search reads, taken together under the lock
+
+        Writes never change rows that exist (upserts append, deletes only
+        mark rows dead) and compaction swaps in new lists and files, so the
+        copied row data, the maps and an open descriptor of the float32
+        file stay consistent with each other after the lock is released.
+        """
+        with self._lock:
+            count = 0 if self._full is None else self._full.shape[0]
+            snapshot = _Snapshot(
+                full=self._full, codes=self._codes, scales=self._scales, count=count, live=self._live,
+                ids=self._ids[:count], texts=self._texts[:count], metadatas=self._metadatas[:count],
+                # Dead rows (updated or deleted documents) never match
+                mask=self._alive_mask()[:count] if self._live < count else None,
+            )
+            if self._codes is not None and count and self._live:
+                # Rescoring reads this generation even if a compaction replaces it meanwhile
+                snapshot.fd = os.open(self._full_path(), os.O_RDONLY)
+        return snapshot
+
+    def _search(self, queries, k, filter):
+        """Top-k (row, cosine similarity) per query vector, and the snapshot the rows belong to
+
+        The float32 matrix, or the quantized one, is scanned in blocks for
+        all queries at once; quantized candidates are then rescored with
+        their float32 rows.
+        """
+        queries = normalize_rows(queries)
+        snapshot = self._snapshot()
+        try:
+            return self._search_snapshot(snapshot, queries, k, filter), snapshot
+        finally:
+            snapshot.close()
+
+    def _search_snapshot(self, snapshot, queries, k, filter):
+        count, mask, codes = snapshot.count, snapshot.mask, snapshot.codes
+        if count == 0 or snapshot.live == 0:
+            return [[] for _ in queries]
+
+        if filter:
+            matches = np.fromiter((m is not None and where_matches(m, filter) for m in snapshot.metadatas),
+                                  dtype=bool, count=count)
+            mask = matches if mask is None else mask & matches
+            if not mask.any():
+                return [[] for _ in queries]
+
+        scores = self._scores(queries, snapshot.full if codes is None else codes, snapshot.scales, count)
+        if mask is not None:
+            scores[:, ~mask] = -np.inf
+        allowed = count if mask is None else int(mask.sum())
+
+        candidates = min(allowed, k if codes is None else k * self.rescore_factor)
+        if candidates <= 0:
+            return [[] for _ in queries]
+        top = np.argpartition(-scores, candidates - 1, axis=1)[:, :candidates]
+
+        results = []
+        for i, (query, rows) in enumerate(zip(queries, top)):
+            rows = np.sort(rows)  # ascending rows read the float32 file sequentially
+            if mask is not None:
+                rows = rows[mask[rows]]
+            exact = _read_rows(snapshot.fd, rows, queries.shape[1]) @ query if codes is not None else scores[i, rows]
+            order = np.argsort(-exact)[:k]
+            results.append([(int(rows[j]), float(exact[j])) for j in order])
+        return results
+
+    def search_vectors(self, queries, k=4, filter=None):
+        """Top-k (document ID, cosine similarity) for every query vector"""
+        hits, snapshot = self._search(queries, k, filter)
+        return [[(snapshot.ids[row], score) for row, score in query_hits] for query_hits in hits]
+
+    def _document(self, row):
+        return Document(page_content=self._texts[row], metadata=dict(self._metadatas[row]), id=self._ids[row])
+
+    def _embed_query(self, query):
+        if self._embedding_function is None:
+            raise ValueError("NumpyVectorStore needs an embedding_function to search by text")
+        return self._embedding_function.embed_query(query)
+
+    def similarity_search_with_score_by_vector(self, embedding, k=4, filter=None, **kwargs):
+        """(Document, cosine distance) pairs, lower is closer like Chroma's scores"""
+        hits, snapshot = self._search([embedding], k, filter)
+        return [(snapshot.document(row), 1.0 - score) for row, score in hits[0]]
+
+    def batch_similarity_search_by_vector(self, embeddings, k=4, filter=None):
+        """One Document list per query vector, searched in a single pass"""
+        hits, snapshot = self._search(embeddings, k, filter)
+        return [[snapshot.document(row) for row, _ in query_hits] for query_hits in hits]
+
+    def similarity_search_by_vector(self, embedding, k=4, filter=None, **kwargs):
+        return [doc for doc, _ in self.similarity_search_with_score_by_vector(embedding, k=k, filter=filter)]
+
+    def similarity_search_with_score(self, query, k=4, filter=None, **kwargs):
+        return self.similarity_search_with_score_by_vector(self._embed_query(query), k=k, filter=filter)
+
+    def similarity_search(self, query, k=4, filter=None, **kwargs):
+        return self.similarity_search_by_vector(self._embed_query(query), k=k, filter=filter)
+
+    def _select_relevance_score_fn(self):
+        return self._cosine_relevance_score_fn
+
+    # --- VectorStore API -----------------------------------------------------
+
+    def add_texts(self, texts: Iterable[str], metadatas: Optional[List[dict]] = None,
+                  ids: Optional[List[str]] = None, **kwargs: Any) -> List[str]:
+        texts = list(texts)
+        if self._embedding_function is None:
+            raise ValueError("NumpyVectorStore needs an embedding_function to add texts")
+        ids = list(ids) if ids else [str(uuid.uuid4()) for _ in texts]
+        vectors = self._embedding_function.embed_documents(texts)
+        self.upsert(ids, vectors, documents=texts, metadatas=metadatas)
+        return ids
+
+    def get_by_ids(self, ids):
+        with self._lock:
+            return [self._document(self._index[doc_id]) for doc_id in ids if doc_id in self._index]
+
+    @classmethod
+    def from_texts(cls, texts, embedding, metadatas=None, ids=None, persist_directory="./numpy_db", **kwargs):
+        store = cls(persist_directory, embedding, **kwargs)
+        store.add_texts(texts, metadatas=metadatas, ids=ids)
+        return store
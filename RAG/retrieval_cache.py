@@ -0,0 +1,195 @@
+"""
+Query-level retrieval cache for the RAG retrievers.
+
+Sits in front of a retriever:
+  - exact hits on the normalized query skip both the query embedding and
+    the search
+  - with a semantic threshold, a new query whose embedding is within that
+    cosine similarity of a cached query reuses its results
+  - entries expire after a TTL and the cache is bounded with LRU eviction
+  - the whole cache is dropped when the collection changes, detected
+    through a cheap version function (see chroma_version)
+"""
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, List
+
+import numpy as np
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+
+from tracing import incr
+
+_WHITESPACE = re.compile(r"\s+")
+_TRAILING_PUNCTUATION = re.compile(r"[\s?!.]+$")
+
+
+def normalize_query(query):
+    """Case, whitespace and trailing punctuation do not change the answer"""
+    return _TRAILING_PUNCTUATION.sub("", _WHITESPACE.sub(" ", query.strip().lower()))
+
+
+def chroma_version(db_location):
+    """Changes whenever a persisted Chroma database is written to"""
+    def version():
+        path = os.path.join(db_location, "chroma.sqlite3")
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            return None
+        # WAL writes may land in the side file before the main one
+        wal = path + "-wal"
+        wal_mtime = os.stat(wal).st_mtime_ns if os.path.exists(wal) else 0
+        return stat.st_mtime_ns, stat.st_size, wal_mtime
+    return version
+
+
+class RetrievalCache:
+    """LRU + TTL map from normalized query to retrieved documents"""
+
+    def __init__(self, max_entries=256, ttl_seconds=3600.0, semantic_threshold=None, version_fn=None):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.semantic_threshold = semantic_threshold
+        self.version_fn = version_fn
+        self.hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self._entries = OrderedDict()  # key -> (stored_at, documents, unit query vector or None)
+        self._version = version_fn() if version_fn else None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls, version_fn=None):
+        """Cache configured by RAG_RETRIEVAL_CACHE* variables, or None when off"""
+        if os.getenv("RAG_RETRIEVAL_CACHE", "on").lower() in ("off", "0", "false"):
+            return None
+        threshold = os.getenv("RAG_RETRIEVAL_CACHE_SEMANTIC")
+        return cls(
+            max_entries=int(os.getenv("RAG_RETRIEVAL_CACHE_SIZE", "256")),
+            ttl_seconds=float(os.getenv("RAG_RETRIEVAL_CACHE_TTL", "3600")),
+            semantic_threshold=float(threshold) if threshold else None,
+            version_fn=version_fn,
+        )
+
+    def _check_version(self):
+        if not self.version_fn:
+            return
+        version = self.version_fn()
+        if version != self._version:
+            self._version = version
+            if self._entries:
+                self._entries.clear()
+                self.invalidations += 1
+
+    def _expired(self, stored_at, now):
+        return self.ttl_seconds is not None and now - stored_at > self.ttl_seconds
+
+    def get(self, key):
+        """Exact lookup; counts a miss only when no semantic lookup follows"""
+        with self._lock:
+            self._check_version()
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if self._expired(entry[0], time.time()):
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return list(entry[1])
+
+    def get_similar(self, vector):
+        """Best cached entry within the cosine threshold of vector"""
+        with self._lock:
+            now = time.time()
+            keys, vectors = [], []
+            for key, (stored_at, _, cached_vector) in list(self._entries.items()):
+                if self._expired(stored_at, now):
+                    del self._entries[key]
+                elif cached_vector is not None:
+                    keys.append(key)
+                    vectors.append(cached_vector)
+            if not vectors:
+                return None
+            scores = np.stack(vectors) @ vector
+            best = int(np.argmax(scores))
+            if scores[best] < self.semantic_threshold:
+                return None
+            self._entries.move_to_end(keys[best])
+            self.semantic_hits += 1
+            return list(self._entries[keys[best]][1])
+
+    def put(self, key, documents, vector=None):
+        with self._lock:
+            self.misses += 1
+            self._entries[key] = (time.time(), list(documents), vector)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self):
+        with self._lock:
+            self._entries.clear()
+            self.invalidations += 1
+
+    def stats(self):
+        lookups = self.hits + self.semantic_hits + self.misses
+        return {
+            "hits": self.hits,
+            "semantic_hits": self.semantic_hits,
+            "misses": self.misses,
+            "hit_rate": (self.hits + self.semantic_hits) / lookups if lookups else 0.0,
+            "entries": len(self._entries),
+            "invalidations": self.invalidations,
+        }
+
+    def summary(self):
+        s = self.stats()
+        return (f"retrieval cache: {s['hits']} exact + {s['semantic_hits']} semantic hits, "
+                f"{s['misses']} misses ({s['hit_rate']:.0%} hit rate), {s['invalidations']} invalidations")
+
+
+def _unit(vector):
+    vector = np.asarray(vector, dtype=np.float32)
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+class CachedRetriever(BaseRetriever):
+    """Puts a RetrievalCache in front of another retriever
+
+    Semantic lookups need `embeddings`; with the shared embedding cache the
+    inner retriever's own query embedding is then a cache hit as well.
+    """
+
+    retriever: Any
+    cache: Any
+    embeddings: Any = None
+
+    def _get_relevant_documents(
+        self, query: str, *, run_manager: CallbackManagerForRetrieverRun
+    ) -> List[Document]:
+        key = normalize_query(query)
+        documents = self.cache.get(key)
+        if documents is not None:
+            incr("retrieval_cache_hits", kind="exact")
+            return documents
+
+        vector = None
+        if self.cache.semantic_threshold is not None and self.embeddings is not None:
+            vector = _unit(self.embeddings.embed_query(query))
+            documents = self.cache.get_similar(vector)
+            if documents is not None:
+                incr("retrieval_cache_hits", kind="semantic")
+                return documents
+
+        incr("retrieval_cache_misses")
+        documents = self.retriever.invoke(query, config={"callbacks": run_manager.get_child()})
+        self.cache.put(key, documents, vector)
+        return documents
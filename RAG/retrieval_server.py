@@ -0,0 +1,377 @@
+#!/usr/bin/env python3
+"""
+Long-lived retrieval server for the restaurant and travel collections.
+
+Every REPL run otherwise pays to open Chroma and build the embedding
+client, and concurrent users each send their own one-query embedding
+call. This server keeps both collections open and answers retrievals over
+HTTP. Query embeddings from concurrent requests are collected into
+micro-batches (up to --max-batch queries, waiting at most --max-wait-ms
+for more) and sent to the embedding model in one call per batch.
+
+    python RAG/retrieval_server.py --port 8765
+    RAG_RETRIEVAL_SERVER=http://127.0.0.1:8765 python RAG/local_restaurant_reviews/rag_with_local_model.py
+
+    POST /retrieve  {"collection": "reviews", "query": "...", "k": 5}
+                    -> {"documents": [{"id", "page_content", "metadata"}, ...], "ms": ...}
+    GET  /health    -> document counts and batching stats
+
+Collections are named as in index_generations.py ("reviews", "travel") or
+by their Chroma names. Each collection is opened from absolute paths
+with its module's open_collection() and queried through its
+build_retriever(), so hybrid search, the retrieval cache and generation
+switches behave as they do in-process. RemoteRetriever is the thin client
+the REPLs use when RAG_RETRIEVAL_SERVER is set.
+
+--fake-embeddings answers queries with fake_models.FakeEmbeddings, so
+latency and throughput under load can be measured without Ollama
+(benchmarks/retrieval_server_benchmark.py).
+"""
+import argparse
+import asyncio
+import importlib
+import json
+import os
+import queue
+import sys
+import threading
+import time
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import List
+
+from langchain_core.callbacks import AsyncCallbackManagerForRetrieverRun, CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.retrievers import BaseRetriever
+
+import index_generations
+from tracing import configure_from_env, incr, span
+
+DEFAULT_PORT = 8765
+ALIASES = {"restaurant_reviews": "reviews", "travel_documents": "travel"}
+
+
+class MicroBatchEmbeddings(Embeddings):
+    """Embeds concurrent embed_query calls together, one inner call per micro-batch
+
+    A batch is sent once max_batch queries are waiting or max_wait seconds
+    after the first one arrived, whichever comes first. Identical queries
+    in a batch are embedded once. embed_documents goes straight through.
+    """
+
+    def __init__(self, embeddings, max_batch=32, max_wait=0.005):
+        self.embeddings = embeddings
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.batches = 0
+        self.queries = 0
+        self.largest_batch = 0
+        self._pending = queue.Queue()
+        threading.Thread(target=self._run, name="micro-batcher", daemon=True).start()
+
+    def _collect(self):
+        batch = [self._pending.get()]
+        deadline = time.perf_counter() + self.max_wait
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._pending.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            texts = list(dict.fromkeys(text for text, _ in batch))
+            try:
+                with span("embed_micro_batch", queries=len(batch), texts=len(texts)):
+                    vectors = dict(zip(texts, self.embeddings.embed_documents(texts)))
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+            self.batches += 1
+            self.queries += len(batch)
+            self.largest_batch = max(self.largest_batch, len(batch))
+            incr("query_embedding_batches")
+            for text, future in batch:
+                future.set_result(vectors[text])
+
+    def embed_query(self, text):
+        future = Future()
+        self._pending.put((text, future))
+        return future.result()
+
+    async def aembed_query(self, text):
+        future = Future()
+        self._pending.put((text, future))
+        return await asyncio.wrap_future(future)
+
+    def embed_documents(self, texts):
+        return self.embeddings.embed_documents(texts)
+
+    def stats(self):
+        return {"queries": self.queries, "batches": self.batches, "largest_batch": self.largest_batch,
+                "mean_batch": self.queries / self.batches if self.batches else 0.0}
+
+
+class Collection:
+    """One collection opened from absolute paths, its query embeddings going through a shared batcher
+
+    The module's own singletons (and its paths, relative to where its REPL
+    runs) are left alone; the open store, keyword index and retrievers of
+    the live generation are kept here and reopened after a switch.
+    """
+
+    def __init__(self, name, batcher_for, db_location=None):
+        module_name, module_dir, cwd = index_generations.PIPELINES[name]
+        if module_dir not in sys.path:
+            sys.path.insert(0, module_dir)
+        self.name = name
+        self.module = importlib.import_module(module_name)
+        self.base_dir = cwd
+        self.db_location = os.path.abspath(os.path.join(cwd, db_location or self.module.db_location))
+        self.embeddings = batcher_for(self.module.embedding_model, self.module.get_embeddings())
+        self._lock = threading.RLock()
+        self._pointer_version = None
+        self._location = None
+        self._vector_store = None
+        self._keyword_index = None
+        self._retrievers = {}
+        self.vector_store()
+
+    def vector_store(self):
+        """The live generation's store, opened with the batching embeddings"""
+        with self._lock:
+            version = index_generations.pointer_version(self.db_location)
+            if self._vector_store is None or version != self._pointer_version:
+                self._pointer_version = version
+                self._location = index_generations.current_location(self.db_location)
+                self._keyword_index = None
+                self._retrievers.clear()
+                self._vector_store = self.module.open_collection(
+                    self._location, self.embeddings, keyword_index=self.keyword_index, base_dir=self.base_dir)
+            return self._vector_store
+
+    def keyword_index(self, vector_store):
+        with self._lock:
+            if self._keyword_index is None:
+                self._keyword_index = self.module.open_keyword_index(vector_store, self._location)
+            return self._keyword_index
+
+    def retrieve(self, query, k):
+        with self._lock:
+            vector_store = self.vector_store()
+            if k not in self._retrievers:
+                self._retrievers[k] = self.module.build_retriever(vector_store, self._location, k,
+                                                                  keyword_index=self.keyword_index)
+            retriever = self._retrievers[k]
+        return retriever.invoke(query)
+
+    def count(self):
+        return self.vector_store()._collection.count()
+
+
+class RetrievalService:
+    """Both collections plus one micro-batcher per embedding model"""
+
+    def __init__(self, collections=("reviews", "travel"), max_batch=32, max_wait=0.005, embeddings=None,
+                 db_locations=None):
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        # Overrides every model's query embeddings (the fake embedder in benchmarks)
+        self.embeddings = embeddings
+        self.batchers = {}
+        self._lock = threading.Lock()
+        self.collections = {}
+        for name in collections:
+            with span("open_collection", collection=name):
+                self.collections[name] = Collection(name, self._batcher_for, (db_locations or {}).get(name))
+
+    def _batcher_for(self, model, embeddings):
+        with self._lock:
+            if model not in self.batchers:
+                self.batchers[model] = MicroBatchEmbeddings(self.embeddings or embeddings, self.max_batch,
+                                                            self.max_wait)
+            return self.batchers[model]
+
+    def retrieve(self, collection, query, k=5):
+        name = ALIASES.get(collection, collection)
+        if name not in self.collections:
+            raise KeyError(f"unknown collection {collection!r} (have: {', '.join(self.collections)})")
+        with span("serve_retrieve", collection=name, k=k):
+            return self.collections[name].retrieve(query, k)
+
+    def health(self):
+        return {
+            "collections": {name: collection.count() for name, collection in self.collections.items()},
+            "batching": {model: batcher.stats() for model, batcher in self.batchers.items()},
+        }
+
+
+def document_to_dict(document):
+    return {"id": document.id, "page_content": document.page_content, "metadata": document.metadata}
+
+
+class RetrievalHandler(BaseHTTPRequestHandler):
+    server_version = "RetrievalServer/1.0"
+    protocol_version = "HTTP/1.1"
+    # Headers and body go out in separate writes; with Nagle on, keep-alive
+    # clients wait out a delayed ACK (~40 ms) on every response
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+    def _send(self, status, payload):
+        body = json.dumps(payload, default=str).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path != "/health":
+            self._send(404, {"error": f"unknown path {self.path}"})
+            return
+        self._send(200, self.server.service.health())
+
+    def do_POST(self):
+        if self.path != "/retrieve":
+            self._send(404, {"error": f"unknown path {self.path}"})
+            return
+        try:
+            request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+            query, collection = request["query"], request["collection"]
+            k = int(request.get("k", 5))
+        except (ValueError, KeyError) as e:
+            self._send(400, {"error": f"bad request: {e}"})
+            return
+        started = time.perf_counter()
+        try:
+            documents = self.server.service.retrieve(collection, query, k)
+        except KeyError as e:
+            self._send(404, {"error": str(e.args[0])})
+            return
+        except Exception as e:
+            self._send(500, {"error": f"{type(e).__name__}: {e}"})
+            return
+        self._send(200, {"documents": [document_to_dict(d) for d in documents],
+                         "ms": (time.perf_counter() - started) * 1000})
+
+
+class RetrievalHTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+    # The default backlog of 5 resets connections under a burst of concurrent clients
+    request_queue_size = 128
+
+
+def make_server(service, host="127.0.0.1", port=DEFAULT_PORT, verbose=False):
+    server = RetrievalHTTPServer((host, port), RetrievalHandler)
+    server.service = service
+    server.verbose = verbose
+    return server
+
+
+def start_in_thread(service, **kwargs):
+    """Serve in a daemon thread; returns (server, base_url)"""
+    server = make_server(service, **kwargs)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    host, port = server.server_address[:2]
+    return server, f"http://{host}:{port}"
+
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def _client(url, timeout):
+    """One pooled HTTP client per server, shared by every RemoteRetriever"""
+    import httpx
+
+    with _clients_lock:
+        if url not in _clients:
+            _clients[url] = httpx.Client(base_url=url, timeout=timeout)
+        return _clients[url]
+
+
+class RemoteRetriever(BaseRetriever):
+    """Thin client retriever: asks a running retrieval server instead of opening the store"""
+
+    url: str
+    collection: str
+    k: int = 5
+    timeout: float = 30.0
+
+    def _get_relevant_documents(
+        self, query: str, *, run_manager: CallbackManagerForRetrieverRun
+    ) -> List[Document]:
+        response = _client(self.url, self.timeout).post(
+            "/retrieve", json={"collection": self.collection, "query": query, "k": self.k})
+        if response.status_code != 200:
+            raise RuntimeError(f"retrieval server answered {response.status_code}: {response.text[:200]}")
+        return [Document(**document) for document in response.json()["documents"]]
+
+    async def _aget_relevant_documents(
+        self, query: str, *, run_manager: AsyncCallbackManagerForRetrieverRun
+    ) -> List[Document]:
+        return await asyncio.to_thread(self._get_relevant_documents, query, run_manager=run_manager)
+
+
+def remote_retriever_from_env(collection, k=5):
+    """RemoteRetriever for RAG_RETRIEVAL_SERVER, or None when it is not set"""
+    url = os.getenv("RAG_RETRIEVAL_SERVER")
+    if not url:
+        return None
+    return RemoteRetriever(url=url.rstrip("/"), collection=collection, k=k)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve both RAG collections over HTTP with micro-batched query embedding")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--collections", nargs="+", default=["reviews", "travel"],
+                        choices=list(index_generations.PIPELINES))
+    parser.add_argument("--max-batch", type=int, default=32, help="queries embedded together at most")
+    parser.add_argument("--max-wait-ms", type=float, default=5.0, help="how long a batch waits for more queries")
+    parser.add_argument("--fake-embeddings", action="store_true", help="embed queries with fake_models.FakeEmbeddings")
+    parser.add_argument("--fake-call-ms", type=float, default=20.0, help="simulated cost of one fake embedding call")
+    parser.add_argument("--verbose", action="store_true")
+    args = parser.parse_args()
+    configure_from_env()
+
+    embeddings = None
+    if args.fake_embeddings:
+        from fake_models import FakeEmbeddings
+        embeddings = FakeEmbeddings(seconds_per_call=args.fake_call_ms / 1000)
+    else:
+        from model_keeper import start_model_keeper
+
+        # Queries are only embedded here, so only the embedding model is kept loaded
+        start_model_keeper(llm=None)
+
+    started = time.perf_counter()
+    service = RetrievalService(args.collections, max_batch=args.max_batch, max_wait=args.max_wait_ms / 1000,
+                               embeddings=embeddings)
+    counts = ", ".join(f"{name}: {count}" for name, count in service.health()["collections"].items())
+    print(f"📚 Opened {counts} in {time.perf_counter() - started:.1f} s")
+    server = make_server(service, args.host, args.port, verbose=args.verbose)
+    print(f"🛰️  Retrieval server on http://{args.host}:{server.server_address[1]} "
+          f"(batches up to {args.max_batch}, {args.max_wait_ms:g} ms window)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        print(f"📊 {json.dumps(service.health()['batching'])}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""
+Streaming answers with latency metrics for the RAG REPLs.
+
+Tokens are printed as the model produces them. Each answer is followed by
+one line with retrieval latency, time to first token, generation speed
+and total latency, all measured from the moment the question was asked.
+"""
+import sys
+import time
+from dataclasses import dataclass
+
+from llm_cache import cached_stream
+from tracing import langchain_config, span
+
+
+@dataclass
+class AnswerMetrics:
+    retrieval_seconds: float = 0.0
+    first_token_seconds: float = 0.0
+    total_seconds: float = 0.0
+    tokens: int = 0
+
+    @property
+    def generation_seconds(self):
+        return self.total_seconds - self.first_token_seconds
+
+    @property
+    def tokens_per_second(self):
+        # The first token is paid for by time-to-first-token; rate counts the rest
+        if self.tokens <= 1 or self.generation_seconds <= 0:
+            return 0.0
+        return (self.tokens - 1) / self.generation_seconds
+
+    def summary(self):
+        parts = [f"retrieval {self.retrieval_seconds * 1000:.0f} ms",
+                 f"first token {self.first_token_seconds * 1000:.0f} ms"]
+        if self.tokens:
+            parts.append(f"{self.tokens} tokens at {self.tokens_per_second:.1f} tokens/s")
+        parts.append(f"total {self.total_seconds:.2f} s")
+        return " | ".join(parts)
+
+
+def generate_answer(chain, inputs, started, retrieval_seconds, stream=True, out=sys.stdout):
+    """Run the chain and print the answer, returning (answer, AnswerMetrics)
+
+    started is the perf_counter() value taken when the question came in,
+    so first-token and total latency include retrieval.
+    """
+    with span("generate", stream=stream) as s:
+        answer, metrics = _generate(chain, inputs, started, retrieval_seconds, stream, out)
+        s.set(tokens=metrics.tokens, first_token_ms=metrics.first_token_seconds * 1000)
+    return answer, metrics
+
+
+def _generate(chain, inputs, started, retrieval_seconds, stream, out):
+    metrics = AnswerMetrics(retrieval_seconds=retrieval_seconds)
+    # Prompt rendering and the LLM call show up as child spans when tracing is on
+    config = langchain_config()
+
+    if not stream:
+        answer = chain.invoke(inputs, config=config)
+        # Nothing is shown before the whole answer exists
+        metrics.total_seconds = metrics.first_token_seconds = time.perf_counter() - started
+        print(answer, file=out)
+        return answer, metrics
+
+    parts = []
+    # Deterministic answers already in the LLM response cache come back as one chunk
+    for chunk in cached_stream(chain, inputs, config=config):
+        # LLM chains yield strings, chat model chains yield message chunks
+        text = chunk if isinstance(chunk, str) else getattr(chunk, "content", str(chunk))
+        if not text:
+            continue
+        if not parts:
+            metrics.first_token_seconds = time.perf_counter() - started
+        parts.append(text)
+        metrics.tokens += 1
+        out.write(text)
+        out.flush()
+    out.write("\n")
+    metrics.total_seconds = time.perf_counter() - started
+    if not parts:
+        metrics.first_token_seconds = metrics.total_seconds
+    return "".join(parts), metrics
@@ -16,10 +16,22 @@ from langchain.agents import AgentType, initialize_agent
 from langchain_openai import ChatOpenAI
 from langchain.chat_models import init_chat_model
 from langchain_openai import OpenAIEmbeddings
-from langchain_core.vectorstores import InMemoryVectorStore
+from embedding_cache import CachedEmbeddings
+from context_packing import pack_context
+from index_snapshot import cached_index
+from llm_cache import with_llm_cache
+from tracing import configure_from_env, langchain_config, span
+
+# RAG_TRACE / RAG_METRICS_* (see tracing.py)
+configure_from_env()
+
+BLOG_URL = "https://lilianweng.github.io/posts/2023-06-23-agent/"
+EMBEDDING_MODEL = "text-embedding-3-large"
+CHUNK_SIZE = 1000
+CHUNK_OVERLAP = 200
 
 # Load and chunk contents of the blog
-def load_and_chunk_blog(url="https://lilianweng.github.io/posts/2023-06-23-agent/"):
+def load_blog(url=BLOG_URL):
     loader = WebBaseLoader(
                 web_paths=(url,),
                 bs_kwargs=dict(
@@ -28,22 +40,34 @@ def load_and_chunk_blog(url="https://lilianweng.github.io/posts/2023-06-23-agent
                     )
                 ),
             )
-    docs = loader.load()
-    text_splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=200)
-    all_splits = text_splitter.split_documents(docs)
-    return all_splits
+    return loader.load()
+
+def chunk_documents(docs):
+    text_splitter = RecursiveCharacterTextSplitter(chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP)
+    return text_splitter.split_documents(docs)
+
+def load_and_chunk_blog(url=BLOG_URL):
+    return chunk_documents(load_blog(url))
 
 # Initialize embeddings and LLM
-embeddings = OpenAIEmbeddings(model="text-embedding-3-large")
-llm = init_chat_model(model="gpt-3.5-turbo", temperature=0, model_provider="openai")
+# Cached on disk, so restarts only embed chunks that changed
+embeddings = CachedEmbeddings(OpenAIEmbeddings(model=EMBEDDING_MODEL))
+# Repeated questions over the same context are answered from the response cache
+llm = with_llm_cache(init_chat_model(model="gpt-3.5-turbo", temperature=0, model_provider="openai"))
 
-# Load and index chunks
-all_splits = load_and_chunk_blog()
-vector_store = InMemoryVectorStore(embeddings)
-_ = vector_store.add_documents(documents=all_splits)
+# Load and index chunks, from the on-disk snapshot when the blog has not changed
+vector_store = cached_index(
+    BLOG_URL,
+    fetch=load_blog,
+    split=chunk_documents,
+    embedding=embeddings,
+    params={"splitter": "RecursiveCharacterTextSplitter", "chunk_size": CHUNK_SIZE,
+            "chunk_overlap": CHUNK_OVERLAP, "embedding_model": EMBEDDING_MODEL},
+)
 
 # Define prompt for question-answering
 prompt = hub.pull("rlm/rag-prompt")
+CONTEXT_TOKENS = int(os.getenv("RAG_CONTEXT_TOKENS", "1500"))
     
 
 # Define state for application
@@ -53,14 +77,20 @@ class State(TypedDict):
     answer: str
     
 # Define application steps
+# Each step is a span when RAG_TRACE / RAG_METRICS_* are set (see tracing.py)
 def retrieve(state: State):
-    retrieved_docs = vector_store.similarity_search(state["question"])
+    with span("retrieve"):
+        retrieved_docs = vector_store.similarity_search(state["question"])
     return {"context": retrieved_docs}
 
 def generate(state: State):
-    docs_content = "\n\n".join(doc.page_content for doc in state["context"])
-    messages = prompt.invoke({"question": state["question"], "context": docs_content})
-    response = llm.invoke(messages)
+    # Deduplicated, citation-tagged and capped at CONTEXT_TOKENS
+    with span("pack"):
+        docs_content = pack_context(state["context"], state["question"], budget_tokens=CONTEXT_TOKENS).text
+    with span("render_prompt"):
+        messages = prompt.invoke({"question": state["question"], "context": docs_content})
+    with span("generate"):
+        response = llm.invoke(messages, config=langchain_config())
     return {"answer": response.content}
 
 # Compile application and test
@@ -69,6 +99,7 @@ graph_builder.add_edge(START, "retrieve")
 graph = graph_builder.compile()
 
 if __name__ == "__main__": 
-    response = graph.invoke({"question": "What is Task Decomposition?"})
+    with span("query"):
+        response = graph.invoke({"question": "What is Task Decomposition?"})
     print(response["answer"]) 
     
\ No newline at end of file
@@ -0,0 +1,352 @@
+"""
+Lightweight tracing and metrics for the RAG pipelines.
+
+Off unless configured, and then close to free: span() hands back one
+shared no-op object and incr() returns straight away.
+
+    RAG_TRACE=trace.jsonl        one JSON line per finished span
+    RAG_METRICS_FILE=rag.prom    Prometheus text file, rewritten every few seconds and at exit
+    RAG_METRICS_PORT=9464        Prometheus text served at http://127.0.0.1:9464/metrics
+
+Entry points call configure_from_env() once; importing this module never
+opens files or ports. The metrics exporters belong to the process that
+configured them: pool workers set up with configure_worker() only append
+their spans to the trace file.
+
+Spans nest through a context variable, so a span opened inside another
+(in the same thread or asyncio task) records it as its parent and shares
+its trace ID. Each span name also feeds a duration histogram, and incr()
+bumps counters such as documents embedded, tokens generated or cache hits.
+
+    from tracing import span, incr
+    with span("retrieve", k=5) as s:
+        docs = retriever.invoke(question)
+        s.set(documents=len(docs))
+    incr("llm_tokens", metrics.tokens)
+
+langchain_config() adds a callback handler that turns LangChain runs
+(prompt rendering, LLM calls, retrievers) into spans as well.
+"""
+import atexit
+import contextvars
+import json
+import os
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, float("inf"))
+PREFIX = "rag_"
+
+_enabled = False
+_current = contextvars.ContextVar("rag_current_span", default=None)
+
+
+class _NoopSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def set(self, **attrs):
+        pass
+
+
+_NOOP = _NoopSpan()
+
+
+def _new_id():
+    return uuid.uuid4().hex[:16]
+
+
+class Span:
+    __slots__ = ("name", "attrs", "trace_id", "span_id", "parent_id", "start", "_t0", "_token")
+
+    def __init__(self, name, attrs, parent=None):
+        self.name = name
+        self.attrs = attrs
+        parent = parent if parent is not None else _current.get()
+        self.trace_id = parent.trace_id if parent else _new_id()
+        self.parent_id = parent.span_id if parent else None
+        self.span_id = _new_id()
+        self.start = time.time()
+        self._t0 = time.perf_counter()
+        self._token = None
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+    def __enter__(self):
+        self.start = time.time()
+        self._t0 = time.perf_counter()
+        self._token = _current.set(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        _current.reset(self._token)
+        self.finish(error=f"{exc_type.__name__}: {exc}" if exc_type else None)
+        return False
+
+    def finish(self, error=None):
+        if error:
+            self.attrs["error"] = error
+        _registry.record_span(self, time.perf_counter() - self._t0)
+
+
+class _Registry:
+    """Counters, span histograms and the exporters"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counters = {}
+        self.histograms = {}
+        self.trace_path = None
+        self.metrics_path = None
+        self.metrics_interval = 5.0
+        self._trace_fd = None
+        self._trace_pid = None
+        self._metrics_written = 0.0
+        # The process that owns the metrics file (forked children inherit the settings)
+        self.owner_pid = None
+        self.metrics_server = None
+
+    def _trace_file(self):
+        # One O_APPEND descriptor per process: forked PDF workers write whole lines too
+        if self._trace_pid != os.getpid():
+            self._trace_fd = os.open(self.trace_path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+            self._trace_pid = os.getpid()
+        return self._trace_fd
+
+    def record_span(self, span, duration):
+        with self.lock:
+            counts = self.histograms.get(span.name)
+            if counts is None:
+                counts = self.histograms[span.name] = [0] * len(BUCKETS) + [0.0]
+            for i, bound in enumerate(BUCKETS):
+                if duration <= bound:
+                    counts[i] += 1
+            counts[-1] += duration
+        if self.trace_path:
+            record = {
+                "trace_id": span.trace_id,
+                "span_id": span.span_id,
+                "parent_id": span.parent_id,
+                "name": span.name,
+                "start": span.start,
+                "duration_ms": duration * 1000,
+                "pid": os.getpid(),
+            }
+            if span.attrs:
+                record["attrs"] = span.attrs
+            line = json.dumps(record, default=str) + "\n"
+            with self.lock:
+                os.write(self._trace_file(), line.encode("utf-8"))
+        if self.metrics_path and time.monotonic() - self._metrics_written > self.metrics_interval:
+            self.write_metrics()
+
+    def incr(self, name, value, labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def render(self):
+        """Prometheus text exposition of every counter and span histogram"""
+        lines = []
+        with self.lock:
+            counters = sorted(self.counters.items())
+            histograms = sorted((name, list(counts)) for name, counts in self.histograms.items())
+        typed = set()
+        for (name, labels), value in counters:
+            metric = f"{PREFIX}{name}_total"
+            if metric not in typed:
+                lines.append(f"# TYPE {metric} counter")
+                typed.add(metric)
+            label_text = ",".join(f'{key}="{value_}"' for key, value_ in labels)
+            lines.append(f"{metric}{{{label_text}}} {value}" if label_text else f"{metric} {value}")
+        if histograms:
+            metric = f"{PREFIX}span_duration_seconds"
+            lines.append(f"# TYPE {metric} histogram")
+            for name, counts in histograms:
+                for bound, count in zip(BUCKETS, counts):
+                    le = "+Inf" if bound == float("inf") else repr(bound)
+                    lines.append(f'{metric}_bucket{{span="{name}",le="{le}"}} {count}')
+                lines.append(f'{metric}_sum{{span="{name}"}} {counts[-1]}')
+                lines.append(f'{metric}_count{{span="{name}"}} {counts[len(BUCKETS) - 1]}')
+        return "\n".join(lines) + "\n"
+
+    def write_metrics(self):
+        # A child's registry only holds its own share of the metrics
+        if not self.metrics_path or os.getpid() != self.owner_pid:
+            return
+        self._metrics_written = time.monotonic()
+        tmp_path = f"{self.metrics_path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(self.render())
+        os.replace(tmp_path, self.metrics_path)
+
+
+_registry = _Registry()
+
+
+def enabled():
+    return _enabled
+
+
+def span(name, **attrs):
+    """Context manager timing a named stage; a shared no-op when tracing is off"""
+    if not _enabled:
+        return _NOOP
+    return Span(name, attrs)
+
+
+def incr(name, value=1, **labels):
+    """Add value to a counter (exported as rag_<name>_total)"""
+    if not _enabled or not value:
+        return
+    _registry.incr(name, value, labels)
+
+
+def render_metrics():
+    return _registry.render()
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        if self.path.split("?")[0] not in ("/metrics", "/"):
+            self.send_error(404)
+            return
+        body = render_metrics().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def serve_metrics(port, host="127.0.0.1"):
+    """Serve /metrics from a daemon thread; returns the server"""
+    server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def configure(trace_path=None, metrics_path=None, metrics_port=None):
+    """Turn tracing on for any of the given exporters (metrics are kept in memory regardless)"""
+    global _enabled
+    # Absolute, so a later chdir (batch_qa, index_generations) does not move them
+    _registry.trace_path = os.path.abspath(trace_path) if trace_path else None
+    _registry.metrics_path = os.path.abspath(metrics_path) if metrics_path else None
+    _registry.owner_pid = os.getpid()
+    if metrics_path:
+        # First write after one interval, not on the first span
+        _registry._metrics_written = time.monotonic()
+        atexit.register(_registry.write_metrics)
+    if metrics_port:
+        _registry.metrics_server = serve_metrics(int(metrics_port))
+    _enabled = bool(trace_path or metrics_path or metrics_port)
+    return _enabled
+
+
+def configure_from_env():
+    """Configure from RAG_TRACE / RAG_METRICS_FILE / RAG_METRICS_PORT; call once from the entry point"""
+    return configure(
+        trace_path=os.getenv("RAG_TRACE") or None,
+        metrics_path=os.getenv("RAG_METRICS_FILE") or None,
+        metrics_port=os.getenv("RAG_METRICS_PORT") or None,
+    )
+
+
+def worker_config():
+    """initargs for configure_worker: this process's trace file, or None when not tracing"""
+    return (_registry.trace_path if _enabled else None,)
+
+
+def configure_worker(trace_path):
+    """Process pool initializer: spans go to the parent's trace file, never to the metrics exporters"""
+    return configure(trace_path=trace_path)
+
+
+def langchain_config():
+    """RunnableConfig with the tracing callback handler, or {} when tracing is off"""
+    if not _enabled:
+        return {}
+    return {"callbacks": [LangChainTracer()]}
+
+
+try:
+    from langchain_core.callbacks import BaseCallbackHandler
+except ImportError:  # tracing itself does not need LangChain
+    BaseCallbackHandler = object
+
+
+class LangChainTracer(BaseCallbackHandler):
+    """Records LangChain chain, prompt, LLM and retriever runs as spans"""
+
+    def __init__(self):
+        self._spans = {}
+        # Runs started from inside a span() hang under it
+        self._root = _current.get()
+
+    def _start(self, run_id, parent_run_id, name, **attrs):
+        parent = self._spans.get(parent_run_id) if parent_run_id else self._root
+        self._spans[run_id] = Span(name, attrs, parent=parent)
+
+    def _end(self, run_id, error=None, **attrs):
+        span_ = self._spans.pop(run_id, None)
+        if span_ is not None:
+            span_.attrs.update(attrs)
+            span_.finish(error=error)
+
+    @staticmethod
+    def _name(serialized, kwargs, default):
+        if kwargs.get("name"):
+            return kwargs["name"]
+        if serialized:
+            return serialized.get("name") or (serialized.get("id") or [default])[-1]
+        return default
+
+    def on_chain_start(self, serialized, inputs, *, run_id, parent_run_id=None, **kwargs):
+        self._start(run_id, parent_run_id, self._name(serialized, kwargs, "chain"))
+
+    def on_chain_end(self, outputs, *, run_id, **kwargs):
+        self._end(run_id)
+
+    def on_chain_error(self, error, *, run_id, **kwargs):
+        self._end(run_id, error=f"{type(error).__name__}: {error}")
+
+    def on_llm_start(self, serialized, prompts, *, run_id, parent_run_id=None, **kwargs):
+        self._start(run_id, parent_run_id, self._name(serialized, kwargs, "llm"), tokens=0)
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, parent_run_id=None, **kwargs):
+        self._start(run_id, parent_run_id, self._name(serialized, kwargs, "chat_model"), tokens=0)
+
+    def on_llm_new_token(self, token, *, run_id, **kwargs):
+        span_ = self._spans.get(run_id)
+        if span_ is not None:
+            if not span_.attrs["tokens"]:
+                span_.attrs["first_token_ms"] = (time.perf_counter() - span_._t0) * 1000
+            span_.attrs["tokens"] += 1
+        incr("llm_tokens")
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        self._end(run_id)
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        self._end(run_id, error=f"{type(error).__name__}: {error}")
+
+    def on_retriever_start(self, serialized, query, *, run_id, parent_run_id=None, **kwargs):
+        self._start(run_id, parent_run_id, self._name(serialized, kwargs, "retriever"))
+
+    def on_retriever_end(self, documents, *, run_id, **kwargs):
+        self._end(run_id, documents=len(documents))
+
+    def on_retriever_error(self, error, *, run_id, **kwargs):
+        self._end(run_id, error=f"{type(error).__name__}: {error}")
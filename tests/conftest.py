@@ -0,0 +1,79 @@
+"""
+Shared fixtures for the RAG and Agent tests.
+
+The RAG and Agent helpers are flat modules imported from their own
+folders, so those folders go on sys.path here. Nothing talks to a real
+Ollama or OpenAI: embeddings come from fake_ollama.py on a free port,
+chat completions from mock_openai_server.py, and "PDFs" are text files
+whose paragraphs are the pages.
+
+    python -m pytest -q
+"""
+import os
+import sys
+
+import pytest
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RAG_DIR = os.path.join(REPO_DIR, "RAG")
+sys.path[:0] = [RAG_DIR, os.path.join(RAG_DIR, "local_travel_pdf_files"), os.path.join(REPO_DIR, "Agent")]
+
+EMBEDDING_DIM = 64
+
+
+@pytest.fixture(scope="session")
+def ollama_url():
+    """Base URL of a fake Ollama server shared by the whole run"""
+    import fake_ollama
+
+    server, base_url = fake_ollama.start_in_thread(port=0, dim=EMBEDDING_DIM)
+    yield base_url
+    server.shutdown()
+
+
+@pytest.fixture
+def batch_embedder(ollama_url):
+    from embedding_client import OllamaBatchEmbedder
+
+    # Small batches so a few pages make several of them
+    return OllamaBatchEmbedder("mxbai-embed-large", base_url=ollama_url, batch_size=4, max_concurrency=2,
+                               cache=None)
+
+
+@pytest.fixture
+def vector_store(tmp_path):
+    from fake_models import FakeEmbeddings
+    from numpy_vector_store import NumpyVectorStore
+
+    return NumpyVectorStore(str(tmp_path / "db"), FakeEmbeddings(dim=EMBEDDING_DIM))
+
+
+@pytest.fixture
+def text_pdfs(monkeypatch):
+    """Parse "PDFs" as text files, one page per paragraph"""
+    import pdf_parsing
+    from langchain_core.documents import Document
+
+    def load_pdf_pages(pdf_file):
+        filename = os.path.basename(pdf_file)
+        with open(pdf_file, encoding="utf-8") as f:
+            pages = [page.strip() for page in f.read().split("\n\n") if page.strip()]
+        return [(f"{filename}_page_{i + 1}",
+                 Document(page_content=text, metadata={"source": filename, "page": i + 1, "file_path": pdf_file}))
+                for i, text in enumerate(pages)]
+
+    monkeypatch.setattr(pdf_parsing, "load_pdf_pages", load_pdf_pages)
+
+
+@pytest.fixture
+def write_pdf(tmp_path):
+    """Write a text "PDF" with the given page texts into tmp_path/travel; returns its path"""
+    folder = tmp_path / "travel"
+    folder.mkdir()
+
+    def write(name, pages):
+        path = folder / name
+        path.write_text("\n\n".join(pages), encoding="utf-8")
+        return str(path)
+
+    return write
@@ -0,0 +1,134 @@
+"""Rate-limit buckets, retries and ordering of the bulk chat completions client (Agent/bulk_llm_client.py)"""
+import asyncio
+import time
+
+import pytest
+
+import bulk_llm_client
+import mock_openai_server
+from bulk_llm_client import BulkLLMClient, TokenBucket
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(bulk_llm_client.time, "monotonic", lambda: now[0])
+    return now
+
+
+@pytest.fixture
+def mock_server():
+    servers = []
+
+    def start(**kwargs):
+        server, base_url = mock_openai_server.start_in_thread(port=0, **kwargs)
+        servers.append(server)
+        return server, base_url
+
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+def run(base_url, queries, **kwargs):
+    async def go():
+        client = BulkLLMClient(model="mock", base_url=base_url, api_key="mock", backoff=0.01, **kwargs)
+        try:
+            return client, await client.run(queries)
+        finally:
+            await client.aclose()
+
+    return asyncio.run(go())
+
+
+def test_rate_limiting_cuts_the_rate_and_successes_restore_it(clock):
+    bucket = TokenBucket(600, increase_after=2)
+
+    bucket.slow_down()
+    assert bucket.rate == pytest.approx(8.0) and bucket.tokens == 0
+    for _ in range(20):
+        bucket.slow_down()
+    assert bucket.rate == pytest.approx(1.0)
+
+    # Every second success in a row adds back a twentieth of the configured rate
+    for _ in range(5):
+        bucket.record_success()
+    assert bucket.rate == pytest.approx(1.0 + 2 * 0.5)
+    for _ in range(100):
+        bucket.record_success()
+    assert bucket.rate == pytest.approx(10.0)
+
+
+def test_refill_follows_the_lowered_rate(clock):
+    bucket = TokenBucket(600)
+    bucket.slow_down(0.5)
+
+    clock[0] += 1
+    bucket._refill()
+
+    assert bucket.tokens == pytest.approx(5.0)
+    # Usage below the estimate is given back, never past the capacity
+    bucket.adjust(-3)
+    assert bucket.tokens == pytest.approx(8.0)
+    bucket.adjust(-30)
+    assert bucket.tokens == bucket.capacity == pytest.approx(10.0)
+
+
+def test_acquire_paces_requests_past_the_burst():
+    bucket = TokenBucket(6000)  # 100 per second, a burst of 100
+
+    async def take(n):
+        for _ in range(n):
+            await bucket.acquire(10)
+
+    started = time.perf_counter()
+    asyncio.run(take(15))
+    elapsed = time.perf_counter() - started
+
+    assert 0.4 < elapsed < 1.5
+    # One request larger than the bucket still goes through
+    asyncio.run(asyncio.wait_for(bucket.acquire(1000), timeout=2))
+
+
+def test_results_come_back_in_input_order(mock_server):
+    server, base_url = mock_server(latency=0.01)
+    queries = [f"question {i}" for i in range(20)]
+
+    client, report = run(base_url, queries, rpm=60000, max_concurrency=8)
+
+    assert [r.index for r in report.results] == list(range(20))
+    assert [r.text for r in report.results] == [f"Stub answer to: Search Google for: {q}" for q in queries]
+    assert report.succeeded == 20 and report.retries == 0
+    assert all(r.tokens > 0 and r.attempts == 1 for r in report.results)
+    assert server.completions == 20
+
+
+def test_server_rate_limits_are_retried_and_slow_the_client(mock_server):
+    server, base_url = mock_server(rpm=600)  # 10 per second, a burst of 10
+
+    client, report = run(base_url, [f"question {i}" for i in range(25)], rpm=60000, max_concurrency=16)
+
+    assert report.succeeded == 25
+    assert server.rate_limited > 0 and report.rate_limited == server.rate_limited
+    assert client.request_bucket.rate < client.request_bucket.max_rate
+
+
+def test_server_errors_are_retried_until_max_retries(mock_server):
+    _, base_url = mock_server(fail_rate=1.0)
+
+    client, report = run(base_url, ["a", "b"], max_retries=2)
+
+    # Failures are reported per query, not raised
+    assert [r.ok for r in report.results] == [False, False]
+    assert all(r.attempts == 3 and r.error.startswith("InternalServerError") for r in report.results)
+    assert report.retries == 4
+
+
+def test_other_client_errors_are_not_retried(mock_server):
+    _, base_url = mock_server()
+
+    client, report = run(base_url.replace("/v1", "/v2"), ["a"])
+
+    assert report.results[0].attempts == 1 and report.results[0].error.startswith("NotFoundError")
+    assert report.retries == 0
@@ -0,0 +1,100 @@
+"""Hits, LRU eviction and the byte counter of the embedding cache (embedding_cache.py)"""
+import sqlite3
+
+import pytest
+
+import embedding_cache
+from conftest import EMBEDDING_DIM
+from embedding_cache import CachedEmbeddings, EmbeddingCache, endpoint_model_name
+from fake_models import FakeEmbeddings
+
+VECTOR_BYTES = EMBEDDING_DIM * 4
+
+
+@pytest.fixture
+def cache(tmp_path):
+    cache = EmbeddingCache(str(tmp_path / "embeddings.sqlite3"))
+    yield cache
+    cache.close()
+
+
+def stored_bytes(cache):
+    return cache._conn.execute("SELECT COALESCE(SUM(LENGTH(vector)), 0) FROM embeddings").fetchone()[0]
+
+
+def test_repeated_and_respaced_texts_are_embedded_once(cache):
+    inner = FakeEmbeddings(dim=EMBEDDING_DIM)
+    embeddings = CachedEmbeddings(inner, cache=cache)
+
+    first = embeddings.embed_documents(["Flight to Rome", "Hotel  in\nRome", "Flight to Rome"])
+    again = embeddings.embed_documents(["Hotel in Rome", "Train to Paris"])
+
+    assert inner.texts_embedded == 3
+    assert again[0] == pytest.approx(first[1])
+    assert first[0] == pytest.approx(inner._vector("Flight to Rome"))
+    assert (cache.hits, cache.misses) == (1, 4)
+
+
+def test_queries_are_cached_apart_from_documents(cache):
+    inner = FakeEmbeddings(dim=EMBEDDING_DIM)
+    embeddings = CachedEmbeddings(inner, cache=cache)
+
+    embeddings.embed_documents(["pizza"])
+    embeddings.embed_query("pizza")
+    embeddings.embed_query("pizza")
+    embeddings.embed_queries(["pizza", "pasta", "pasta"])
+
+    assert inner.texts_embedded == 3
+    assert cache.stats()["entries"] == 3
+
+
+def test_models_and_endpoints_do_not_share_vectors(cache):
+    cache.put_many("mxbai-embed-large", ["pizza"], [[1.0] * EMBEDDING_DIM])
+
+    assert endpoint_model_name("mxbai-embed-large", "http://localhost:11434") == "mxbai-embed-large"
+    fake = endpoint_model_name("mxbai-embed-large", "http://127.0.0.1:11435")
+    assert fake == "mxbai-embed-large@127.0.0.1:11435"
+    assert cache.get_many(fake, ["pizza"]) == [None]
+    assert cache.get_many("nomic-embed-text", ["pizza"]) == [None]
+
+
+def test_least_recently_used_vectors_are_evicted_to_90_percent(tmp_path, monkeypatch):
+    clock = [1000.0]
+    monkeypatch.setattr(embedding_cache.time, "time", lambda: clock[0])
+    cache = EmbeddingCache(str(tmp_path / "embeddings.sqlite3"), max_bytes=10 * VECTOR_BYTES)
+    for i in range(10):
+        cache.put_many("m", [f"text {i}"], [[float(i)] * EMBEDDING_DIM])
+        clock[0] += 1
+    cache.get_many("m", ["text 0", "text 1"])
+    clock[0] += 1
+
+    cache.put_many("m", ["text 10"], [[10.0] * EMBEDDING_DIM])
+
+    # 11 vectors over a bound of 10: down to 9, oldest first, the two just read kept
+    survivors = [vector is not None for vector in cache.get_many("m", [f"text {i}" for i in range(11)])]
+    assert survivors == [True, True, False, False] + [True] * 7
+    assert cache.evictions == 2
+    assert cache.stats()["bytes"] == stored_bytes(cache) == 9 * VECTOR_BYTES
+
+
+def test_byte_counter_follows_inserts_replaces_and_deletes(cache):
+    cache.put_many("m", ["a", "b"], [[1.0] * EMBEDDING_DIM, [2.0] * EMBEDDING_DIM])
+    # Same key with a different dimension replaces the row
+    cache.put_many("m", ["a"], [[1.0] * (EMBEDDING_DIM // 2)])
+    cache._conn.execute("DELETE FROM embeddings WHERE text_hash = ?", (embedding_cache.text_key("b"),))
+
+    assert cache.stats()["bytes"] == stored_bytes(cache) == VECTOR_BYTES // 2
+
+
+def test_byte_counter_is_rebuilt_for_files_written_before_it(tmp_path):
+    path = str(tmp_path / "embeddings.sqlite3")
+    cache = EmbeddingCache(path)
+    cache.put_many("m", ["a", "b", "c"], [[1.0] * EMBEDDING_DIM] * 3)
+    cache.close()
+    with sqlite3.connect(path) as conn:
+        conn.execute("DROP TABLE cache_meta")
+
+    reopened = EmbeddingCache(path)
+
+    assert reopened.stats()["bytes"] == 3 * VECTOR_BYTES
+    reopened.close()
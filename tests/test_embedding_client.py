@@ -0,0 +1,126 @@
+"""Batching, retries, cancellation and the sync API of the Ollama batch embedder (embedding_client.py)"""
+import asyncio
+import random
+
+import pytest
+from langchain_core.documents import Document
+
+import fake_ollama
+from conftest import EMBEDDING_DIM
+from embedding_client import EmbeddingRequestError, OllamaBatchEmbedder, ThroughputMeter
+
+MODEL = "mxbai-embed-large"
+
+
+@pytest.fixture
+def flaky_url():
+    """A fake Ollama answering half of its requests with 503"""
+    server, base_url = fake_ollama.start_in_thread(port=0, dim=EMBEDDING_DIM, fail_rate=0.5)
+    yield base_url
+    server.shutdown()
+
+
+def expected(texts):
+    return [pytest.approx(fake_ollama.fake_vector(text, dim=EMBEDDING_DIM)) for text in texts]
+
+
+def test_batches_come_back_in_input_order(batch_embedder):
+    texts = [f"page {i}" for i in range(11)]
+
+    assert batch_embedder.embed_documents(texts) == expected(texts)
+    assert batch_embedder.embed_query("page 3") == expected(["page 3"])[0]
+
+
+def test_transient_failures_are_retried(flaky_url):
+    random.seed(3)
+    embedder = OllamaBatchEmbedder(MODEL, base_url=flaky_url, batch_size=2, max_retries=30, backoff=0.001)
+    texts = [f"page {i}" for i in range(20)]
+    meter = ThroughputMeter()
+
+    async def embed_all():
+        async with embedder.session() as session:
+            return [await embedder.aembed_batch(session, texts[i:i + 2], meter) for i in range(0, 20, 2)]
+
+    vectors = [vector for batch in asyncio.run(embed_all()) for vector in batch]
+
+    assert vectors == expected(texts)
+    assert meter.retries > 0 and meter.texts == 20
+
+
+def test_retries_give_up_and_name_the_failed_batch():
+    server, base_url = fake_ollama.start_in_thread(port=0, dim=EMBEDDING_DIM, fail_rate=1.0)
+    embedder = OllamaBatchEmbedder(MODEL, base_url=base_url, batch_size=4, max_retries=2, backoff=0.001)
+    try:
+        with pytest.raises(EmbeddingRequestError, match="batch at 0") as raised:
+            embedder.embed_documents(["a", "b", "c"])
+    finally:
+        server.shutdown()
+    assert raised.value.status == 503
+
+
+def test_failed_batch_cancels_the_batches_in_flight(batch_embedder, monkeypatch):
+    cancelled = []
+
+    async def aembed_batch(session, texts, meter):
+        if texts[0] == "page 4":
+            await asyncio.sleep(0.01)
+            raise EmbeddingRequestError("model unloaded", status=500)
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            cancelled.append(texts[0])
+            raise
+
+    monkeypatch.setattr(batch_embedder, "aembed_batch", aembed_batch)
+
+    with pytest.raises(EmbeddingRequestError, match="batch at 4"):
+        batch_embedder.embed_documents([f"page {i}" for i in range(12)])
+    # max_concurrency=2: the first batch was in flight, the third never started
+    assert cancelled == ["page 0"]
+
+
+def test_upsert_keeps_going_past_a_failed_batch(batch_embedder, vector_store, monkeypatch):
+    aembed_batch = batch_embedder.aembed_batch
+
+    async def failing_second_batch(session, texts, meter):
+        if texts[0] == "page 4":
+            raise EmbeddingRequestError("injected", status=503)
+        return await aembed_batch(session, texts, meter)
+
+    monkeypatch.setattr(batch_embedder, "aembed_batch", failing_second_batch)
+    documents = [Document(page_content=f"page {i}", metadata={"page": i}) for i in range(10)]
+    ids = [f"doc_{i}" for i in range(10)]
+
+    report = batch_embedder.upsert_documents(vector_store, documents, ids)
+
+    assert report.failed_ids == ids[4:8]
+    assert sorted(report.upserted_ids) == sorted(ids[:4] + ids[8:])
+    assert sorted(vector_store.get()["ids"]) == sorted(report.upserted_ids)
+    assert report.meter.failed_batches == 1
+
+
+def test_upsert_deduplicated_embeds_each_text_once(batch_embedder, vector_store):
+    documents = [Document(page_content=f"review {i % 3}", metadata={"row": i}) for i in range(9)]
+    ids = [str(i) for i in range(9)]
+
+    report = batch_embedder.upsert_deduplicated(vector_store, documents, ids)
+
+    assert report.duplicates == 6 and report.meter.texts == 3
+    assert sorted(report.upserted_ids, key=int) == ids
+    assert vector_store.get(ids=["4"])["documents"] == ["review 1"]
+
+
+def test_sync_api_works_inside_a_running_event_loop(batch_embedder, vector_store):
+    documents = [Document(page_content="Flight to Rome", metadata={})]
+
+    async def notebook_cell():
+        # What a Jupyter cell or an async caller of the sync Embeddings API does
+        vectors = batch_embedder.embed_documents(["Flight to Rome"])
+        report = batch_embedder.upsert_documents(vector_store, documents, ["rome"])
+        dedup = batch_embedder.upsert_deduplicated(vector_store, documents, ["rome"])
+        return vectors, report, dedup
+
+    vectors, report, dedup = asyncio.run(notebook_cell())
+
+    assert vectors == expected(["Flight to Rome"])
+    assert report.upserted_ids == ["rome"] and dedup.upserted_ids == ["rome"]
@@ -0,0 +1,158 @@
+"""Query filter parsing and route selection of the hybrid retriever"""
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from langchain_core.documents import Document
+
+from hybrid_retriever import (REVIEW_FILTER_KEYS, ROUTE_KEY, TRAVEL_FILTER_KEYS, HybridRetriever, exact_terms,
+                              parse_filters)
+from keyword_index import KeywordIndex
+
+TRAVEL = {
+    "t1": Document(page_content="Flight to Rome departs 2024-05-10, reservation ABC1234",
+                   metadata={"source": "trip.pdf", "page": 1}),
+    "t2": Document(page_content="Hotel in Rome, 5 star hotel with breakfast. Reservation desk open late",
+                   metadata={"source": "trip.pdf", "page": 2}),
+    "t3": Document(page_content="Train reservation to Florence", metadata={"source": "rail.pdf", "page": 1}),
+}
+REVIEWS = {
+    "r1": Document(page_content="Great pizza, crispy crust", metadata={"rating": 5, "date": "2024-03-01"}),
+    "r2": Document(page_content="Cold pizza and slow service", metadata={"rating": 1, "date": "2023-01-01"}),
+    "r3": Document(page_content="Decent pasta", metadata={"rating": 3, "date": "2024-07-15"}),
+}
+
+
+class ListVectorStore:
+    """Returns its documents in order and records what it was asked"""
+
+    def __init__(self, documents):
+        self.documents = [Document(id=doc_id, page_content=doc.page_content, metadata=doc.metadata)
+                          for doc_id, doc in documents.items()]
+        self.queries = []
+
+    def similarity_search(self, query, k=4, filter=None):
+        self.queries.append(query)
+        return self.documents[:k]
+
+
+def retriever_for(location, documents, filter_keys, vector_order=None):
+    keyword_index = KeywordIndex(str(location))
+    keyword_index.upsert(list(documents), list(documents.values()))
+    vector_documents = {doc_id: documents[doc_id] for doc_id in vector_order or documents}
+    return HybridRetriever(vector_store=ListVectorStore(vector_documents), keyword_index=keyword_index, k=3,
+                           filter_keys=filter_keys)
+
+
+def route(documents):
+    """The route every returned document reports"""
+    routes = {doc.metadata[ROUTE_KEY] for doc in documents}
+    assert len(routes) == 1
+    return routes.pop()
+
+
+@pytest.fixture
+def travel(tmp_path):
+    return retriever_for(tmp_path / "travel", TRAVEL, TRAVEL_FILTER_KEYS)
+
+
+@pytest.fixture
+def reviews(tmp_path):
+    return retriever_for(tmp_path / "reviews", REVIEWS, REVIEW_FILTER_KEYS)
+
+
+@pytest.mark.parametrize("query, keys, expected", [
+    ("1-star reviews", REVIEW_FILTER_KEYS, {"rating": 1}),
+    ("5 stars from 2024-03-01", REVIEW_FILTER_KEYS, {"rating": 5, "date": "2024-03-01"}),
+    ("pizza in 2024-03", REVIEW_FILTER_KEYS, {"date": {"$gte": "2024-03", "$lte": "2024-03\uffff"}}),
+    ("page 3 of itinerary.pdf", TRAVEL_FILTER_KEYS, {"page": 3, "source": "itinerary.pdf"}),
+    # A collection only gets the filters on its own fields
+    ("flight to Rome in 2024", TRAVEL_FILTER_KEYS, {}),
+    ("what is the 5 star hotel", TRAVEL_FILTER_KEYS, {}),
+    ("page 2 of the reviews", REVIEW_FILTER_KEYS, {}),
+    ("page 2, 4 stars, 2024", None, {"rating": 4, "date": {"$gte": "2024", "$lte": "2024\uffff"}, "page": 2}),
+])
+def test_parse_filters(query, keys, expected):
+    assert parse_filters(query, keys) == expected
+
+
+@pytest.mark.parametrize("query, filter_keys, expected", [
+    ("reservation ABC1234", None, ["abc1234"]),
+    ('the "late check-in" policy', None, ["late check-in"]),
+    ("Rome 2024-05-10", TRAVEL_FILTER_KEYS, ["2024-05-10", "2024"]),
+    # Text of a filter is not an exact term
+    ("reviews from 2024", REVIEW_FILTER_KEYS, []),
+    ("what is the 5 star hotel", None, []),
+])
+def test_exact_terms(query, filter_keys, expected):
+    assert exact_terms(query, filter_keys) == expected
+
+
+def test_identifier_found_by_keywords_skips_the_vector_search(travel):
+    documents = travel.invoke("reservation ABC1234")
+
+    assert route(documents) == "keyword"
+    assert documents[0].page_content == TRAVEL["t1"].page_content
+    assert travel.vector_store.queries == []
+
+
+def test_identifier_missing_from_the_hits_falls_back_to_hybrid(travel):
+    documents = travel.invoke("reservation ABC77")
+
+    assert route(documents) == "hybrid"
+    assert travel.vector_store.queries == ["reservation ABC77"]
+    assert documents
+
+
+def test_year_is_an_exact_term_when_the_collection_has_no_date_field(travel):
+    documents = travel.invoke("flight to Rome in 2024")
+
+    assert route(documents) == "keyword"
+    assert documents[0].page_content == TRAVEL["t1"].page_content
+
+
+def test_star_words_are_plain_text_for_the_travel_collection(travel):
+    assert route(travel.invoke("what is the 5 star hotel")) == "hybrid"
+
+
+def test_filter_only_query_returns_the_filtered_documents(travel, reviews):
+    documents = travel.invoke("page 2 of trip.pdf")
+    assert [doc.metadata["page"] for doc in documents] == [2]
+    assert route(documents) == "filter"
+
+    documents = reviews.invoke("1 star reviews")
+    assert [doc.page_content for doc in documents] == [REVIEWS["r2"].page_content]
+    assert route(documents) == "filter"
+
+
+def test_filter_only_results_are_ranked_by_vector_similarity(tmp_path):
+    retriever = retriever_for(tmp_path, REVIEWS, REVIEW_FILTER_KEYS, vector_order=["r3", "r2", "r1"])
+
+    documents = retriever.invoke("reviews from 2024")
+
+    assert [doc.id for doc in documents] == ["r3", "r1"]
+    assert retriever.vector_store.queries == ["reviews from 2024"]
+
+
+def test_filters_apply_to_both_searches(reviews):
+    documents = reviews.invoke("pizza from 2024")
+
+    assert route(documents) == "hybrid"
+    # The 2023 review is filtered out of the vector results too
+    assert [doc.page_content for doc in documents] == [REVIEWS["r1"].page_content, REVIEWS["r3"].page_content]
+
+
+def test_query_filters_need_the_field_in_the_collection(tmp_path):
+    # Allowed by filter_keys, but no document has a rating
+    retriever = retriever_for(tmp_path, TRAVEL, ("rating", "page"))
+
+    assert route(retriever.invoke("5 star hotel")) == "hybrid"
+    assert len(retriever.vector_store.queries) == 1
+
+
+def test_concurrent_callers_each_see_their_own_route(travel):
+    queries = {"reservation ABC1234": "keyword", "what is the 5 star hotel": "hybrid",
+               "page 2 of trip.pdf": "filter"}
+    with ThreadPoolExecutor(max_workers=6) as pool:
+        results = list(pool.map(lambda query: (query, travel.invoke(query)), list(queries) * 20))
+
+    assert all(route(documents) == queries[query] for query, documents in results)
@@ -0,0 +1,103 @@
+"""Incremental re-ingestion of the travel folder (vector_store_PDF.sync_documents)"""
+import glob
+import os
+
+import pytest
+
+from keyword_index import KeywordIndex
+from pdf_manifest import IngestManifest
+from vector_store_PDF import sync_documents
+
+MODEL = "mxbai-embed-large"
+
+
+@pytest.fixture
+def sync(vector_store, batch_embedder, text_pdfs, tmp_path):
+    """Run one sync of tmp_path/travel into the store; returns its stats"""
+    location = vector_store.persist_directory
+    keyword_index = KeywordIndex(location)
+
+    def run():
+        pdf_files = sorted(glob.glob(os.path.join(tmp_path, "travel", "*.pdf")))
+        manifest = IngestManifest.load(location, MODEL)
+        return sync_documents(vector_store, pdf_files, manifest, batch_embedder, keyword_index=keyword_index)
+
+    run.keyword_index = keyword_index
+    yield run
+    keyword_index.close()
+
+
+def stored(vector_store):
+    result = vector_store.get()
+    return dict(zip(result["ids"], result["documents"]))
+
+
+def test_first_sync_embeds_every_page(sync, write_pdf, vector_store):
+    write_pdf("rome.pdf", ["Flight to Rome", "Hotel near the Pantheon"])
+    write_pdf("paris.pdf", ["Train to Paris"])
+
+    stats = sync()
+
+    assert stats == {"upserted": 3, "deleted": 0, "skipped": 0, "failed_files": 0}
+    assert set(stored(vector_store)) == {"rome.pdf_page_1", "rome.pdf_page_2", "paris.pdf_page_1"}
+
+
+def test_resync_touches_only_changed_removed_and_new_files(sync, write_pdf, vector_store):
+    write_pdf("rome.pdf", ["Flight to Rome", "Hotel near the Pantheon"])
+    paris = write_pdf("paris.pdf", ["Train to Paris", "Louvre tickets"])
+    write_pdf("oslo.pdf", ["Ferry to Oslo"])
+    sync()
+
+    # rome.pdf: one page edited, one unchanged; paris.pdf: deleted; lisbon.pdf: new
+    write_pdf("rome.pdf", ["Flight to Rome", "Hotel near the Trevi Fountain, late check-in"])
+    os.remove(paris)
+    write_pdf("lisbon.pdf", ["Tram 28 in Lisbon"])
+    stats = sync()
+
+    assert stats == {"upserted": 2, "deleted": 2, "skipped": 1, "failed_files": 0}
+    documents = stored(vector_store)
+    assert set(documents) == {"rome.pdf_page_1", "rome.pdf_page_2", "oslo.pdf_page_1", "lisbon.pdf_page_1"}
+    assert documents["rome.pdf_page_2"] == "Hotel near the Trevi Fountain, late check-in"
+    # The keyword index follows the same upserts and deletes
+    assert not sync.keyword_index.search("Louvre", k=5)
+    assert [doc_id for doc_id, _ in sync.keyword_index.search("Trevi", k=5)] == ["rome.pdf_page_2"]
+
+
+def test_resync_without_changes_embeds_nothing(sync, write_pdf, vector_store):
+    write_pdf("rome.pdf", ["Flight to Rome", "Hotel near the Pantheon"])
+    sync()
+    version = vector_store.version()
+
+    stats = sync()
+
+    assert stats == {"upserted": 0, "deleted": 0, "skipped": 0, "failed_files": 0}
+    assert vector_store.version() == version
+
+
+def test_rewritten_file_with_same_content_is_unchanged(tmp_path, write_pdf):
+    pdf_file = write_pdf("rome.pdf", ["Flight to Rome"])
+    manifest = IngestManifest(str(tmp_path / "manifest.json"), MODEL)
+    changed, _, _ = manifest.diff([pdf_file])
+    (_, state), = changed
+    manifest.record_file("rome.pdf", state, {})
+
+    # New mtime, same bytes
+    write_pdf("rome.pdf", ["Flight to Rome"])
+    os.utime(pdf_file, ns=(state[2] + 10**9, state[2] + 10**9))
+    changed, unchanged, removed = manifest.diff([pdf_file])
+
+    assert (changed, unchanged, removed) == ([], [pdf_file], [])
+    assert manifest.files["rome.pdf"]["mtime_ns"] == state[2] + 10**9
+
+
+def test_manifest_for_another_model_treats_everything_as_new(tmp_path, write_pdf):
+    pdf_file = write_pdf("rome.pdf", ["Flight to Rome"])
+    manifest = IngestManifest(str(tmp_path / "ingest_manifest.json"), MODEL)
+    (_, state), = manifest.diff([pdf_file])[0]
+    manifest.record_file("rome.pdf", state, {})
+    manifest.save()
+
+    reloaded = IngestManifest.load(str(tmp_path), "nomic-embed-text")
+
+    assert reloaded.model_changed
+    assert reloaded.diff([pdf_file])[0] == [(pdf_file, state)]
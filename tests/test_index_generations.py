@@ -0,0 +1,123 @@
+"""Shadow rebuilds, atomic switch and rollback (index_generations.py)"""
+import os
+
+import pytest
+
+import index_generations as generations
+from index_generations import RebuildError
+
+SAMPLE_QUERIES = ("travel reservation",)
+
+
+class FakeStore:
+    """The bits of a vector store validate() looks at"""
+
+    def __init__(self, count, answers=True):
+        self._count = count
+        self.answers = answers
+        self._collection = self
+
+    def count(self):
+        return self._count
+
+    def similarity_search(self, query, k=4):
+        return ["doc"] * min(k, self._count) if self.answers else []
+
+
+def build_with(count, built=None, **kwargs):
+    def build(path):
+        if built is not None:
+            built.append(path)
+        return FakeStore(count, **kwargs), count
+    return build
+
+
+@pytest.fixture
+def base(tmp_path):
+    """A live database built before generations existed"""
+    path = tmp_path / "chroma_travel_db"
+    path.mkdir()
+    return str(path)
+
+
+def test_rebuild_switches_readers_and_keeps_the_legacy_directory(base):
+    path = generations.rebuild(base, build_with(10), SAMPLE_QUERIES)
+
+    assert generations.current_location(base) == path
+    assert generations.read_pointer(base)["previous"] == generations.LEGACY
+    assert not os.path.exists(os.path.join(path, generations.BUILDING))
+    assert os.path.isdir(base)
+
+
+def test_rollback_swaps_current_and_previous(base):
+    first = generations.rebuild(base, build_with(10), SAMPLE_QUERIES)
+    second = generations.rebuild(base, build_with(12), SAMPLE_QUERIES)
+    version = generations.pointer_version(base)
+
+    assert generations.rollback(base) == first
+    assert generations.read_pointer(base)["previous"] == os.path.basename(second)
+    assert generations.pointer_version(base) != version
+    # Rolling back again undoes the rollback
+    assert generations.rollback(base) == second
+
+
+def test_rollback_to_the_legacy_directory(base):
+    generations.rebuild(base, build_with(10), SAMPLE_QUERIES)
+
+    assert generations.rollback(base) == base
+
+
+def test_rollback_without_a_previous_generation_fails(base):
+    with pytest.raises(RebuildError):
+        generations.rollback(base)
+    assert generations.current_location(base) == base
+
+
+def test_rollback_fails_when_the_previous_generation_is_gone(base):
+    first = generations.rebuild(base, build_with(10), SAMPLE_QUERIES)
+    generations.rebuild(base, build_with(10), SAMPLE_QUERIES)
+    os.rename(first, first + ".gone")
+
+    with pytest.raises(RebuildError):
+        generations.rollback(base)
+
+
+def test_failed_validation_leaves_the_live_index_alone(base):
+    live = generations.rebuild(base, build_with(100), SAMPLE_QUERIES)
+    built = []
+
+    with pytest.raises(RebuildError, match="below 90%"):
+        generations.rebuild(base, build_with(50, built), SAMPLE_QUERIES, live_count=100)
+    with pytest.raises(RebuildError, match="returned nothing"):
+        generations.rebuild(base, build_with(100, built, answers=False), SAMPLE_QUERIES)
+
+    assert generations.current_location(base) == live
+    assert not any(os.path.exists(path) for path in built)
+
+
+def test_failed_build_is_kept_and_resumed(base):
+    def failing(path):
+        raise RuntimeError("embedding server went away")
+
+    with pytest.raises(RebuildError, match="--resume"):
+        generations.rebuild(base, failing, SAMPLE_QUERIES)
+    unfinished = generations.unfinished_generation(base)
+    assert unfinished is not None
+    assert generations.current_location(base) == base
+
+    built = []
+    path = generations.rebuild(base, build_with(10, built), SAMPLE_QUERIES, resume=True)
+
+    assert built == [unfinished] and path == unfinished
+    assert generations.unfinished_generation(base) is None
+    assert generations.current_location(base) == path
+
+
+def test_prune_keeps_the_current_and_previous_generations(base):
+    paths = [generations.rebuild(base, build_with(10), SAMPLE_QUERIES, keep=1) for _ in range(3)]
+    generations.rollback(base)
+
+    removed = generations.prune(base, keep=1)
+
+    assert removed == []
+    assert [os.path.exists(path) for path in paths] == [False, True, True]
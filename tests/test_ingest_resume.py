@@ -0,0 +1,115 @@
+"""Resuming an interrupted ingestion from its journal (IngestCheckpoint, ingest_pipeline.py)"""
+import json
+import os
+
+import pytest
+
+import ingest_pipeline
+from pdf_manifest import IngestCheckpoint, IngestManifest
+from vector_store_PDF import sync_documents
+
+MODEL = "mxbai-embed-large"
+STATE = ["0" * 64, 10, 1]
+
+
+class Crash(BaseException):
+    """Stands in for the process dying mid-run (not an Exception, so nothing handles it)"""
+
+
+def test_replay_applies_the_journal_up_to_a_torn_line(tmp_path):
+    location = str(tmp_path)
+    manifest = IngestManifest(os.path.join(location, "ingest_manifest.json"), MODEL)
+    manifest.record_file("old.pdf", STATE, {"old.pdf_page_1": "h0"})
+    checkpoint = IngestCheckpoint(location, MODEL)
+    checkpoint.record_batch("half.pdf", {"half.pdf_page_1": "h1"})
+    checkpoint.record_file("done.pdf", STATE, {"done.pdf_page_1": "h2"})
+    checkpoint.record_removed("old.pdf")
+    checkpoint.close()
+    with open(checkpoint.path, "a", encoding="utf-8") as f:
+        f.write('{"kind": "batch", "file": "half.pdf", "pag')
+
+    assert checkpoint.replay(manifest) == 3
+    assert manifest.page_hashes("done.pdf") == {"done.pdf_page_1": "h2"}
+    assert manifest.files["done.pdf"]["sha256"] == STATE[0]
+    assert "old.pdf" not in manifest.files
+    # Written pages are kept, but the file stays changed so the rest is embedded
+    assert manifest.page_hashes("half.pdf") == {"half.pdf_page_1": "h1"}
+    assert manifest.files["half.pdf"]["sha256"] is None
+
+
+def test_journal_of_another_model_is_ignored(tmp_path):
+    manifest = IngestManifest(str(tmp_path / "ingest_manifest.json"), MODEL)
+    checkpoint = IngestCheckpoint(str(tmp_path), "nomic-embed-text")
+    checkpoint.record_file("done.pdf", STATE, {"done.pdf_page_1": "h2"})
+    checkpoint.close()
+
+    assert IngestCheckpoint(str(tmp_path), MODEL).replay(manifest) == 0
+    assert manifest.files == {}
+
+
+def test_reset_keeps_pages_of_files_still_in_flight(tmp_path):
+    checkpoint = IngestCheckpoint(str(tmp_path), MODEL)
+    checkpoint.record_file("done.pdf", STATE, {"done.pdf_page_1": "h2"})
+    checkpoint.reset({"half.pdf": {"half.pdf_page_1": "h1"}})
+
+    with open(checkpoint.path, encoding="utf-8") as f:
+        entries = [json.loads(line) for line in f]
+    assert entries == [{"embedding_model": MODEL},
+                       {"kind": "batch", "file": "half.pdf", "pages": {"half.pdf_page_1": "h1"}}]
+
+
+def test_interrupted_sync_resumes_without_re_embedding(tmp_path, monkeypatch, vector_store, batch_embedder,
+                                                       text_pdfs, write_pdf):
+    location = vector_store.persist_directory
+    pages = [f"Day {i} of the Rome itinerary" for i in range(1, 11)]
+    pdf_files = [write_pdf("rome.pdf", pages)]
+    upsert = ingest_pipeline.IngestPipeline._upsert
+    calls = []
+
+    def crash_on_third_batch(self, batch, vectors):
+        calls.append(len(batch))
+        if len(calls) == 3:
+            raise Crash()
+        return upsert(self, batch, vectors)
+
+    monkeypatch.setattr(ingest_pipeline.IngestPipeline, "_upsert", crash_on_third_batch)
+    with pytest.raises(Crash):
+        sync_documents(vector_store, pdf_files, IngestManifest.load(location, MODEL), batch_embedder)
+    monkeypatch.setattr(ingest_pipeline.IngestPipeline, "_upsert", upsert)
+    written = vector_store._collection.count()
+    assert written == sum(calls[:2])
+
+    # What vector_store_PDF.ingest() does before syncing again
+    manifest = IngestManifest.load(location, MODEL)
+    checkpoint = IngestCheckpoint(location, MODEL)
+    assert checkpoint.replay(manifest) == 2
+    manifest.save()
+    checkpoint.reset()
+    stats = sync_documents(vector_store, pdf_files, manifest, batch_embedder, checkpoint=checkpoint)
+
+    assert stats == {"upserted": len(pages) - written, "deleted": 0, "skipped": written, "failed_files": 0}
+    assert vector_store._collection.count() == len(pages)
+    assert not checkpoint.exists
+    assert IngestManifest.load(location, MODEL).diff(pdf_files)[0] == []
+
+
+def test_failed_sync_closes_the_parse_generator(tmp_path, monkeypatch, vector_store, batch_embedder,
+                                                text_pdfs, write_pdf):
+    pdf_files = [write_pdf(f"city{i}.pdf", [f"Day {i} in the city"]) for i in range(4)]
+    iter_parsed_pdfs = ingest_pipeline.iter_parsed_pdfs
+    generators = []
+
+    def tracked(files, workers=None):
+        generators.append(iter_parsed_pdfs(files, workers=workers))
+        return generators[-1]
+
+    def crash(self, batch, vectors):
+        raise Crash()
+
+    monkeypatch.setattr(ingest_pipeline, "iter_parsed_pdfs", tracked)
+    monkeypatch.setattr(ingest_pipeline.IngestPipeline, "_upsert", crash)
+    with pytest.raises(Crash):
+        sync_documents(vector_store, pdf_files, IngestManifest.load(str(tmp_path), MODEL), batch_embedder)
+
+    # Closed, so its process pool was shut down with it
+    assert len(generators) == 1 and generators[0].gi_frame is None
@@ -0,0 +1,114 @@
+"""Keys, the deterministic-only rule and expiry of the LLM response cache (llm_cache.py)"""
+import pytest
+from langchain_core.outputs import Generation
+from langchain_core.prompts import ChatPromptTemplate
+from langchain_ollama.llms import OllamaLLM
+
+import llm_cache
+from llm_cache import LLMResponseCache, cached_stream, model_params, sampling_from_env, with_llm_cache
+
+ANSWER = "This is a fake answer from the fake Ollama server."
+
+
+@pytest.fixture
+def cache(tmp_path):
+    cache = LLMResponseCache(str(tmp_path / "llm.sqlite3"))
+    yield cache
+    cache.close()
+
+
+def llm(ollama_url, cache, **kwargs):
+    return with_llm_cache(OllamaLLM(model="llama3.2", base_url=ollama_url, **kwargs), cache=cache)
+
+
+def test_temperature_zero_answers_repeats_from_the_cache(ollama_url, cache):
+    model = llm(ollama_url, cache, temperature=0)
+
+    assert model.invoke("Where is the hotel?") == ANSWER
+    assert model.invoke("Where is the hotel?") == ANSWER
+
+    assert (cache.hits, cache.misses, cache.skipped) == (1, 1, 0)
+    assert cache.stats()["entries"] == 1
+
+
+@pytest.mark.parametrize("kwargs", [{"temperature": 0.7}, {}])
+def test_sampled_or_default_temperature_bypasses_the_cache(ollama_url, cache, kwargs):
+    model = llm(ollama_url, cache, **kwargs)
+
+    model.invoke("Where is the hotel?")
+    model.invoke("Where is the hotel?")
+
+    assert (cache.hits, cache.misses, cache.skipped) == (0, 0, 2)
+    assert cache.stats()["entries"] == 0
+
+
+def test_forced_cache_stores_sampled_answers(ollama_url, tmp_path):
+    forced = LLMResponseCache(str(tmp_path / "llm.sqlite3"), force=True)
+    model = llm(ollama_url, forced, temperature=0.7)
+
+    model.invoke("Where is the hotel?")
+    model.invoke("Where is the hotel?")
+
+    assert (forced.hits, forced.skipped) == (1, 0)
+
+
+def test_key_covers_prompt_model_and_sampling_parameters(ollama_url, cache):
+    base = model_params(OllamaLLM(model="llama3.2", temperature=0))
+    keys = {
+        cache.key("Where is the hotel?", "ollama", base),
+        cache.key("Where is the station?", "ollama", base),
+        cache.key("Where is the hotel?", "ollama", model_params(OllamaLLM(model="qwen2.5", temperature=0))),
+        cache.key("Where is the hotel?", "ollama", model_params(OllamaLLM(model="llama3.2", temperature=0,
+                                                                          num_ctx=8192))),
+        cache.key("Where is the hotel?", "ollama-chat", base),
+    }
+
+    assert len(keys) == 5
+    # Parameter order does not matter
+    assert cache.key("q", "ollama", {"a": 1, "b": 2}) == cache.key("q", "ollama", {"b": 2, "a": 1})
+    # Models differing in one sampling parameter do not share entries
+    llm(ollama_url, cache, temperature=0).invoke("Where is the hotel?")
+    llm(ollama_url, cache, temperature=0.0, seed=7).invoke("Where is the hotel?")
+    assert (cache.hits, cache.misses) == (0, 2)
+
+
+def test_expired_and_least_recently_used_entries_are_dropped(tmp_path, monkeypatch):
+    clock = [1000.0]
+    monkeypatch.setattr(llm_cache.time, "time", lambda: clock[0])
+    cache = LLMResponseCache(str(tmp_path / "llm.sqlite3"), max_entries=2, ttl_seconds=60)
+    for key in ("a", "b"):
+        cache.put(key, [Generation(text=key)])
+        clock[0] += 1
+    cache.get("a")
+    cache.put("c", [Generation(text="c")])
+
+    # "b" was the least recently used
+    assert cache.get("b") is None and cache.get("a")[0].text == "a"
+    clock[0] += 61
+    assert cache.get("c") is None and cache.evictions == 1
+
+
+def test_cached_stream_serves_a_hit_as_one_chunk(ollama_url, cache):
+    chain = ChatPromptTemplate.from_template("Answer: {question}") | llm(ollama_url, cache, temperature=0)
+
+    streamed = list(cached_stream(chain, {"question": "Where is the hotel?"}))
+    again = list(cached_stream(chain, {"question": "Where is the hotel?"}))
+
+    assert "".join(streamed) == ANSWER and len(streamed) > 1
+    assert again == [ANSWER]
+
+
+@pytest.mark.parametrize("env, temperature, expected", [
+    (None, None, {}),
+    ("0", None, {"temperature": 0.0}),
+    ("0.8", None, {"temperature": 0.8}),
+    ("0.8", 0.0, {"temperature": 0.0}),
+    ("", None, {}),
+])
+def test_temperature_is_only_set_when_asked_for(monkeypatch, env, temperature, expected):
+    if env is None:
+        monkeypatch.delenv("RAG_LLM_TEMPERATURE", raising=False)
+    else:
+        monkeypatch.setenv("RAG_LLM_TEMPERATURE", env)
+
+    assert sampling_from_env(temperature) == expected
@@ -0,0 +1,102 @@
+"""Warm-up, keep-alive and re-warming of the Ollama models (model_keeper.py)"""
+import time
+
+import pytest
+
+import fake_ollama
+from conftest import EMBEDDING_DIM
+from model_keeper import ModelKeeper, parse_keep_alive, start_model_keeper
+
+LOAD_SECONDS = 0.2
+MODELS = {"mxbai-embed-large": "embed", "llama3.2": "generate"}
+
+
+@pytest.fixture
+def server():
+    server, base_url = fake_ollama.start_in_thread(port=0, dim=EMBEDDING_DIM, load_seconds=LOAD_SECONDS,
+                                                   default_keep_alive="5m")
+    server.base_url = base_url
+    yield server
+    server.shutdown()
+
+
+@pytest.fixture
+def keeper(server):
+    keeper = ModelKeeper(MODELS, base_url=server.base_url, keep_alive="30m", rewarm_interval=0.05)
+    yield keeper
+    keeper.stop()
+
+
+@pytest.mark.parametrize("value, seconds", [("30m", 1800), ("1h", 3600), ("600", 600), ("45s", 45),
+                                            ("1.5m", 90), ("-1", -1), ("-5m", -1), (300, 300)])
+def test_keep_alive_durations(value, seconds):
+    assert parse_keep_alive(value) == seconds
+
+
+def test_invalid_keep_alive_is_rejected():
+    with pytest.raises(ValueError):
+        parse_keep_alive("forever")
+
+
+def test_warm_up_loads_each_model_once_for_the_keep_alive(server, keeper):
+    assert keeper.warm_all()
+
+    running = server.running()
+    assert set(running) == {"mxbai-embed-large:latest", "llama3.2:latest"} and server.loads == 2
+    # Loaded for the keeper's 30 minutes, not the server's default 5
+    for expires_at in running.values():
+        assert expires_at == pytest.approx(time.time() + 1800, abs=5)
+    assert keeper.loaded() == set(running)
+
+
+def test_stats_separate_the_cold_load_from_a_warm_request(keeper):
+    keeper.warm_all()
+
+    for stats in keeper.stats().values():
+        assert stats["cold_load_s"] >= LOAD_SECONDS
+        assert stats["server_load_s"] == pytest.approx(LOAD_SECONDS, abs=0.1)
+        assert stats["warm_s"] < LOAD_SECONDS
+    assert "cold load" in keeper.summary()
+
+
+def test_evicted_models_are_warmed_again(server, keeper):
+    keeper.warm_all()
+    server.evict("llama3.2")
+
+    assert keeper.check() == ["llama3.2"]
+    assert keeper.check() == []
+    assert server.loads == 3
+    assert keeper.stats()["llama3.2"]["rewarms"] == 1 and keeper.stats()["mxbai-embed-large"]["rewarms"] == 0
+
+
+def test_background_thread_keeps_the_models_loaded(server, keeper):
+    keeper.start()
+    assert keeper.wait(timeout=5)
+    server.evict()
+
+    def rewarmed():
+        return all(stats["rewarms"] >= 1 for stats in keeper.stats().values())
+
+    deadline = time.monotonic() + 5
+    while not rewarmed() and time.monotonic() < deadline:
+        time.sleep(0.05)
+
+    assert rewarmed()
+    assert len(server.running()) == 2
+
+
+def test_unreachable_server_is_reported_not_raised(server):
+    keeper = ModelKeeper(MODELS, base_url=server.base_url, timeout=5)
+    server.shutdown()
+    server.server_close()
+
+    assert keeper.warm_all() is False
+    assert all(stats["errors"] == 1 and stats["cold_load_s"] is None for stats in keeper.stats().values())
+    assert "not loaded" in keeper.summary()
+    keeper.stop()
+
+
+def test_warm_up_can_be_turned_off(monkeypatch):
+    monkeypatch.setenv("RAG_WARMUP", "0")
+
+    assert start_model_keeper() is None
@@ -0,0 +1,148 @@
+"""Exact search, quantization, compaction and concurrent use of the NumPy store"""
+import os
+import threading
+
+import numpy as np
+import pytest
+
+import numpy_vector_store
+from numpy_vector_store import NumpyVectorStore
+
+DIM = 32
+
+
+def vector(n):
+    """Fixed, well-separated unit vector of document n"""
+    v = np.random.default_rng(n).standard_normal(DIM).astype(np.float32)
+    return v / np.linalg.norm(v)
+
+
+def add(store, numbers):
+    ids = [str(n) for n in numbers]
+    store.upsert(ids, [vector(n) for n in numbers], documents=[f"doc {n}" for n in numbers],
+                 metadatas=[{"n": n, "even": n % 2 == 0} for n in numbers])
+
+
+@pytest.mark.parametrize("quantization", ["float32", "int8", "float16"])
+def test_nearest_document_is_found_in_every_mode(tmp_path, quantization):
+    store = NumpyVectorStore(str(tmp_path), quantization=quantization)
+    add(store, range(200))
+
+    for n in (0, 57, 199):
+        query = vector(n) + 0.05 * vector(n + 1000)
+        docs_and_scores = store.similarity_search_with_score_by_vector(query, k=3)
+        assert docs_and_scores[0][0].id == str(n)
+        # Quantized candidates are rescored with their float32 rows
+        expected = 1.0 - float(vector(n) @ (query / np.linalg.norm(query)))
+        assert docs_and_scores[0][1] == pytest.approx(expected, abs=1e-5)
+
+
+def test_filter_and_k(tmp_path):
+    store = NumpyVectorStore(str(tmp_path))
+    add(store, range(50))
+
+    docs = store.similarity_search_by_vector(vector(3), k=5, filter={"even": True})
+
+    assert len(docs) == 5
+    assert all(doc.metadata["even"] for doc in docs)
+    assert store.search_vectors([vector(4)], k=1) == [[("4", pytest.approx(1.0, abs=1e-5))]]
+
+
+def test_upsert_replaces_and_delete_removes(tmp_path):
+    store = NumpyVectorStore(str(tmp_path))
+    add(store, range(10))
+    store.upsert(["3"], [vector(100)], documents=["moved"], metadatas=[{"n": 3}])
+    store.delete(ids=["5", "missing"])
+
+    assert store.count() == 9
+    assert store.get(ids=["3"])["documents"] == ["moved"]
+    assert store.similarity_search_by_vector(vector(100), k=1)[0].id == "3"
+    assert "5" not in [doc.id for doc in store.similarity_search_by_vector(vector(5), k=9)]
+
+
+def test_reopen_replays_the_log_and_skips_a_torn_line(tmp_path):
+    store = NumpyVectorStore(str(tmp_path))
+    add(store, range(10))
+    store.delete(ids=["2"])
+    with open(tmp_path / "records.1.jsonl", "a", encoding="utf-8") as f:
+        f.write('{"op": "put", "start": 10, "ids": ["lost"')
+
+    reopened = NumpyVectorStore(str(tmp_path))
+    add(reopened, [10])
+
+    assert reopened.count() == 10
+    assert NumpyVectorStore(str(tmp_path)).similarity_search_by_vector(vector(10), k=1)[0].id == "10"
+    assert sorted(NumpyVectorStore(str(tmp_path)).get()["ids"], key=int) == [str(n) for n in range(11) if n != 2]
+
+
+def test_dead_rows_are_compacted_into_a_new_generation(tmp_path, monkeypatch):
+    monkeypatch.setattr(numpy_vector_store, "MIN_DEAD_ROWS", 8)
+    store = NumpyVectorStore(str(tmp_path), quantization="int8")
+    add(store, range(10))
+    for _ in range(3):
+        # Rewriting every document leaves a dead row per document
+        add(store, range(10))
+
+    assert store._generation > 1
+    assert len(store._ids) - store.count() <= max(8, store.count())
+    files = sorted(os.listdir(tmp_path))
+    assert not [name for name in files if name.endswith(".jsonl") and name != f"records.{store._generation}.jsonl"]
+    reopened = NumpyVectorStore(str(tmp_path), quantization="int8")
+    assert reopened.count() == 10
+    assert reopened.similarity_search_by_vector(vector(7), k=1)[0].id == "7"
+
+
+def test_changing_quantization_requantizes_on_open(tmp_path):
+    add(NumpyVectorStore(str(tmp_path)), range(20))
+
+    store = NumpyVectorStore(str(tmp_path), quantization="float16")
+
+    assert store._stored_quantization == "float16"
+    assert store.similarity_search_by_vector(vector(11), k=1)[0].id == "11"
+
+
+@pytest.mark.parametrize("quantization", ["float32", "int8"])
+def test_search_during_concurrent_upserts_deletes_and_compactions(tmp_path, monkeypatch, quantization):
+    monkeypatch.setattr(numpy_vector_store, "MIN_DEAD_ROWS", 4)
+    store = NumpyVectorStore(str(tmp_path), quantization=quantization, block_rows=16)
+    add(store, range(64))
+    stop = threading.Event()
+    errors = []
+
+    def writer(offset):
+        rng = np.random.default_rng(offset)
+        try:
+            while not stop.is_set():
+                numbers = [int(n) for n in rng.integers(0, 64, 8)]
+                add(store, numbers)
+                store.delete(ids=[str(n) for n in rng.integers(0, 64, 4)])
+        except Exception as e:
+            errors.append(e)
+
+    def searcher(offset):
+        rng = np.random.default_rng(100 + offset)
+        try:
+            for _ in range(200):
+                query = vector(int(rng.integers(0, 64)))
+                for doc, distance in store.similarity_search_with_score_by_vector(query, k=5):
+                    # Text, metadata and score all belong to the document's own ID
+                    n = int(doc.id)
+                    assert doc.page_content == f"doc {n}" and doc.metadata["n"] == n
+                    assert distance == pytest.approx(1.0 - float(vector(n) @ query), abs=1e-4)
+                for hits in store.batch_similarity_search_by_vector([query, -query], k=3):
+                    assert all(doc.page_content == f"doc {doc.id}" for doc in hits)
+        except Exception as e:
+            errors.append(e)
+
+    writers = [threading.Thread(target=writer, args=(i,)) for i in range(2)]
+    searchers = [threading.Thread(target=searcher, args=(i,)) for i in range(3)]
+    for thread in writers + searchers:
+        thread.start()
+    for thread in searchers:
+        thread.join()
+    stop.set()
+    for thread in writers:
+        thread.join()
+
+    assert errors == []
+    assert store._generation > 2
@@ -0,0 +1,123 @@
+"""Exact and semantic hits, TTL/LRU and invalidation of the retrieval cache (retrieval_cache.py)"""
+from typing import Any, List
+
+import numpy as np
+import pytest
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+
+import retrieval_cache
+from conftest import EMBEDDING_DIM
+from fake_models import FakeEmbeddings
+from retrieval_cache import CachedRetriever, RetrievalCache, chroma_version, normalize_query
+
+
+class CountingRetriever(BaseRetriever):
+    """Answers every query with one document naming it, counting the searches"""
+
+    calls: List[str] = []
+    embeddings: Any = None
+
+    def _get_relevant_documents(self, query, *, run_manager):
+        self.calls.append(query)
+        if self.embeddings is not None:
+            self.embeddings.embed_query(query)
+        return [Document(page_content=f"results for {query}")]
+
+
+def cached(cache, embeddings=None):
+    return CachedRetriever(retriever=CountingRetriever(calls=[], embeddings=embeddings), cache=cache,
+                           embeddings=embeddings)
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(retrieval_cache.time, "time", lambda: now[0])
+    return now
+
+
+@pytest.mark.parametrize("query", ["Great pizza?", "  great   PIZZA ", "great pizza!!"])
+def test_normalized_repeats_are_exact_hits(query):
+    retriever = cached(RetrievalCache())
+
+    retriever.invoke("great pizza")
+    documents = retriever.invoke(query)
+
+    assert normalize_query(query) == "great pizza"
+    assert documents == [Document(page_content="results for great pizza")]
+    assert retriever.retriever.calls == ["great pizza"]
+    assert retriever.cache.stats()["hits"] == 1
+
+
+def test_entries_expire_after_the_ttl(clock):
+    retriever = cached(RetrievalCache(ttl_seconds=60))
+    retriever.invoke("great pizza")
+
+    clock[0] += 59
+    retriever.invoke("great pizza")
+    clock[0] += 2
+    retriever.invoke("great pizza")
+
+    assert retriever.retriever.calls == ["great pizza"] * 2
+
+
+def test_least_recently_used_entry_is_dropped():
+    retriever = cached(RetrievalCache(max_entries=2))
+    for query in ("pizza", "pasta", "pizza", "salad", "pizza", "pasta"):
+        retriever.invoke(query)
+
+    # "pasta" was the least recently used when "salad" came in
+    assert retriever.retriever.calls == ["pizza", "pasta", "salad", "pasta"]
+
+
+def test_near_duplicate_query_is_a_semantic_hit():
+    embeddings = FakeEmbeddings(dim=EMBEDDING_DIM)
+    first, near, other = "best pizza in town", "the best pizza in town", "slow service at dinner"
+    similarity = np.dot(embeddings._vector(first), embeddings._vector(near))
+    assert similarity > np.dot(embeddings._vector(first), embeddings._vector(other)) + 0.2
+    retriever = cached(RetrievalCache(semantic_threshold=similarity - 0.05), embeddings)
+
+    retriever.invoke(first)
+    assert retriever.invoke(near) == [Document(page_content=f"results for {first}")]
+    retriever.invoke(other)
+
+    assert retriever.retriever.calls == [first, other]
+    stats = retriever.cache.stats()
+    assert (stats["hits"], stats["semantic_hits"], stats["misses"], stats["entries"]) == (0, 1, 2, 2)
+
+
+def test_without_a_threshold_near_duplicates_miss():
+    embeddings = FakeEmbeddings(dim=EMBEDDING_DIM)
+    retriever = cached(RetrievalCache(), embeddings)
+
+    retriever.invoke("best pizza in town")
+    retriever.invoke("the best pizza in town")
+
+    assert len(retriever.retriever.calls) == 2
+    # Exact-only caching never embeds the query itself
+    assert embeddings.calls == 2
+
+
+def test_a_collection_write_drops_the_cache(vector_store):
+    retriever = cached(RetrievalCache(version_fn=vector_store.version))
+    vector_store.add_texts(["Flight to Rome"], ids=["rome"])
+    retriever.invoke("flight")
+    retriever.invoke("flight")
+
+    vector_store.add_texts(["Train to Paris"], ids=["paris"])
+    retriever.invoke("flight")
+
+    assert retriever.retriever.calls == ["flight", "flight"]
+    assert retriever.cache.invalidations == 1
+
+
+def test_chroma_version_follows_the_database_file(tmp_path):
+    version = chroma_version(str(tmp_path))
+    assert version() is None
+
+    (tmp_path / "chroma.sqlite3").write_bytes(b"x")
+    written = version()
+    (tmp_path / "chroma.sqlite3-wal").write_bytes(b"wal")
+
+    assert written is not None and version() != written
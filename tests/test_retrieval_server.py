@@ -0,0 +1,92 @@
+"""Query micro-batching and collections opened by the retrieval server (retrieval_server.py)"""
+import asyncio
+import os
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import embedding_cache
+from conftest import EMBEDDING_DIM
+from fake_models import FakeEmbeddings
+from retrieval_server import MicroBatchEmbeddings, RetrievalService
+
+
+class FailingEmbeddings(FakeEmbeddings):
+    def embed_documents(self, texts):
+        raise ConnectionError("embedding model went away")
+
+
+def test_concurrent_queries_share_one_embedding_call():
+    inner = FakeEmbeddings(dim=EMBEDDING_DIM, seconds_per_call=0.05)
+    batcher = MicroBatchEmbeddings(inner, max_batch=8, max_wait=0.2)
+    queries = [f"query {i % 4}" for i in range(8)]
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        vectors = list(pool.map(batcher.embed_query, queries))
+
+    assert vectors == [inner._vector(query) for query in queries]
+    # A full batch goes out at once, with its four distinct texts embedded once each
+    assert batcher.stats() == {"queries": 8, "batches": 1, "largest_batch": 8, "mean_batch": 8.0}
+    assert (inner.calls, inner.texts_embedded) == (1, 4)
+
+
+def test_batches_are_capped_at_max_batch():
+    batcher = MicroBatchEmbeddings(FakeEmbeddings(dim=EMBEDDING_DIM), max_batch=3, max_wait=0.2)
+    release = threading.Barrier(7)
+
+    def query(i):
+        release.wait()
+        return batcher.embed_query(f"query {i}")
+
+    with ThreadPoolExecutor(max_workers=7) as pool:
+        list(pool.map(query, range(7)))
+
+    assert batcher.largest_batch == 3 and batcher.batches >= 3
+
+
+def test_a_lone_query_waits_at_most_max_wait():
+    batcher = MicroBatchEmbeddings(FakeEmbeddings(dim=EMBEDDING_DIM), max_batch=32, max_wait=0.001)
+
+    async def ask():
+        return await asyncio.wait_for(batcher.aembed_query("pizza"), timeout=1)
+
+    assert len(asyncio.run(ask())) == EMBEDDING_DIM
+    assert batcher.stats()["batches"] == 1
+
+
+def test_a_failed_batch_fails_every_query_in_it():
+    batcher = MicroBatchEmbeddings(FailingEmbeddings(dim=EMBEDDING_DIM), max_batch=4, max_wait=0.1)
+
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        futures = [pool.submit(batcher.embed_query, f"query {i}") for i in range(4)]
+    for future in futures:
+        with pytest.raises(ConnectionError):
+            future.result()
+    # The batcher keeps serving afterwards
+    batcher.embeddings = FakeEmbeddings(dim=EMBEDDING_DIM)
+    assert len(batcher.embed_query("pizza")) == EMBEDDING_DIM
+
+
+def test_service_opens_collections_from_absolute_paths(tmp_path, monkeypatch, ollama_url):
+    monkeypatch.setenv("OLLAMA_BASE_URL", ollama_url)
+    monkeypatch.setattr(embedding_cache, "_shared_cache", False)
+    monkeypatch.chdir(tmp_path)
+    db_location = str(tmp_path / "reviews_db")
+    queries = FakeEmbeddings(dim=EMBEDDING_DIM)
+
+    service = RetrievalService(("reviews",), embeddings=queries, db_locations={"reviews": db_location})
+    documents = service.retrieve("restaurant_reviews", "great pizza", k=3)
+
+    # Built from the repo's CSV into the given directory, from another working directory
+    module = sys.modules["vector_store"]
+    assert os.getcwd() == str(tmp_path)
+    assert module.db_location in ("./chroma_langchain_db", "./numpy_langchain_db")
+    assert module._vector_store is None
+    assert os.path.isdir(db_location) and service.health()["collections"]["reviews"] == 50
+    assert len(documents) == 3
+    # The store was built with the batcher, not patched afterwards
+    collection = service.collections["reviews"]
+    assert collection.vector_store().embeddings is service.batchers[module.embedding_model]
+    assert service.batchers[module.embedding_model].embeddings is queries and queries.calls == 1
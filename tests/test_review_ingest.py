@@ -0,0 +1,88 @@
+"""Chunked reading and deduplicated ingestion of the restaurant reviews (local_restaurant_reviews/vector_store.py)"""
+import importlib
+import sys
+
+import pytest
+
+import embedding_cache
+import fake_ollama
+import index_generations
+from conftest import EMBEDDING_DIM
+from keyword_index import KeywordIndex
+
+HEADER = "title,date_of_review,rating,text_of_review\n"
+
+
+@pytest.fixture
+def reviews():
+    module_name, module_dir, _ = index_generations.PIPELINES["reviews"]
+    if module_dir not in sys.path:
+        sys.path.insert(0, module_dir)
+    return importlib.import_module(module_name)
+
+
+@pytest.fixture
+def write_csv(tmp_path):
+    def write(text):
+        path = tmp_path / "reviews.csv"
+        path.write_text(text, encoding="utf-8")
+        return str(path)
+
+    return write
+
+
+def test_chunks_carry_typed_metadata_and_positional_ids(reviews, write_csv, monkeypatch):
+    monkeypatch.delenv("RAG_REVIEW_ID_COLUMN", raising=False)
+    csv_path = write_csv(HEADER + (
+        "Great pizza,2025-06-27,5,Crispy crust.\n"
+        "Slow,2024-09-30,2.4,\"Waited an hour, cold food.\"\n"
+        "Fine,2024-01-02,3,Okay.\n"
+        ",not a date,n/a,No title here.\n"
+        "Again,2024-01-03,4,Would return.\n"
+    ))
+
+    chunks = list(reviews.iter_document_chunks(chunksize=2, csv_path=csv_path))
+
+    assert [ids for _, ids in chunks] == [["0", "1"], ["2", "3"], ["4"]]
+    documents = [doc for chunk, _ in chunks for doc in chunk]
+    assert documents[0].page_content == "Great pizza Crispy crust."
+    assert documents[1].page_content == "Slow Waited an hour, cold food."
+    assert documents[3].page_content == " No title here."
+    assert documents[0].metadata == {"rating": 5, "date": "2025-06-27"}
+    assert type(documents[1].metadata["rating"]) is int and documents[1].metadata["rating"] == 2
+    # Values pandas could not parse are left out
+    assert documents[3].metadata == {}
+
+
+def test_ids_come_from_the_review_id_column(reviews, write_csv, monkeypatch):
+    monkeypatch.delenv("RAG_REVIEW_ID_COLUMN", raising=False)
+    csv_path = write_csv("review_id,title,date_of_review,rating,text_of_review\n"
+                         "r-17,Great pizza,2025-06-27,5,Crispy crust.\n"
+                         "42,Slow,2024-09-30,2,Cold food.\n")
+
+    (_, ids), = reviews.iter_document_chunks(csv_path=csv_path)
+
+    assert ids == ["r-17", "42"]
+
+
+def test_ingest_embeds_each_distinct_text_once(reviews, write_csv, vector_store, tmp_path, monkeypatch):
+    server, base_url = fake_ollama.start_in_thread(port=0, dim=EMBEDDING_DIM)
+    monkeypatch.setenv("OLLAMA_BASE_URL", base_url)
+    monkeypatch.setenv("RAG_CSV_CHUNK_ROWS", "4")
+    monkeypatch.delenv("RAG_REVIEW_ID_COLUMN", raising=False)
+    monkeypatch.setattr(embedding_cache, "_shared_cache", False)
+    rows = ["Great pizza,2025-06-27,5,Crispy crust.", "Slow,2024-09-30,2,Cold food."] * 4 + ["Fine,2024-01-02,3,Okay."]
+    keyword_index = KeywordIndex(str(tmp_path / "keywords"))
+
+    try:
+        report = reviews.ingest(vector_store, keyword_index=keyword_index, csv_path=write_csv(HEADER + "\n".join(rows)))
+    finally:
+        server.shutdown()
+
+    # Chunks of 4, 4 and 1 rows hold 2, 2 and 1 distinct texts
+    assert report.duplicates == 4 and server.texts == 5
+    assert not report.failed_ids and len(report.upserted_ids) == 9
+    assert vector_store.count() == len(keyword_index) == 9
+    stored = vector_store.get(ids=["0", "2"], include=["documents", "metadatas"])
+    assert stored["documents"] == ["Great pizza Crispy crust."] * 2
+    assert keyword_index.search("okay", k=1)[0][0] == "8"
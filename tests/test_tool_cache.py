@@ -0,0 +1,110 @@
+"""TTL caching of agent tool calls (Agent/tool_cache.py)"""
+import asyncio
+
+import pytest
+from langchain_core.tools import Tool
+
+import tool_cache
+from tool_cache import TTLCache, cached_tool, normalize_input
+
+
+def counting_tool(name="Search"):
+    calls = []
+
+    def search(query):
+        calls.append(query)
+        if "fail" in query:
+            raise RuntimeError("quota exceeded")
+        return f"results for {query}"
+
+    async def asearch(query):
+        return search(query)
+
+    tool = Tool(name=name, func=search, coroutine=asearch, description="A search engine.")
+    return tool, calls
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(tool_cache.time, "monotonic", lambda: now[0])
+    return now
+
+
+def test_normalized_repeats_are_served_from_the_cache():
+    tool, calls = counting_tool()
+    cache = TTLCache()
+    search = cached_tool(tool, cache)
+
+    answers = [search.run(query) for query in ("Chief Minister of Bihar?", "  chief   minister of BIHAR ")]
+
+    assert answers == ["results for Chief Minister of Bihar?"] * 2
+    assert calls == ["Chief Minister of Bihar?"]
+    assert cache.stats() == {"hits": 1, "misses": 1, "hit_rate": 0.5, "entries": 1}
+    assert (search.name, search.description) == (tool.name, tool.description)
+
+
+def test_entries_expire_after_the_ttl(clock):
+    tool, calls = counting_tool()
+    search = cached_tool(tool, TTLCache(ttl_seconds=60))
+
+    search.run("weather in Patna")
+    clock[0] += 60
+    search.run("weather in Patna")
+    clock[0] += 1
+    search.run("weather in Patna")
+
+    assert len(calls) == 2
+
+
+def test_least_recently_used_entry_is_dropped():
+    tool, calls = counting_tool()
+    search = cached_tool(tool, TTLCache(max_entries=2))
+
+    for query in ("a", "b", "a", "c", "a", "b"):
+        search.run(query)
+
+    assert calls == ["a", "b", "c", "b"]
+
+
+def test_tools_sharing_a_cache_do_not_share_answers():
+    cache = TTLCache()
+    (search, search_calls), (news, news_calls) = counting_tool("Search"), counting_tool("News")
+
+    cached_tool(search, cache).run("bihar")
+    cached_tool(news, cache).run("bihar")
+
+    assert (search_calls, news_calls) == (["bihar"], ["bihar"])
+
+
+def test_errors_are_not_cached():
+    tool, calls = counting_tool()
+    search = cached_tool(tool, TTLCache())
+
+    for _ in range(2):
+        with pytest.raises(RuntimeError):
+            search.run("fail please")
+
+    assert len(calls) == 2 and search.run("fine") == "results for fine"
+
+
+def test_async_calls_share_the_cache():
+    tool, calls = counting_tool()
+    cache = TTLCache()
+    search = cached_tool(tool, cache)
+
+    async def ask_twice():
+        return [await search.arun("bihar"), await search.arun("Bihar.")]
+
+    assert asyncio.run(ask_twice()) == ["results for bihar"] * 2
+    assert search.run("BIHAR") == "results for bihar"
+    assert calls == ["bihar"] and cache.hits == 2
+
+
+@pytest.mark.parametrize("tool_input, expected", [
+    ("Who is the CM of Bihar?", "who is the cm of bihar"),
+    ("  spaced\tout  query...  ", "spaced out query"),
+    ({"query": "Bihar"}, "{'query': 'bihar'}"),
+])
+def test_normalize_input(tool_input, expected):
+    assert normalize_input(tool_input) == expected
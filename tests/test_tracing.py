@@ -0,0 +1,66 @@
+"""Tracing setup in entry points and process pool workers (tracing.py)"""
+import json
+import os
+import socket
+from concurrent.futures import ProcessPoolExecutor
+
+import pytest
+
+import tracing
+from pdf_parsing import _pool_context
+
+
+def traced_work(i):
+    """Runs in a pool worker"""
+    with tracing.span("work", i=i):
+        pass
+    return os.getpid()
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+@pytest.fixture
+def configured(tmp_path, monkeypatch):
+    """tracing configured from the environment with every exporter on; restored afterwards"""
+    monkeypatch.setenv("RAG_TRACE", str(tmp_path / "trace.jsonl"))
+    monkeypatch.setenv("RAG_METRICS_FILE", str(tmp_path / "rag.prom"))
+    monkeypatch.setenv("RAG_METRICS_PORT", str(free_port()))
+    saved = dict(vars(tracing._registry))
+    tracing.configure_from_env()
+    yield tmp_path
+    if tracing._registry.metrics_server is not None:
+        tracing._registry.metrics_server.shutdown()
+        tracing._registry.metrics_server.server_close()
+    vars(tracing._registry).update(saved)
+    tracing._registry.histograms.clear()
+    tracing._registry.counters.clear()
+    tracing._enabled = False
+
+
+def test_importing_tracing_configures_nothing():
+    # conftest imports the RAG modules with none of RAG_TRACE / RAG_METRICS_* acted on
+    assert not tracing.enabled()
+    assert tracing.span("x") is tracing._NOOP
+
+
+def test_pool_workers_trace_to_the_parent_file_only(configured):
+    with tracing.span("parent"):
+        with ProcessPoolExecutor(max_workers=2, mp_context=_pool_context(),
+                                 initializer=tracing.configure_worker, initargs=tracing.worker_config()) as pool:
+            worker_pids = set(pool.map(traced_work, range(4)))
+
+    assert os.getpid() not in worker_pids
+    with open(configured / "trace.jsonl", encoding="utf-8") as f:
+        records = [json.loads(line) for line in f]
+    assert sorted(record["name"] for record in records) == ["parent"] + ["work"] * 4
+    assert {record["pid"] for record in records if record["name"] == "work"} <= worker_pids
+    # Workers neither bound the metrics port nor wrote the parent's metrics file
+    assert not (configured / "rag.prom").exists()
+
+    tracing._registry.write_metrics()
+    metrics = (configured / "rag.prom").read_text(encoding="utf-8")
+    assert 'span="parent"' in metrics and 'span="work"' not in metrics